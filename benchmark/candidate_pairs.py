@@ -0,0 +1,141 @@
+"""
+候选实体对生成的微基准测试：逐对 itertools.combinations 计算与分块矩阵乘法的耗时对比。
+
+用法:
+    python -m benchmark.candidate_pairs --sizes 50 500 5000 --dim 1024
+
+矩阵计算列在实体ID上运行，与原实现的判定完全相同；子串包含列为去掉问题ID后缀的名称上的 Aho-Corasick 检测。
+逐对计算在大规模时非常慢，超过 --legacy-max 的规模只抽样计算部分实体对并按比例估算耗时，
+加 --full 可完整运行并校验结果一致。
+"""
+import argparse
+import random
+import string
+import time
+from itertools import combinations, islice
+from typing import List, Tuple
+
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+from graph.processing.candidate_pairs import find_candidate_pairs
+from graph.processing.containment_index import find_containment_pairs
+
+
+def legacy_candidate_pairs(entities: List[str], embeddings, similarity_threshold: float) -> List[Tuple[str, str]]:
+    """原实现：逐对计算余弦相似度和子串关系"""
+    embedding_map = {entity: embedding for entity, embedding in zip(entities, embeddings)}
+    candidate_pairs = []
+    for (entity1, emb1), (entity2, emb2) in combinations(embedding_map.items(), 2):
+        cos_sim = np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2))
+        if cos_sim > similarity_threshold or (entity1 in entity2 or entity2 in entity1):
+            candidate_pairs.append((entity1, entity2))
+    return candidate_pairs
+
+
+def make_entities(n: int, dim: int, seed: int = 0):
+    """
+    生成带有近似重复的随机实体名称和嵌入向量
+
+    Args:
+        n: 实体数量
+        dim: 向量维度
+        seed: 随机种子
+
+    Returns:
+        Tuple[List[str], List[List[float]]]: 实体ID列表和嵌入向量列表
+    """
+    rng = np.random.default_rng(seed)
+    rand = random.Random(seed)
+    names = set()
+    while len(names) < n:
+        names.add(''.join(rand.choices(string.ascii_lowercase + " ", k=rand.randint(4, 24))).strip() or "x")
+    entities = [name + "__q0" for name in names]
+
+    base = rng.standard_normal((n, dim))
+    # 约10%的实体与前一个实体的向量几乎相同，模拟同义实体
+    for i in range(1, n):
+        if rng.random() < 0.1:
+            base[i] = base[i - 1] + rng.standard_normal(dim) * 0.01
+    return entities, base.tolist()
+
+
+def time_legacy(entities, embeddings, threshold, max_pairs=None) -> Tuple[float, bool]:
+    """
+    计算原实现耗时，max_pairs 不为空时只运行部分实体对并按比例估算
+
+    Returns:
+        Tuple[float, bool]: (耗时秒数, 是否为估算值)
+    """
+    n = len(entities)
+    total_pairs = n * (n - 1) // 2
+    if max_pairs is None or total_pairs <= max_pairs:
+        start = time.perf_counter()
+        legacy_candidate_pairs(entities, embeddings, threshold)
+        return time.perf_counter() - start, False
+
+    start = time.perf_counter()
+    for (entity1, emb1), (entity2, emb2) in islice(combinations(zip(entities, embeddings), 2), max_pairs):
+        cos_sim = np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2))
+        if cos_sim > threshold or (entity1 in entity2 or entity2 in entity1):
+            pass
+    return (time.perf_counter() - start) * total_pairs / max_pairs, True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="候选实体对生成微基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 5000], help="实体数量")
+    parser.add_argument("--dim", type=int, default=1024, help="嵌入向量维度")
+    parser.add_argument("--threshold", type=float, default=0.95, help="相似度阈值")
+    parser.add_argument("--legacy-max", type=int, default=200000, help="原实现最多运行的实体对数量，超出部分按比例估算")
+    parser.add_argument("--full", action="store_true", help="完整运行原实现并校验结果一致")
+    args = parser.parse_args()
+
+    console = Console()
+    table = Table(title="候选实体对生成耗时")
+    table.add_column("实体数", justify="right")
+    table.add_column("候选对数", justify="right")
+    table.add_column("逐对计算(秒)", justify="right")
+    table.add_column("矩阵计算(秒)", justify="right")
+    table.add_column("加速比", justify="right")
+    table.add_column("子串包含对数", justify="right")
+    table.add_column("包含索引(秒)", justify="right")
+    table.add_column("结果一致", justify="right")
+
+    for n in args.sizes:
+        entities, embeddings = make_entities(n, args.dim)
+
+        start = time.perf_counter()
+        pairs = find_candidate_pairs(entities, embeddings, args.threshold)
+        fast_time = time.perf_counter() - start
+
+        max_pairs = None if args.full else args.legacy_max
+        legacy_time, estimated = time_legacy(entities, embeddings, args.threshold, max_pairs)
+        # 去掉问题ID后缀的名称上的完整子串包含检测
+        names = [entity.split("__")[0] for entity in entities]
+        start = time.perf_counter()
+        containment = find_containment_pairs(names)
+        containment_time = time.perf_counter() - start
+
+        if estimated:
+            identical = "未校验"
+        else:
+            identical = "是" if legacy_candidate_pairs(entities, embeddings, args.threshold) == pairs else "否"
+
+        table.add_row(
+            str(n),
+            str(len(pairs)),
+            f"{legacy_time:.3f}" + (" (估算)" if estimated else ""),
+            f"{fast_time:.3f}",
+            f"{legacy_time / max(fast_time, 1e-9):.1f}x",
+            str(len(containment)),
+            f"{containment_time:.3f}",
+            identical
+        )
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+抽取输出格式基准测试：在同一批文本块上比较元组文本协议与结构化输出（JSON Schema / 工具调用）
+的token消耗、延迟和失败率。
+
+用法:
+    python -m benchmark.extraction_protocol --samples 50 --workers 4
+"""
+import argparse
+import time
+import concurrent.futures
+from typing import Dict, List
+
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+from config.prompt import system_template_build_graph, human_template_build_graph
+from config.settings import DATASET_DIR, entity_types, relationship_types
+from graph import EntityRelationExtractor, ExtractionTupleParser
+from graph.extraction.structured_output import records_from_extraction
+from model.get_models import get_llm_model, count_tokens
+from processor.dataset_processor import DatasetProcessor
+
+
+def load_sample_chunks(samples: int) -> List[str]:
+    """
+    从数据集中取出前 samples 个不重复的段落
+
+    Args:
+        samples: 段落数量
+
+    Returns:
+        List[str]: 段落文本列表
+    """
+    chunks = []
+    seen = set()
+    for doc in DatasetProcessor(str(DATASET_DIR)).process_dataset():
+        for chunk in doc.get("chunks") if doc.get("chunks") is not None else []:
+            text = ''.join(chunk)
+            if text not in seen:
+                seen.add(text)
+                chunks.append(text)
+            if len(chunks) >= samples:
+                return chunks
+    return chunks
+
+
+def _usage(message, output_text: str, input_tokens: int) -> Dict[str, int]:
+    """读取响应中的token用量，模型未返回usage时按文本估算"""
+    usage = getattr(message, "usage_metadata", None) or {}
+    return {
+        "input": usage.get("input_tokens") or input_tokens,
+        "output": usage.get("output_tokens") or count_tokens(output_text),
+    }
+
+
+def run_text(extractor: EntityRelationExtractor, text: str) -> Dict:
+    """文本协议：完整读取响应后逐行解析"""
+    inputs = extractor._chain_inputs(text)
+    start = time.time()
+    message = extractor.chain.invoke(inputs)
+    latency = time.time() - start
+
+    parser = ExtractionTupleParser(extractor.tuple_delimiter, extractor.record_delimiter)
+    parser.feed(message.content)
+    parser.close()
+    return {
+        "latency": latency,
+        "records": len(parser.records),
+        "lost": parser.malformed,
+        **_usage(message, message.content, count_tokens(extractor.chat_prompt.format(**inputs))),
+    }
+
+
+def run_structured(extractor: EntityRelationExtractor, text: str) -> Dict:
+    """结构化输出：模型直接返回JSON结构"""
+    inputs = extractor._chain_inputs(text)
+    start = time.time()
+    response = extractor.structured_chain.invoke(inputs)
+    latency = time.time() - start
+
+    parsed = response.get("parsed")
+    if response.get("parsing_error") is not None or not isinstance(parsed, dict):
+        raise ValueError(f"结构化输出解析失败: {response.get('parsing_error')}")
+    records, invalid = records_from_extraction(parsed)
+    raw = response.get("raw")
+    return {
+        "latency": latency,
+        "records": len(records),
+        "lost": len(invalid),
+        **_usage(raw, str(getattr(raw, "additional_kwargs", "")) + str(getattr(raw, "content", "")),
+                 count_tokens(extractor.chat_prompt.format(**inputs))),
+    }
+
+
+def benchmark_mode(extractor: EntityRelationExtractor, runner, chunks: List[str], workers: int) -> Dict:
+    """
+    并发运行一种输出格式并汇总统计
+
+    Args:
+        extractor: 抽取器
+        runner: run_text 或 run_structured
+        chunks: 文本块列表
+        workers: 并发数
+
+    Returns:
+        Dict: 汇总统计
+    """
+    results = []
+    failures = 0
+    wall_start = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(runner, extractor, text) for text in chunks]
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"调用失败: {e}")
+                failures += 1
+    wall_time = time.time() - wall_start
+
+    latencies = np.array([r["latency"] for r in results]) if results else np.zeros(1)
+    return {
+        "chunks": len(chunks),
+        "wall_time": wall_time,
+        "latency_mean": float(latencies.mean()),
+        "latency_p95": float(np.percentile(latencies, 95)),
+        "input_tokens": sum(r["input"] for r in results),
+        "output_tokens": sum(r["output"] for r in results),
+        "records": sum(r["records"] for r in results),
+        "lost": sum(r["lost"] for r in results),
+        "lossy_chunks": sum(1 for r in results if r["lost"]),
+        "failures": failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较文本协议与结构化输出的抽取开销")
+    parser.add_argument("--samples", type=int, default=50, help="参与测试的段落数")
+    parser.add_argument("--workers", type=int, default=4, help="并发请求数")
+    args = parser.parse_args()
+
+    console = Console()
+    chunks = load_sample_chunks(args.samples)
+    console.print(f"[cyan]共取出 {len(chunks)} 个段落[/cyan]")
+
+    llm = get_llm_model()
+    runs = {}
+    for mode, runner in (("text", run_text), ("structured", run_structured)):
+        extractor = EntityRelationExtractor(
+            llm,
+            system_template_build_graph,
+            human_template_build_graph,
+            entity_types,
+            relationship_types,
+            output_mode=mode
+        )
+        if mode == "structured" and extractor.structured_chain is None:
+            console.print("[yellow]当前模型不支持结构化输出，跳过[/yellow]")
+            continue
+        console.print(f"[cyan]正在测试 {mode} 模式...[/cyan]")
+        runs[mode] = benchmark_mode(extractor, runner, chunks, args.workers)
+
+    table = Table(title="抽取输出格式对比")
+    table.add_column("指标", style="cyan")
+    for mode in runs:
+        table.add_column(mode, justify="right")
+
+    def row(name, fmt):
+        table.add_row(name, *(fmt(stats) for stats in runs.values()))
+
+    row("段落数", lambda s: str(s["chunks"]))
+    row("总耗时(秒)", lambda s: f"{s['wall_time']:.2f}")
+    row("平均延迟(秒)", lambda s: f"{s['latency_mean']:.2f}")
+    row("P95延迟(秒)", lambda s: f"{s['latency_p95']:.2f}")
+    row("输入token", lambda s: str(s["input_tokens"]))
+    row("输出token", lambda s: str(s["output_tokens"]))
+    row("每段落输出token", lambda s: f"{s['output_tokens'] / max(s['chunks'] - s['failures'], 1):.1f}")
+    row("抽取记录数", lambda s: str(s["records"]))
+    row("调用失败率", lambda s: f"{s['failures'] / max(s['chunks'], 1) * 100:.1f}%")
+    row("解析丢失记录数", lambda s: str(s["lost"]))
+    row("有丢失的段落比例", lambda s: f"{s['lossy_chunks'] / max(s['chunks'], 1) * 100:.1f}%")
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+结构化数据内存占用基准测试：原来的节点/关系字典与列式 ChunkGraph 的内存和构建耗时对比。
+
+用法:
+    python -m benchmark.structured_memory --questions 100 1000 --chunks 20 --nodes 12 --rels 10
+
+两种表示都按照 _parse_document_entities 的方式逐条构建（实体ID由名称和问题ID拼接而成），
+用 tracemalloc 统计构建完成后新增的内存，列式表示包含字符串驻留表的增长。
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from typing import Dict, List, Tuple
+
+from rich.console import Console
+from rich.table import Table
+
+from graph.structure.columnar_store import ChunkGraph
+
+ENTITY_TYPES = ["人物", "地点", "组织", "事件", "作品", "时间"]
+RELATION_TYPES = ["位于", "属于", "创作", "参与", "出生于", "任职于"]
+
+
+def make_records(questions: int, chunks: int, nodes: int, rels: int, prefix: str, seed: int = 0) -> List[Tuple]:
+    """
+    生成与解析结果格式相同的抽取记录
+
+    Returns:
+        List[Tuple]: (问题ID, 标题列表, 每个chunk的(实体记录, 关系记录)) 列表
+    """
+    rand = random.Random(seed)
+    corpus = []
+    for q in range(questions):
+        question_id = f"{prefix}q{q:06d}"
+        titles = [f"段落标题 {q}-{c}" for c in range(chunks)]
+        per_chunk = []
+        for c in range(chunks):
+            names = [f"实体{rand.randint(0, nodes * 3)}" for _ in range(nodes)]
+            entities = [(name, rand.choice(ENTITY_TYPES), f"{name}的描述文本，出现在第{c}段。" * 2) for name in names]
+            relations = [
+                (rand.choice(names), rand.choice(RELATION_TYPES), rand.choice(names),
+                 "两者之间存在关系的说明。", float(rand.randint(1, 10)))
+                for _ in range(rels)
+            ]
+            per_chunk.append((entities, relations))
+        corpus.append((question_id, titles, per_chunk))
+    return corpus
+
+
+def build_dicts(corpus) -> List[List[Dict]]:
+    """按原实现构建节点/关系字典"""
+    documents = []
+    for question_id, titles, per_chunk in corpus:
+        structured_data = []
+        for i, (entities, relations) in enumerate(per_chunk):
+            chunk_nodes = {}
+            chunk_relationships = []
+            for name, entity_type, description in entities:
+                chunk_nodes[name + "__" + question_id] = {"type": entity_type, "description": description,
+                                                          "title": titles[i], "question_id": question_id}
+            for source, relation, target, description, weight in relations:
+                chunk_relationships.append({
+                    "head": source + "__" + question_id,
+                    "relation": relation,
+                    "tail": target + "__" + question_id,
+                    "description": description,
+                    "weight": weight
+                })
+            structured_data.append({"nodes": chunk_nodes, "relationships": chunk_relationships})
+        documents.append(structured_data)
+    return documents
+
+
+def build_columnar(corpus) -> List[List[ChunkGraph]]:
+    """构建列式 ChunkGraph"""
+    documents = []
+    for question_id, titles, per_chunk in corpus:
+        structured_data = []
+        for i, (entities, relations) in enumerate(per_chunk):
+            chunk_graph = ChunkGraph(titles[i], question_id)
+            for name, entity_type, description in entities:
+                chunk_graph.set_node(name + "__" + question_id, entity_type, description)
+            for source, relation, target, description, weight in relations:
+                chunk_graph.add_relationship(source + "__" + question_id, relation, target + "__" + question_id,
+                                             description, weight)
+            structured_data.append(chunk_graph)
+        documents.append(structured_data)
+    return documents
+
+
+def measure(builder, corpus) -> Tuple[int, float]:
+    """
+    测量构建后新增的内存
+
+    Returns:
+        Tuple[int, float]: (新增字节数, 构建耗时秒数)
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = builder(corpus)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del result
+    return used, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="结构化数据内存占用基准")
+    parser.add_argument("--questions", type=int, nargs="+", default=[100, 1000], help="问题数量")
+    parser.add_argument("--chunks", type=int, default=20, help="每个问题的段落数")
+    parser.add_argument("--nodes", type=int, default=12, help="每个段落的实体数")
+    parser.add_argument("--rels", type=int, default=10, help="每个段落的关系数")
+    args = parser.parse_args()
+
+    console = Console()
+    table = Table(title="structured_data 内存占用")
+    table.add_column("问题数", justify="right")
+    table.add_column("字典(MB)", justify="right")
+    table.add_column("列式(MB)", justify="right")
+    table.add_column("内存节省", justify="right")
+    table.add_column("字典构建(秒)", justify="right")
+    table.add_column("列式构建(秒)", justify="right")
+
+    for questions in args.questions:
+        # 每个规模使用不同的问题ID前缀，避免驻留表复用上一轮的字符串
+        corpus = make_records(questions, args.chunks, args.nodes, args.rels, prefix=f"n{questions}-")
+        dict_bytes, dict_time = measure(build_dicts, corpus)
+        columnar_bytes, columnar_time = measure(build_columnar, corpus)
+        table.add_row(
+            str(questions),
+            f"{dict_bytes / 1024 / 1024:.1f}",
+            f"{columnar_bytes / 1024 / 1024:.1f}",
+            f"{(1 - columnar_bytes / max(dict_bytes, 1)) * 100:.1f}%",
+            f"{dict_time:.2f}",
+            f"{columnar_time:.2f}",
+        )
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
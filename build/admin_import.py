@@ -0,0 +1,214 @@
+"""
+导出 neo4j-admin database import 所需的CSV文件。
+
+首次构建写入空数据库时，逐批MERGE需要为每个节点查找索引并加锁，是写入阶段最慢的方式；
+neo4j-admin 离线导入直接生成存储文件，不经过事务层。这里把剪枝后的整个基础图谱
+（文档、Chunk、实体、实体关系以及 一部分/FIRST_CHUNK/NEXT_CHUNK/MENTIONS 关系）
+按文件流式写出，表头单独保存在 *_header.csv 中，最后生成调用 neo4j-admin 的导入脚本。
+
+节点和关系在导出时按与事务写入相同的规则去重：实体保留最后一次出现的属性，并带上出现过的所有类型标签
+（实体ID带有问题ID后缀，只在一个问题中出现，因此每个问题的实体缓存到该问题结束后再写出），
+同一对实体之间同类型的关系保留第一次出现的属性。
+"""
+import csv
+import os
+import shlex
+import shutil
+from typing import Dict, List, Optional, Set, Tuple
+
+from config.settings import ADMIN_IMPORT_DIR, DATASET_DIR, theme
+from graph.extraction.bulk_writer import relationship_type, sanitize_label
+from graph.structure.columnar_store import ChunkGraph
+from graph.structure.struct_builder import build_chunk_rows
+
+# 文件名 -> 表头；ID空间保证不同类型节点的ID互不冲突，导入时 :ID 列同时保存为属性
+_NODE_HEADERS = {
+    "documents": ["fileName:ID(Document)", "type", "uri", "domain", ":LABEL"],
+    "chunks": ["id:ID(Chunk)", "text", "position:int", "length:int", "fileName",
+               "content_offset:int", "tokens:int", "title", ":LABEL"],
+    "entities": ["id:ID(Entity)", "type", "description", "title", "question_id", ":LABEL"],
+}
+_RELATIONSHIP_HEADERS = {
+    "part_of": [":START_ID(Chunk)", ":END_ID(Document)", ":TYPE"],
+    "first_chunk": [":START_ID(Document)", ":END_ID(Chunk)", ":TYPE"],
+    "next_chunk": [":START_ID(Chunk)", ":END_ID(Chunk)", ":TYPE"],
+    "mentions": [":START_ID(Chunk)", ":END_ID(Entity)", ":TYPE"],
+    "relations": [":START_ID(Entity)", ":END_ID(Entity)", ":TYPE", "description", "weight:double"],
+}
+
+
+def entity_label(node_type: str) -> str:
+    """实体类型作为第二个标签，:LABEL 列以分号分隔多个标签"""
+    return sanitize_label(node_type).replace(";", "")
+
+
+class AdminImportExporter:
+    """
+    将剪枝后的文档流式导出为 neo4j-admin 导入文件，可以分多次调用 write_documents，
+    内存中只保留已导出的ID集合用于去重，以及当前问题尚未写出的实体。
+    """
+
+    def __init__(self, directory: str = str(ADMIN_IMPORT_DIR)):
+        """
+        初始化导出器，清空目录中已有的导出文件
+
+        Args:
+            directory: 导出目录
+        """
+        self.directory = directory
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+
+        self._files = {}
+        self._writers = {}
+        for name in list(_NODE_HEADERS) + list(_RELATIONSHIP_HEADERS):
+            handle = open(os.path.join(directory, f"{name}.csv"), "w", encoding="utf-8", newline="")
+            self._files[name] = handle
+            self._writers[name] = csv.writer(handle)
+
+        # 去重集合
+        self._documents: Set[str] = set()
+        self._chunks: Set[str] = set()
+        self._entities: Set[str] = set()
+        self._pairs: Dict[str, Set[Tuple[str, str]]] = {name: set() for name in _RELATIONSHIP_HEADERS}
+        self._relations: Set[Tuple[str, str, str]] = set()
+
+        self.counts = {name: 0 for name in list(_NODE_HEADERS) + list(_RELATIONSHIP_HEADERS)}
+
+    def _write(self, name: str, row: List) -> None:
+        self._writers[name].writerow(row)
+        self.counts[name] += 1
+
+    def _write_pair(self, name: str, start: str, end: str, rel_type: str) -> None:
+        """写入无属性关系，同一对节点只写一次"""
+        if (start, end) in self._pairs[name]:
+            return
+        self._pairs[name].add((start, end))
+        self._write(name, [start, end, rel_type])
+
+    def write_documents(self, docs: List[Dict]) -> None:
+        """
+        导出一组文档的结构和剪枝后的实体关系
+
+        Args:
+            docs: 文档列表，需已包含 chunks、title 和 structured_data
+        """
+        for doc in docs:
+            file_name = doc["filename"]
+            if file_name not in self._documents:
+                self._documents.add(file_name)
+                self._write("documents", [file_name, "local", str(DATASET_DIR), theme, "__Document__"])
+
+            chunk_rows, chain, _ = build_chunk_rows(file_name, doc["chunks"], doc["title"])
+            for data in chunk_rows:
+                if data["id"] not in self._chunks:
+                    self._chunks.add(data["id"])
+                    self._write("chunks", [data["id"], data["pg_content"], data["position"], data["length"],
+                                           data["f_name"], data["content_offset"], data["tokens"],
+                                           data["title"], "__Chunk__"])
+                self._write_pair("part_of", data["id"], file_name, "一部分")
+            for relationship in chain:
+                if relationship["type"] == "FIRST_CHUNK":
+                    self._write_pair("first_chunk", file_name, relationship["chunk_id"], "FIRST_CHUNK")
+                else:
+                    self._write_pair("next_chunk", relationship["previous_chunk_id"],
+                                     relationship["current_chunk_id"], "NEXT_CHUNK")
+
+            # 实体 -> [最后一次出现的属性, 出现过的类型标签]，问题结束后写出
+            entities: Dict[str, List] = {}
+            for data, chunk_data in zip(chunk_rows, doc.get("structured_data", [])):
+                if isinstance(chunk_data, dict):
+                    chunk_data = ChunkGraph.from_dict(chunk_data)
+                self._write_chunk_graph(data["id"], chunk_data, entities)
+            self._write_entities(entities)
+
+    def _write_chunk_graph(self, chunk_id: str, chunk_graph: ChunkGraph, entities: Dict[str, List]) -> None:
+        """
+        导出一个chunk的实体关系和MENTIONS关系，只保留两端实体都在chunk中的关系；
+        实体记入 entities，与事务写入一样后出现的属性覆盖先出现的属性，类型标签取并集
+
+        Args:
+            chunk_id: chunk_id
+            chunk_graph: 该chunk剪枝后的结构化数据
+            entities: 当前问题中待写出的实体
+        """
+        entity_ids = set()
+        for entity_id, properties in chunk_graph.node_items():
+            entity_ids.add(entity_id)
+            buffered = entities.setdefault(entity_id, [None, {}])
+            buffered[0] = properties
+            label = entity_label(properties.get("type", "未知"))
+            if label:
+                buffered[1][label] = None
+            self._write_pair("mentions", chunk_id, entity_id, "MENTIONS")
+
+        for rel in chunk_graph.relationships():
+            if rel["head"] not in entity_ids or rel["tail"] not in entity_ids:
+                continue
+            key = (rel["head"], rel["tail"], relationship_type(rel["relation"]))
+            if key in self._relations:
+                continue
+            self._relations.add(key)
+            self._write("relations", [key[0], key[1], key[2], rel["description"], rel["weight"]])
+
+    def _write_entities(self, entities: Dict[str, List]) -> None:
+        """
+        写出一个问题的实体节点，:LABEL 列包含 __Entity__ 和出现过的所有类型标签
+
+        Args:
+            entities: 实体ID -> [属性, 类型标签]
+        """
+        for entity_id, (properties, labels) in entities.items():
+            if entity_id in self._entities:
+                continue
+            self._entities.add(entity_id)
+            self._write("entities", [entity_id, properties.get("type", "未知"), properties.get("description", ""),
+                                     properties.get("title", ""), properties.get("question_id", ""),
+                                     ";".join(["__Entity__", *labels])])
+
+    def close(self, database: Optional[str] = None) -> str:
+        """
+        关闭数据文件，写出表头文件和导入脚本
+
+        Args:
+            database: 目标数据库名称，默认读取环境变量 NEO4J_DATABASE，未设置时为 neo4j
+
+        Returns:
+            str: 导入命令
+        """
+        for handle in self._files.values():
+            handle.close()
+        for name, header in list(_NODE_HEADERS.items()) + list(_RELATIONSHIP_HEADERS.items()):
+            with open(os.path.join(self.directory, f"{name}_header.csv"), "w", encoding="utf-8", newline="") as f:
+                csv.writer(f).writerow(header)
+
+        command = self.import_command(database)
+        script = os.path.join(self.directory, "import.sh")
+        with open(script, "w", encoding="utf-8", newline="\n") as f:
+            f.write("#!/bin/sh\n")
+            f.write("# 在停止的Neo4j实例上执行，目标数据库必须为空；额外参数（如 --overwrite-destination=true）原样传给 neo4j-admin\n")
+            f.write('cd "$(dirname "$0")"\n')
+            f.write(command + ' "$@"\n')
+        os.chmod(script, 0o755)
+        return command
+
+    def import_command(self, database: Optional[str] = None) -> str:
+        """
+        生成 neo4j-admin database import full 命令，文件路径相对于导出目录
+
+        Args:
+            database: 目标数据库名称
+
+        Returns:
+            str: 导入命令
+        """
+        database = database or os.getenv("NEO4J_DATABASE") or "neo4j"
+        parts = ["neo4j-admin", "database", "import", "full", shlex.quote(database)]
+        for name in _NODE_HEADERS:
+            parts.append(f"--nodes={name}_header.csv,{name}.csv")
+        for name in _RELATIONSHIP_HEADERS:
+            parts.append(f"--relationships={name}_header.csv,{name}.csv")
+        # Chunk文本和实体描述中可能包含换行
+        parts.append("--multiline-fields=true")
+        return " ".join(parts)
@@ -11,6 +11,7 @@ from rich.text import Text
 from graph import ChunkIndexManager
 from config.neo4jdb import get_db_manager
 from config.settings import MAX_WORKERS, CHUNK_BATCH_SIZE
+from build.build_journal import open_build_journal
 
 import shutup
 shutup.please()
@@ -68,6 +69,8 @@ class ChunkIndexBuilder:
                 batch_size=CHUNK_BATCH_SIZE,
                 max_workers=MAX_WORKERS
             )
+            # 构建日志：已完成的阶段在重新运行时跳过
+            self.journal = open_build_journal()
             
             # 输出使用的参数
             self.console.print(f"[blue]并行处理线程数: {MAX_WORKERS}[/blue]")
@@ -112,8 +115,13 @@ class ChunkIndexBuilder:
             index_start = time.time()
             self.console.print("[cyan]正在创建文本块索引...[/cyan]")
             
-            # 只计算和存储embeddings，不创建新的向量索引
-            vector_store = self.index_manager.create_chunk_index()
+            if self.journal.stage_done("chunk_index"):
+                self.console.print("[green]构建日志显示文本块索引已创建，跳过[/green]")
+            else:
+                # 只计算和存储embeddings，不创建新的向量索引
+                vector_store = self.index_manager.create_chunk_index()
+                if vector_store:
+                    self.journal.mark_stage("chunk_index")
             
             self.performance_stats["索引创建"] = time.time() - index_start
             
@@ -1,11 +1,12 @@
-import ast
+import asyncio
+import concurrent.futures
+import multiprocessing
 import os
-import re
+import queue
+import threading
 import time
-from itertools import combinations
-from typing import List, Dict, Any, Set
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
-import numpy as np
 import psutil
 import shutup
 from rich.console import Console
@@ -27,15 +28,75 @@ from config.settings import (
     CHUNK_SIZE,
     OVERLAP,
     MAX_WORKERS, BATCH_SIZE,
+    ASYNC_LLM,
+    BUILD_MODE,
+    BUILD_SHARDS,
+    SHARD_BUILD_MODE,
+    STREAM_QUEUE_SIZE,
+    STREAM_TRANSFORM_WORKERS,
+    STREAM_WRITE_BATCH_DOCS,
+    STAGE_WINDOW_DOCS,
+    STAGE_STORE_DIR,
+    GRAPH_WRITE_TARGET,
+    BUILD_JOURNAL_COMMIT_DOCS,
+    PARAGRAPH_DEDUP,
+    PRUNING_STRATEGY,
+    PRUNING_COMPARE,
+    PROVENANCE_MATRIX_PATH,
 )
 from graph import EntityRelationExtractor
 from graph import GraphStructureBuilder
 from graph import GraphWriter
+from graph import SchemaManager
+from graph import find_candidate_pairs
+from graph import llm_governor, generate_hash
+from graph import get_name_embedding_cache
+from graph import MergeConfirmer
+from graph import PruningEngine, PRUNING_STRATEGIES, merge_pruning_reports, new_pruning_report
+from graph import ProvenanceIncidence
+from graph import string_table
+from graph.structure.struct_builder import build_chunk_rows
 from model.get_models import get_llm_model, get_embeddings_model
 from processor.dataset_processor import DatasetProcessor
+from processor.paragraph_dedup import ParagraphDeduplicator
+from build.admin_import import AdminImportExporter
+from build.build_journal import open_build_journal
+from build.build_index_and_community import IndexCommunityBuilder
+from build.stage_store import StageStore
+from build.stage_workers import (
+    StageExecutor,
+    parse_document_structure,
+    parse_shard,
+    merge_shard,
+    install_prune_engine,
+    prune_context,
+    prune_shard,
+)
 
 shutup.please()
 
+# 流式构建中表示上游阶段结束的标记
+_STREAM_END = object()
+
+
+def shard_suffix(shard_index: int, shard_count: int) -> str:
+    """分片的名称后缀，用于区分各分片的阶段记录和输出文件"""
+    return f"shard-{shard_index}-of-{shard_count}"
+
+
+def question_shard(question_id: str, shard_count: int) -> int:
+    """
+    按问题ID的哈希确定问题所属的分片，与数据集顺序和读取数量无关
+
+    Args:
+        question_id: 问题ID
+        shard_count: 分片数
+
+    Returns:
+        int: 分片序号
+    """
+    return int(generate_hash(question_id), 16) % shard_count
+
 
 class KnowledgeGraphBuilder:
     """
@@ -49,11 +110,41 @@ class KnowledgeGraphBuilder:
     5. 写入数据库
     """
 
-    def __init__(self):
-        """初始化知识图谱构建器"""
+    def __init__(self, build_mode: str = BUILD_MODE, shard: Optional[Tuple[int, int]] = None):
+        """
+        初始化知识图谱构建器
+
+        Args:
+            build_mode: 基础图谱的构建模式：staged / streaming / out_of_core / sharded
+            shard: 分片构建的工作进程中为 (分片序号, 分片数)，只处理属于该分片的问题
+        """
         # 初始化终端界面
         self.console = Console()
         self.processed_documents = []
+        self.build_mode = build_mode
+        self.shard = shard
+        # 分片的阶段名称和输出文件带有分片后缀，互不覆盖
+        if shard is None:
+            self.base_stage = "base_graph"
+            self.provenance_path = str(PROVENANCE_MATRIX_PATH)
+        else:
+            suffix = shard_suffix(*shard)
+            self.base_stage = f"base_graph.{suffix}"
+            self.provenance_path = str(PROVENANCE_MATRIX_PATH.with_name(
+                f"{PROVENANCE_MATRIX_PATH.stem}.{suffix}{PROVENANCE_MATRIX_PATH.suffix}"))
+        # 出处关联矩阵是否已保存到 provenance_path，剪枝工作进程从该文件加载矩阵
+        self.provenance_saved = False
+
+        # admin_import 时基础图谱导出为 neo4j-admin 导入文件，不写入数据库
+        self.export_graph = GRAPH_WRITE_TARGET == "admin_import"
+        if self.export_graph and build_mode not in ("staged", "out_of_core"):
+            raise ValueError(f"GRAPH_WRITE_TARGET=admin_import 只支持 staged / out_of_core 模式，当前为 {build_mode}")
+        # 本次运行导出后生成的导入命令，未导出时为None
+        self.admin_import_command = None
+        # 本次运行是否已经构建了实体索引和社区（分片模式由协调进程在所有分片完成后构建）
+        self.index_built = False
+        # 本次运行中有chunk抽取失败或写入失败的问题，不记录到构建日志，基础图谱阶段也不标记完成
+        self.incomplete_questions = set()
 
         # 添加计时器
         self.start_time = None
@@ -91,6 +182,8 @@ class KnowledgeGraphBuilder:
             # 初始化模型
             self.llm = get_llm_model()
             self.embeddings = get_embeddings_model()
+            # 实体名称向量缓存：合并阶段与实体索引共享，相同名称只计算一次
+            self.name_embeddings = get_name_embedding_cache(self.embeddings)
             progress.advance(task)  # 进度条再前进 1/4
 
             # 初始化图数据库连接
@@ -105,6 +198,20 @@ class KnowledgeGraphBuilder:
             progress.advance(task)
 
             self.struct_builder = GraphStructureBuilder(batch_size=BATCH_SIZE)
+            # 构建日志：记录已提交的问题和阶段，支持断点续建
+            self.journal = open_build_journal(allow_reset=self.shard is None)
+            # 已提交的Chunk节点登记在构建日志中，不在内存中保存随语料增长的ID集合，中断后也无需重新加载
+            self.struct_builder.chunk_registry = self.journal
+            # 实体合并确认：跨问题并发并缓存LLM的确认结果
+            self.merge_confirmer = MergeConfirmer(self.llm)
+            # 解析、合并改写与剪枝的进程池执行器
+            # 分片模式下各工作进程已经占满CPU，分片内部不再启动进程池
+            self.stage_executor = StageExecutor(workers=1) if self.shard is not None else StageExecutor()
+            # 超出内存模式下各阶段输出的磁盘存储
+            if self.shard is None:
+                self.stage_store = StageStore()
+            else:
+                self.stage_store = StageStore(str(STAGE_STORE_DIR / shard_suffix(*self.shard)))
             self.entity_extractor = EntityRelationExtractor(
                 self.llm,
                 system_template_build_graph,
@@ -148,477 +255,376 @@ class KnowledgeGraphBuilder:
         """
         遍历所有文档，将LLM返回的实体关系字符串预解析为结构化的字典。
         这个结构化字典将包含节点和关系信息，为后续的剪枝做准备。
+        解析是纯CPU计算，按问题分片提交到进程池并行执行。
         """
         self._display_stage_header("预解析实体关系字符串")
+        self._parse_documents(self.processed_documents)
 
-        node_pattern = re.compile(r'\("entity" : "(.+?)" : "(.+?)" : "(.+?)"\)')
-        rel_pattern = re.compile(r'\("relationship" : "(.+?)" : "(.+?)" : "(.+?)" : "(.+?)" : (.+?)\)')
+    def _parse_documents(self, documents: List[Dict]):
+        """
+        将一组文档的LLM返回字符串解析为 doc['structured_data']，按问题分片在进程池中执行
 
-        for doc in self.processed_documents:
-            if "entity_data" not in doc or not isinstance(doc["entity_data"], list):
-                continue
-
-            # 'structured_data' 将是一个列表，每个元素对应一个chunk的解析结果
-            doc['structured_data'] = []
-            for i, raw_text in enumerate(doc["entity_data"]):
-                # 每个chunk的节点和关系
-                chunk_nodes = {}
-                chunk_relationships = []
-                try:
-                    # 1. 解析所有节点定义，获取它们的类型和描述
-                    for match in node_pattern.findall(raw_text):
-                        node_id, node_type, description = match
-                        node_id = node_id + "__" + doc.get("question_id")
-                        chunk_nodes[node_id] = {"type": node_type, "description": description, "title": doc["title"][i],
-                                                "question_id": doc.get("question_id", "")}
-
-                    # 2. 解析所有关系
-                    for match in rel_pattern.findall(raw_text):
-                        source_id, rel_type, target_id, description, weight = match
-                        source_id = source_id + "__" + doc.get("question_id")
-                        target_id = target_id + "__" + doc.get("question_id")
-
-                        chunk_relationships.append({
-                            "head": source_id,
-                            "relation": rel_type,
-                            "tail": target_id,
-                            "description": description,
-                            "weight": float(weight)
-                        })
-                        # 确保关系中涉及的实体也被添加到节点列表中（以防万一它们没有被'entity'标签定义）
-                        if source_id not in chunk_nodes:
-                            chunk_nodes[source_id] = {"type": "未知", "description": "从关系中推断",
-                                                      "title": doc["title"][i],
-                                                      "question_id": doc.get("question_id", "")}
-                        if target_id not in chunk_nodes:
-                            chunk_nodes[target_id] = {"type": "未知", "description": "从关系中推断",
-                                                      "title": doc["title"][i],
-                                                      "question_id": doc.get("question_id", "")}
-                except Exception as e:
-                    print("解析数据match数据：", match)
-                    print(f"[解析错误] {e}")
-
-                doc['structured_data'].append({
-                    "nodes": chunk_nodes,
-                    "relationships": chunk_relationships
-                })
-
-    def _merge_local_entities(self, similarity_threshold: float = 0.95):
+        Args:
+            documents: 文档列表，没有 'entity_data' 的文档会被跳过
+        """
+        documents = [
+            doc for doc in documents
+            if "entity_data" in doc and isinstance(doc["entity_data"], list)
+        ]
+        payloads = [(doc.get("question_id", ""), doc["title"], doc["entity_data"]) for doc in documents]
+        start = time.time()
+        results = self.stage_executor.map_shards(
+            parse_shard, payloads,
+            self.entity_extractor.tuple_delimiter, self.entity_extractor.record_delimiter
+        )
+        structured = (structured_data for shard in results for structured_data in shard)
+        for doc, structured_data in zip(documents, structured):
+            doc['structured_data'] = structured_data
+        self.console.print(f"[blue]解析完成: {len(documents)} 个问题，耗时 {time.time() - start:.2f}秒[/blue]")
+
+    def _parse_document_entities(self, doc: Dict):
+        """
+        将单个文档的LLM返回字符串解析为 doc['structured_data']
+
+        Args:
+            doc: 文档字典，需包含 'entity_data'
+        """
+        if "entity_data" not in doc or not isinstance(doc["entity_data"], list):
+            return
+
+        # 'structured_data' 将是一个列表，每个元素对应一个chunk的解析结果（列式存储的 ChunkGraph）
+        doc['structured_data'] = parse_document_structure(
+            doc.get("question_id", ""),
+            doc["title"],
+            doc["entity_data"],
+            self.entity_extractor.tuple_delimiter,
+            self.entity_extractor.record_delimiter
+        )
+
+    def _merge_local_entities(self, similarity_threshold: float = 0.95, documents: List[Dict] = None):
         """
         对提取出的实体进行向量化，以减少稀疏性。
-        此函数会遍历每个文档，并在文档内部完成实体合并。
+        所有文档的候选实体对一次性提交给LLM并发确认，再在每个文档内部完成实体合并。
 
         Args:
             similarity_threshold (float): 用于筛选候选合并对的相似度阈值。
+            documents: 参与合并的文档，默认全部已处理文档
         """
         self.console.print("\n[bold]对每个文档分别进行实体合并...[/bold]")
 
-        for doc in self.processed_documents:
-            self.console.print(f"\n[cyan]正在处理文件: {doc['filename']}...[/cyan]")
-
-            structured_data_per_chunk = doc.get("structured_data", [])
-            if not structured_data_per_chunk:
-                self.console.print("[yellow]未发现结构化数据，跳过此文件。[/yellow]")
-                continue
-
-            # 1. 收集实体并计算其在文档中的出现频率
-            local_entities_map = {}  # 用于计算频率
-            entity_details_map = {}  # 用于查找实体的描述（如label, des）
-
-            for chunk_data in structured_data_per_chunk:
-                nodes = chunk_data.get("nodes", {})
-                for entity_id, entity_data in nodes.items():
-                    local_entities_map[entity_id] = local_entities_map.get(entity_id, 0) + 1
-                    # 存储实体的详细数据，如果已存在则不覆盖
-                    if entity_id not in entity_details_map:
-                        entity_details_map[entity_id] = entity_data
-
-            # 将 dict_keys 转换为 list 以便进行向量化
-            local_entities = list(local_entities_map.keys())
-
-            if len(local_entities) < 2:
-                self.console.print("[green]实体数量不足，无需合并。[/green]")
-                continue
-
-            # 2. 向量化和候选对生成
-            entity_embeddings = self.embeddings.embed_documents([entity.split("__")[0] for entity in local_entities])
-            embedding_map = {entity: embedding for entity, embedding in zip(local_entities, entity_embeddings)}
-
-            candidate_pairs = []
-            for (entity1, emb1), (entity2, emb2) in combinations(embedding_map.items(), 2):
-                cos_sim = np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2))
-                if cos_sim > similarity_threshold or (entity1 in entity2 or entity2 in entity1) :
-                    candidate_pairs.append((entity1, entity2))
-
-            if not candidate_pairs:
-                self.console.print("[green]未发现相似实体对，无需合并。[/green]")
-                continue
-            self.console.print(f"发现 {len(candidate_pairs)} 对候选实体，提交给LLM确认...")
-            self.console.print(f"候选实体对为：{candidate_pairs}")
-
-            # 3. LLM 确认
-            confirmed_merges = {}
-            batch_size = 10
-            for i in range(0, len(candidate_pairs), batch_size):
-                batch = candidate_pairs[i:i + batch_size]
-
-                # 2. 在生成提示时，为每个实体附加上下文描述
-                # 使用一个更清晰的 for 循环来构建带描述的实体对列表
-                formatted_pairs_lines = []
-                for idx, (e1, e2) in enumerate(batch):
-                    # 安全地获取实体描述 (label)
-                    desc1 = (entity_details_map.get(e1, {}).get('label', '未知') + "\n" +
-                             entity_details_map.get(e1,{}).get('description', ''))
-                    desc2 = (entity_details_map.get(e2, {}).get('label', '未知') + "\n" +
-                             entity_details_map.get(e2,{}).get('description', ''))
-                    e1 = e1.split("__")[0]
-                    e2 = e2.split("__")[0]
-                    # 创建包含描述的行
-                    line = f'{idx + 1}. 实体1: "{e1}" (详细信息: {str(desc1)}) | 实体2: "{e2}" (详细信息: {str(desc2)})'
-                    formatted_pairs_lines.append(line)
-
-                formatted_pairs = "\n".join(formatted_pairs_lines)
-
-                # 3. [修改] 更新主提示，告知LLM新的格式并提供匹配的示例
-                prompt = f"""你是一个实体识别和链接专家。你的任务是根据实体名称及其类型描述，判断每一对实体是否指向同一个真实世界的实体。
-
-                请分析下面的实体对列表：
-                {formatted_pairs}
-    
-                你的回答必须遵循以下规则：
-                1.  返回一个单独的 Python 列表，其中包含布尔值（True 或 False）。
-                2.  列表中的每个值必须与上面列表中的每个实体对一一对应。
-                3.  除了这个 Python 列表，不要包含任何其他文字、解释或前缀。
-    
-                例如，对于输入：
-                1. 实体1: "苹果公司" (详细信息: 公司) | 实体2: "Apple Inc." (详细信息: 公司)
-                2. 实体1: "亚马逊" (详细信息: 公司) | 实体2: "亚马逊河" (详细信息: 地理位置)
-    
-                你的输出应该是：
-                [True, False]
-                """
-                # Call the LLM
-                response = self.llm.invoke(prompt).content
+        if documents is None:
+            documents = self.processed_documents
+        documents = [doc for doc in documents if not doc.get("journal_restored")]
+
+        # 一次性收集全语料的实体名称，并发批量计算向量，各问题合并时直接读取
+        embed_start = time.time()
+        names = (
+            entity_id.split("__")[0]
+            for doc in documents
+            for chunk_data in doc.get("structured_data", [])
+            for entity_id in chunk_data.entity_ids()
+        )
+        distinct = self.name_embeddings.prefetch(names)
+        stats = self.name_embeddings.stats()
+        self.console.print(
+            f"[blue]实体名称向量: {distinct} 个不同名称，缓存命中 {stats['cache_hits']}，"
+            f"新计算 {stats['embedded']}，嵌入调用 {stats['embed_calls']} 次，"
+            f"耗时 {time.time() - embed_start:.2f}秒[/blue]"
+        )
 
-                # 2. [MODIFIED] Parse the Python list from the response.
-                try:
-                    list_str = None  # 初始化一个变量来存储找到的列表字符串
-
-                    # 尝试1：使用更精确的非贪婪正则表达式
-                    search_result = re.search(r"\[.*?\]", response)
-                    if search_result:
-                        list_str = search_result.group(0)
-
-                    # 尝试2：如果正则失败，则回退到 find 方法
-                    if not list_str:
-                        start = response.find("[")
-                        # 必须确保两个括号都找到了，并且顺序是正确的
-                        if start != -1:
-                            end = response.find("]", start)  # 从 start 位置之后开始找 ']'
-                            if end != -1:
-                                list_str = response[start:end + 1]  # 正确的切片
-
-                    # 在两种方法都尝试过后，检查我们是否找到了列表字符串
-                    if not list_str:
-                        # 如果 list_str 仍然是 None，说明两种方法都失败了
-                        raise ValueError("LLM 响应中未找到任何有效的 Python 列表 `[...]`。")
-
-                    results_list = ast.literal_eval(list_str)
-
-                    if not isinstance(results_list, list) or len(results_list) != len(batch):
-                        raise ValueError("Parsed list is not valid or its length does not match the batch size.")
-
-                    # 3. [MODIFIED] Iterate through the batch and the results list together.
-                    for (e1, e2), is_match in zip(batch, results_list):
-                        if is_match:
-                            # This part of the logic remains the same
-                            source, target = (e1, e2) if (local_entities_map.get(e1, 0) <
-                                                          local_entities_map.get(e2, 0)) else (e2, e1)
-                            final_target = confirmed_merges.get(target, target)
-                            confirmed_merges[source] = final_target
-
-                except (ValueError, SyntaxError) as e:
-                    self.console.print(
-                        f"[yellow]警告: 无法解析LLM对于批次 {i // batch_size + 1} 的响应。错误: {e}[/yellow]")
-                    self.console.print(f"[yellow]LLM响应原文: {response}[/yellow]")
-                    continue  # Skip to the next batch
-
-            if not confirmed_merges:
-                self.console.print("[green]LLM未确认任何合并操作。[/green]")
-                continue
-            self.console.print(f"LLM确认了 {len(confirmed_merges)} 个合并操作。正在更新图谱数据...")
-
-            # 4. 更新节点(nodes)和关系(relationships)
-            for chunk_data in structured_data_per_chunk:
-                nodes = chunk_data.get("nodes", {})
-                relationships = chunk_data.get("relationships", [])
-
-                # 4.1 更新节点字典 (nodes)
-                # 将被合并的节点(source)的数据迁移到目标节点(target)上，然后删除源节点
-                nodes_to_delete = set()
-                for source, target in confirmed_merges.items():
-                    if source in nodes:
-                        # 如果目标节点还不存在于这个chunk中，则把源节点的数据完整迁移过去
-                        if target not in nodes:
-                            nodes[target] = nodes[source]
-                        # 如果目标节点已存在，可以选择性地合并属性,description
-                        else:
-                            nodes[target]["description"] += nodes[source].get("description")
-                        # 标记源节点以便后续删除
-                        nodes_to_delete.add(source)
-
-                # 执行删除操作
-                for node_id in nodes_to_delete:
-                    if node_id in nodes:
-                        del nodes[node_id]
-
-                # 4.2 更新关系列表 (relationships)
-                # 创建一个新的关系列表，只包含有效且非自循环的关系
-                updated_relationships = []
-                for rel in relationships:
-                    # 获取关系中的头尾实体，并用合并字典找到它们的最终规范名称
-                    head = confirmed_merges.get(rel.get("head"), rel.get("head"))
-                    tail = confirmed_merges.get(rel.get("tail"), rel.get("tail"))
-
-                    # 只有当头尾实体不同时，才保留这个关系
-                    if head != tail:
-                        rel["head"] = head
-                        rel["tail"] = tail
-                        updated_relationships.append(rel)
-
-                # 用更新后的关系列表替换旧的列表
-                chunk_data["relationships"] = updated_relationships
+        candidates = []
+        for doc in documents:
+            candidate = self._collect_merge_candidates(doc, similarity_threshold)
+            if candidate is not None:
+                candidates.append((doc, candidate))
+
+        # 所有文档的候选实体对合并为一次并发确认
+        confirm_start = time.time()
+        all_pairs = [pair for _, candidate in candidates for pair in candidate["merge_pairs"]]
+        all_decisions = self.merge_confirmer.confirm(all_pairs) if all_pairs else []
+        stats = self.merge_confirmer.stats()
+        self.console.print(
+            f"[blue]合并确认: {len(all_pairs)} 对候选实体，缓存命中 {stats['cache_hits']}，"
+            f"LLM调用 {stats['llm_calls']} 次，耗时 {time.time() - confirm_start:.2f}秒[/blue]"
+        )
 
+        # 合并决策在主进程内汇总，结构化数据的改写按问题分片交给进程池
+        merges = []
+        offset = 0
+        for doc, candidate in candidates:
+            count = len(candidate["merge_pairs"])
+            confirmed_merges = self._resolve_merge_decisions(doc, candidate, all_decisions[offset:offset + count])
+            offset += count
+            if confirmed_merges:
+                merges.append((doc, confirmed_merges))
+
+        results = self.stage_executor.map_shards(
+            merge_shard, [(doc.get("structured_data", []), confirmed_merges) for doc, confirmed_merges in merges]
+        )
+        structured = (structured_data for shard in results for structured_data in shard)
+        for (doc, _), structured_data in zip(merges, structured):
+            doc["structured_data"] = structured_data
             self.console.print(f"[bold green]文件 '{doc['filename']}' 的实体合并完成！[/bold green]")
 
-    def _build_entity_provenance_map(self) -> Dict[str, set]:
-        """
-        遍历所有处理过的文档，基于预解析的结构化数据，
-        构建一个实体与其所在chunk_id集合的映射。
+    def _merge_document_entities(self, doc: Dict, similarity_threshold: float = 0.95):
         """
-        self._display_stage_header("构建实体出处映射 (Provenance Map)")
+        在单个文档内部完成相似实体合并，直接更新 doc['structured_data']
 
-        provenance_map = {}
-
-        for doc in self.processed_documents:
-            chunks_with_ids = doc.get("graph_result", [])
-            structured_data_per_chunk = doc.get("structured_data", [])
+        Args:
+            doc: 文档字典
+            similarity_threshold (float): 用于筛选候选合并对的相似度阈值。
+        """
+        candidate = self._collect_merge_candidates(doc, similarity_threshold)
+        if candidate is None:
+            return
+        decisions = self.merge_confirmer.confirm(candidate["merge_pairs"])
+        confirmed_merges = self._resolve_merge_decisions(doc, candidate, decisions)
+        if not confirmed_merges:
+            return
+        merge_shard([(doc.get("structured_data", []), confirmed_merges)])
+        self.console.print(f"[bold green]文件 '{doc['filename']}' 的实体合并完成！[/bold green]")
+
+    def _collect_merge_candidates(self, doc: Dict, similarity_threshold: float = 0.95):
+        """
+        收集单个文档中的实体并生成候选合并实体对
 
-            if len(chunks_with_ids) != len(structured_data_per_chunk):
-                continue  # 跳过不匹配的数据
+        Args:
+            doc: 文档字典
+            similarity_threshold (float): 用于筛选候选合并对的相似度阈值。
 
-            for i, chunk_data in enumerate(structured_data_per_chunk):
-                chunk_id = chunks_with_ids[i].get("chunk_id")
+        Returns:
+            Optional[Dict]: 包含实体频率、候选实体对及待确认实体对的字典，无需合并时返回None
+        """
+        self.console.print(f"\n[cyan]正在处理文件: {doc['filename']}...[/cyan]")
+
+        structured_data_per_chunk = doc.get("structured_data", [])
+        if not structured_data_per_chunk:
+            self.console.print("[yellow]未发现结构化数据，跳过此文件。[/yellow]")
+            return None
+
+        # 1. 收集实体并计算其在文档中的出现频率
+        local_entities_map = {}  # 用于计算频率
+        entity_details_map = {}  # 用于查找实体的描述（如label, des）
+
+        for chunk_data in structured_data_per_chunk:
+            for entity_id, entity_data in chunk_data.node_items():
+                local_entities_map[entity_id] = local_entities_map.get(entity_id, 0) + 1
+                # 存储实体的详细数据，如果已存在则不覆盖
+                if entity_id not in entity_details_map:
+                    entity_details_map[entity_id] = entity_data
+
+        # 将 dict_keys 转换为 list 以便进行向量化
+        local_entities = list(local_entities_map.keys())
+
+        if len(local_entities) < 2:
+            self.console.print("[green]实体数量不足，无需合并。[/green]")
+            return None
+
+        # 2. 向量化和候选对生成
+        entity_names = [entity.split("__")[0] for entity in local_entities]
+        entity_embeddings = self.name_embeddings.embed_names(entity_names)
+        missing = [name for name, vector in zip(entity_names, entity_embeddings) if vector is None]
+        if missing:
+            # 向量计算失败的名称按原方式直接计算
+            self.console.print(f"[yellow]{len(missing)} 个实体名称向量不可用，重新计算[/yellow]")
+            entity_embeddings = self.embeddings.embed_documents(entity_names)
+        # 相似度超过阈值（分块矩阵乘法）或去掉问题ID后名称互为子串（包含索引）的实体对
+        candidate_pairs = find_candidate_pairs(local_entities, entity_embeddings, similarity_threshold,
+                                               names=entity_names)
+
+        if not candidate_pairs:
+            self.console.print("[green]未发现相似实体对，无需合并。[/green]")
+            return None
+        self.console.print(f"发现 {len(candidate_pairs)} 对候选实体，提交给LLM确认...")
+        self.console.print(f"候选实体对为：{candidate_pairs}")
+
+        # 3. 为每个实体附加类型和描述，供LLM确认
+        merge_pairs = []
+        for e1, e2 in candidate_pairs:
+            details1 = entity_details_map.get(e1, {})
+            details2 = entity_details_map.get(e2, {})
+            merge_pairs.append((
+                e1.split("__")[0], str(details1.get('type', '未知')), str(details1.get('description', '')),
+                e2.split("__")[0], str(details2.get('type', '未知')), str(details2.get('description', ''))
+            ))
+
+        return {
+            "local_entities_map": local_entities_map,
+            "candidate_pairs": candidate_pairs,
+            "merge_pairs": merge_pairs,
+        }
 
-                if not chunk_id:
-                    continue
-                # 遍历该chunk中出现的所有实体ID
-                for entity_id in chunk_data.get("nodes", {}).keys():
-                    provenance_map.setdefault(entity_id, set()).add(chunk_id)
+    def _resolve_merge_decisions(self, doc: Dict, candidate: Dict, decisions: List) -> Dict[str, str]:
+        """
+        按LLM确认结果生成单个文档的实体合并映射
 
-        self.console.print(f"[green]实体-chunkid构建完成，共计 {len(provenance_map)} 个实体。[/green]")
-        return provenance_map
+        Args:
+            doc: 文档字典
+            candidate: _collect_merge_candidates 的返回值
+            decisions: 与候选实体对一一对应的确认结果
 
-    def _prune_triples_in_memory(self, provenance_map: Dict[str, set]):
+        Returns:
+            Dict[str, str]: 源实体ID到目标实体ID的映射，没有确认的合并时为空
         """
-        在内存中直接对 self.processed_documents 的 'structured_data' 进行剪枝。
-        1. 移除纯局部的关系。
-        2. 移除因关系被剪除而变得孤立的节点。
+        local_entities_map = candidate["local_entities_map"]
+        confirmed_merges = {}
+        for (e1, e2), is_match in zip(candidate["candidate_pairs"], decisions):
+            if is_match:
+                source, target = (e1, e2) if (local_entities_map.get(e1, 0) <
+                                              local_entities_map.get(e2, 0)) else (e2, e1)
+                final_target = confirmed_merges.get(target, target)
+                confirmed_merges[source] = final_target
+
+        if not confirmed_merges:
+            self.console.print(f"[green]文件 '{doc['filename']}': LLM未确认任何合并操作。[/green]")
+        else:
+            self.console.print(f"文件 '{doc['filename']}': LLM确认了 {len(confirmed_merges)} 个合并操作。正在更新图谱数据...")
+        return confirmed_merges
+
+    def _build_entity_provenance(self) -> ProvenanceIncidence:
         """
-        self._display_stage_header("内存中进行稀疏化处理")
-
-        total_rels_before = 0
-        total_rels_after = 0
-
-        for doc in self.processed_documents:
-            if "structured_data" not in doc:
-                continue
-
-            for chunk_data in doc["structured_data"]:
-                if "relationships" not in chunk_data or "nodes" not in chunk_data:
-                    continue
+        遍历所有处理过的文档，基于预解析的结构化数据，
+        构建实体×chunk的稀疏出处关联矩阵，并保存供查询端复用。
+        """
+        self._display_stage_header("构建实体出处关联矩阵 (Provenance Incidence)")
 
-                original_relationships = chunk_data["relationships"]
-                total_rels_before += len(original_relationships)
+        provenance = self._documents_provenance(self.processed_documents)
+        self._save_entity_provenance(provenance)
+        return provenance
 
-                # 1. 剪枝关系
-                kept_relationships = []
-                for rel in original_relationships:
-                    subject_chunks = provenance_map.get(rel["head"])
-                    object_chunks = provenance_map.get(rel["tail"])
+    def _build_entity_provenance_out_of_core(self) -> ProvenanceIncidence:
+        """
+        超出内存模式下按窗口构建出处关联矩阵：每个窗口的矩阵保存到阶段存储目录，
+        全部窗口完成后从磁盘加载并拼接。实体ID带有问题ID后缀，不同窗口的实体互不重叠，
+        构建过程中不保留跨窗口的行列序号和实体映射
+        """
+        self._display_stage_header("构建实体出处关联矩阵 (Provenance Incidence)")
+
+        part_dir = os.path.join(self.stage_store.root, "provenance")
+        self.stage_store.clear("provenance")
+        os.makedirs(part_dir)
+        paths = []
+        for documents in self._scoped_windows("merged", ["chunks", "chunk_ids", "chunk_metadata", "structured_data"]):
+            path = os.path.join(part_dir, f"part-{len(paths):05d}.npz")
+            self._documents_provenance(documents).save(path)
+            paths.append(path)
+
+        provenance = ProvenanceIncidence.concatenate([ProvenanceIncidence.load(path) for path in paths])
+        self._save_entity_provenance(provenance)
+        return provenance
+
+    @staticmethod
+    def _documents_provenance(documents: Iterable[Dict]) -> ProvenanceIncidence:
+        """由一组文档的chunk_id和结构化数据构建出处关联矩阵"""
+        return ProvenanceIncidence.from_documents(
+            ([chunk.get("chunk_id") for chunk in doc.get("graph_result", [])], doc.get("structured_data", []))
+            for doc in documents
+        )
 
-                    # 条件1: 两个实体的出处集合不同 (原始的远程关系定义)
-                    is_remote_relation = (subject_chunks != object_chunks)
+    def _save_entity_provenance(self, provenance: ProvenanceIncidence):
+        """
+        保存出处关联矩阵供剪枝工作进程和查询端复用，并显示矩阵规模
 
-                    # 条件2: 出处集合相同，但它们在多个(>1) chunk中共同出现 (你提出的核心关联)
-                    is_core_association = (subject_chunks == object_chunks and len(subject_chunks) > 1)
+        Args:
+            provenance: 出处关联矩阵
+        """
+        try:
+            provenance.save(self.provenance_path)
+            self.provenance_saved = True
+        except Exception as e:
+            self.provenance_saved = False
+            self.console.print(f"[yellow]保存出处关联矩阵失败: {e}[/yellow]")
 
-                    if is_remote_relation or is_core_association:
-                        kept_relationships.append(rel)
+        self.console.print(f"[green]实体-chunkid构建完成，共计 {provenance.entity_count} 个实体，"
+                           f"{provenance.chunk_count} 个chunk，{provenance.matrix.nnz} 条出处记录。[/green]")
 
-                total_rels_after += len(kept_relationships)
-                chunk_data["relationships"] = kept_relationships  # 更新为剪枝后的关系
+    def _create_pruning_engine(self, provenance: ProvenanceIncidence) -> PruningEngine:
+        """
+        创建剪枝引擎，PRUNING_COMPARE 为True时同时计算全部策略用于对比
 
-                # 2. 剪枝节点：只保留那些仍在剩余关系中被引用的节点
-                if not kept_relationships:
-                    chunk_data["nodes"] = {}  # 如果没有关系了，就删除所有节点
-                else:
-                    active_entities = set()
-                    for rel in kept_relationships:
-                        active_entities.add(rel["head"])
-                        active_entities.add(rel["tail"])
-
-                    original_nodes = chunk_data["nodes"]
-                    kept_nodes = {
-                        node_id: properties
-                        for node_id, properties in original_nodes.items()
-                        if node_id in active_entities
-                    }
-                    chunk_data["nodes"] = kept_nodes  # 更新为剪枝后的节点
-
-        # 打印统计信息
-        pruned_count = total_rels_before - total_rels_after
-        sparsity_ratio = (pruned_count / total_rels_before * 100) if total_rels_before > 0 else 0.0
-        # ... (此处可以加入之前版本的美观的 rich.Table 输出) ...
-        self.console.print(
-            f"[green]内存稀疏化处理完成。剪除 {pruned_count} 条关系，稀疏率: {sparsity_ratio:.2f}%[/green]")
+        Args:
+            provenance: 实体×chunk 出处关联矩阵
+        """
+        strategies = None if PRUNING_COMPARE else [PRUNING_STRATEGIES[PRUNING_STRATEGY]()]
+        return PruningEngine(provenance, strategies)
 
-    def _prune_triples_in_memory_2hop(self, provenance_map: Dict[str, Set[str]]):
+    def _prune_structured_data(self, provenance: ProvenanceIncidence):
         """
-        在内存中基于“桥梁实体”策略对'structured_data'进行剪枝。
-        1. 识别所有“桥梁实体”（出现在多个chunk中的实体）。
-        2. 识别所有与桥梁实体直接相关的“一跳关系”和“一跳实体”。
-        3. 识别所有连接“一跳实体”的“二跳关系”。
-        4. 仅保留“一跳关系”和“二跳关系”，并剪除因此产生的孤立节点。
+        在内存中进行稀疏化处理：一次遍历计算所有剪枝策略，按 PRUNING_STRATEGY 原地剪枝，
+        并输出各策略的稀疏率对比。
         """
-        self._display_stage_header("内存中进行稀疏化处理 (桥梁实体策略)")
-
-        total_rels_before = 0
-        total_rels_after = 0
-
-        # --- 步骤 1: 识别全局的“桥梁实体” ---
-        # 这是一个一次性的、跨所有文档的操作，效率更高
-        bridge_entities = {
-            entity for entity, chunks in provenance_map.items() if len(chunks) > 1
-        }
-        self.console.print(f"在 {len(provenance_map)} 个实体中，识别出 {len(bridge_entities)} 个桥梁实体。")
-
-        for doc in self.processed_documents:
-            if "structured_data" not in doc:
-                continue
+        self._display_stage_header(f"内存稀疏化处理 (策略: {PRUNING_STRATEGY})")
 
-            for chunk_data in doc["structured_data"]:
-                if "relationships" not in chunk_data or "nodes" not in chunk_data:
-                    continue
-
-                original_relationships = chunk_data["relationships"]
-                total_rels_before += len(original_relationships)
-
-                if not original_relationships:
-                    chunk_data["nodes"] = {}
-                    continue
+        engine = self._create_pruning_engine(provenance)
+        self.console.print(f"在 {provenance.entity_count} 个实体中，识别出 {engine.bridge_count} 个桥梁实体。")
 
-                # --- 步骤 2: 识别此chunk内的“一跳关系”和“一跳实体” ---
-                one_hop_relationships = []
-                one_hop_entities = set()
-
-                for rel in original_relationships:
-                    # 只要关系的主体或客体是桥梁实体，就保留这个关系
-                    if rel["head"] in bridge_entities or rel["tail"] in bridge_entities:
-                        one_hop_relationships.append(rel)
-                        # 将这个关系中的两个实体都标记为“一跳实体”
-                        one_hop_entities.add(rel["head"])
-                        one_hop_entities.add(rel["tail"])
-
-                # --- 步骤 3: 识别此chunk内的“二跳关系” ---
-                # 二跳关系是指连接了一个“一跳实体”的关系
-                two_hop_relationships = []
-                for rel in original_relationships:
-                    # 如果一个关系不在一跳关系中 (避免重复)
-                    # 并且它的一端至少是“一跳实体”
-                    if rel not in one_hop_relationships and (rel["head"] in one_hop_entities or rel["tail"] in one_hop_entities):
-                        two_hop_relationships.append(rel)
-
-                # --- 步骤 4: 合并并更新数据 ---
-                kept_relationships = one_hop_relationships + two_hop_relationships
-                total_rels_after += len(kept_relationships)
-                chunk_data["relationships"] = kept_relationships
-
-                # 剪枝节点：只保留那些仍在最终关系中被引用的节点
-                if not kept_relationships:
-                    chunk_data["nodes"] = {}
-                else:
-                    active_entities = set()
-                    for rel in kept_relationships:
-                        active_entities.add(rel["head"])
-                        active_entities.add(rel["tail"])
-
-                    original_nodes = chunk_data["nodes"]
-                    kept_nodes = {
-                        node_id: properties
-                        for node_id, properties in original_nodes.items()
-                        if node_id in active_entities
-                    }
-                    chunk_data["nodes"] = kept_nodes
-
-        # 打印统计信息
-        pruned_count = total_rels_before - total_rels_after
-        sparsity_ratio = (pruned_count / total_rels_before * 100) if total_rels_before > 0 else 0.0
-        # ... 此处可以加入之前的美观的 rich.Table 输出 ...
-        self.console.print(
-            f"[green]内存稀疏化处理完成。剪除 {pruned_count} 条关系，稀疏率: {sparsity_ratio:.2f}%[/green]")
+        report = self._prune_documents(engine, self.processed_documents)
+        self._display_pruning_report(report)
 
-    def _prune_to_bridge_entities(self, provenance_map: Dict[str, Set[str]]):
+    def _prune_documents(self, engine: PruningEngine, documents: List[Dict]) -> Dict[str, Dict[str, int]]:
         """
-        在内存中进行稀疏化处理，保留所有桥梁实体节点，但只保留桥梁实体之间的关系。
-        此版本采用最高效的单次遍历逻辑。
-        """
-        self._display_stage_header("内存稀疏化处理 (保留所有桥梁实体节点 - 高效版)")
-
-        # (假设 chunk_to_doc_map 已用于准确识别跨文档的桥梁实体)
-        bridge_entities = {
-            entity for entity, chunks in provenance_map.items() if len(chunks) > 1
-        }
-        self.console.print(f"在 {len(provenance_map)} 个实体中，识别出 {len(bridge_entities)} 个桥梁实体。")
+        按问题分片在进程池中剪枝一组文档，原地替换 doc['structured_data']
 
-        total_rels_before = 0
-        total_rels_after = 0
+        Args:
+            engine: 剪枝引擎，提供参与计算的策略
+            documents: 文档列表
 
-        for doc in self.processed_documents:
-            if "structured_data" not in doc:
-                continue
-
-            # 在这个循环内完成所有剪枝操作
-            for chunk_data in doc["structured_data"]:
-                # --- 步骤 1: 过滤关系 ---
-                original_relationships = chunk_data.get("relationships", [])
-                total_rels_before += len(original_relationships)
-
-                kept_relationships = []
-                if original_relationships:
-                    for rel in original_relationships:
-                        if rel["head"] in bridge_entities and rel["tail"] in bridge_entities:
-                            kept_relationships.append(rel)
-
-                total_rels_after += len(kept_relationships)
-                chunk_data["relationships"] = kept_relationships
-
-                # --- 步骤 2: 过滤节点 (一步到位) ---
-                original_nodes = chunk_data.get("nodes", {})
-
-                # 关键修改：直接在此处根据全局 bridge_entities 集合进行剪枝
-                kept_nodes = {
-                    node_id: properties
-                    for node_id, properties in original_nodes.items()
-                    if node_id in bridge_entities
-                }
-                chunk_data["nodes"] = kept_nodes
+        Returns:
+            Dict[str, Dict[str, int]]: 各策略剪枝前后的关系数和节点数
+        """
+        # 从构建日志恢复的问题在中断前已完成剪枝
+        documents = [
+            doc for doc in documents
+            if "structured_data" in doc and not doc.get("journal_restored")
+        ]
+        # 任务只携带出处关联矩阵的文件路径，各工作进程加载一次后在各窗口之间复用；
+        # 各分片独立剪枝后按顺序累加统计
+        strategy_names = [strategy.name for strategy in engine.strategies]
+        context = prune_context(self.provenance_path, strategy_names, PRUNING_STRATEGY)
+        install_prune_engine(context, engine)
+        payloads = [doc["structured_data"] for doc in documents]
+        if self.provenance_saved:
+            results = self.stage_executor.map_shards(prune_shard, payloads, context)
+        else:
+            # 矩阵文件未能保存时工作进程无法加载，在主进程内剪枝
+            results = [prune_shard(shard, context) for shard in self.stage_executor.shard(payloads)]
+        report = new_pruning_report(engine.strategies)
+        structured = []
+        for shard_data, shard_report in results:
+            structured.extend(shard_data)
+            merge_pruning_reports(report, shard_report)
+        for doc, structured_data in zip(documents, structured):
+            doc["structured_data"] = structured_data
+        return report
+
+    def _display_pruning_report(self, report: Dict[str, Dict[str, int]]):
+        """显示各剪枝策略的稀疏率，并输出实际应用策略的结果"""
+        def ratio(before, after):
+            return (before - after) / before * 100 if before > 0 else 0.0
+
+        if len(report) > 1:
+            table = Table(title="剪枝策略对比", show_header=True)
+            table.add_column("策略", style="cyan")
+            table.add_column("关系(剪枝前→后)", justify="right")
+            table.add_column("关系稀疏率", justify="right")
+            table.add_column("节点(剪枝前→后)", justify="right")
+            table.add_column("节点稀疏率", justify="right")
+            for name, counts in report.items():
+                label = f"{name} (已应用)" if name == PRUNING_STRATEGY else name
+                table.add_row(
+                    label,
+                    f"{counts['relations_before']}→{counts['relations_after']}",
+                    f"{ratio(counts['relations_before'], counts['relations_after']):.2f}%",
+                    f"{counts['nodes_before']}→{counts['nodes_after']}",
+                    f"{ratio(counts['nodes_before'], counts['nodes_after']):.2f}%",
+                )
+            self.console.print(table)
 
-        # --- 打印统计信息 (逻辑不变) ---
-        pruned_count = total_rels_before - total_rels_after
-        sparsity_ratio = (pruned_count / total_rels_before * 100) if total_rels_before > 0 else 0.0
+        counts = report.get(PRUNING_STRATEGY, {})
+        before = counts.get("relations_before", 0)
+        after = counts.get("relations_after", 0)
         self.console.print(
-            f"[green]内存稀疏化处理完成。剪除 {pruned_count} 条关系，稀疏率: {sparsity_ratio:.2f}%[/green]")
+            f"[green]内存稀疏化处理完成。剪除 {before - after} 条关系，稀疏率: {ratio(before, after):.2f}%[/green]")
 
     def build_base_graph(self) -> List:
         """
@@ -627,7 +633,23 @@ class KnowledgeGraphBuilder:
         Returns:
             List: 处理后的文件内容列表，包含文件名、原文、分块和处理结果
         """
+        try:
+            return self._build_base_graph()
+        finally:
+            # 进程池在本次构建的各阶段之间复用，构建结束后关闭
+            self.stage_executor.close()
+
+    def _build_base_graph(self) -> List:
+        """按构建模式依次执行基础图谱构建的各阶段"""
         self._display_stage_header("构建基础知识图谱")
+        self._bootstrap_schema()
+
+        if self.build_mode == "sharded":
+            # 分片模式：当前进程只负责协调，各分片在独立进程中构建
+            return self._build_base_graph_sharded()
+        if self.build_mode == "out_of_core":
+            # 超出内存模式：各阶段按窗口读写磁盘上的阶段存储
+            return self._build_base_graph_out_of_core()
 
         try:
             # 1. 处理文件（读取和分块）
@@ -640,6 +662,8 @@ class KnowledgeGraphBuilder:
 
                 # 使用DatasetProcess处理数据集
                 self.processed_documents = self.dataset_processor.process_dataset()
+                if self.shard is not None:
+                    self.processed_documents = [doc for doc in self.processed_documents if self._in_shard(doc)]
                 progress.update(task, completed=1)
 
                 # 显示文件信息
@@ -660,6 +684,10 @@ class KnowledgeGraphBuilder:
                     )
                 self.console.print(table)
 
+            # 跨问题段落去重：重复段落统一为同一文本，只抽取一次、只写入一个Chunk节点
+            if PARAGRAPH_DEDUP:
+                self._deduplicate_paragraphs()
+
             self.performance_stats["文件处理"] = time.time() - process_start
 
             # 显示分块统计
@@ -671,47 +699,24 @@ class KnowledgeGraphBuilder:
             self.console.print(f"[blue]共处理 {len(self.processed_documents)} 个文件，总计 {total_length} 字符[/blue]")
             self.console.print(f"[blue]共生成 {total_chunks} 个文本块，平均每块 {avg_chunk_size:.1f} 字符[/blue]")
 
-            # 3. 构建图结构
-            struct_start = time.time()
-            with self._create_progress() as progress:
-                task = progress.add_task("[cyan]构建图结构...", total=3)
+            # 2. 根据构建日志跳过已完成的工作
+            if self.journal.stage_done(self.base_stage):
+                self.console.print("[green]构建日志显示基础图谱已构建完成，跳过（如需重建请关闭 BUILD_RESUME）[/green]")
+                return self._collect_file_contents()
+            self._resume_from_journal()
 
-                # 清空并创建Document节点
-                self.struct_builder.clear_database()
-                for doc in self.processed_documents:
-                    if "chunks" in doc:  # 只处理文档
-                        self.struct_builder.create_document(
-                            type="local",
-                            uri=str(DATASET_DIR),
-                            file_name=doc["filename"],
-                            domain=theme
-                        )
-                progress.advance(task)
+            if self.build_mode == "streaming":
+                # 流式模式：抽取、解析、剪枝和写入按问题重叠执行
+                return self._build_base_graph_streaming()
 
-                # 创建Chunk节点和关系 - 优化：使用并行处理大文件
+            # 3. 计算图结构（Document、Chunk节点及其关系随实体在写入阶段一起提交）
+            struct_start = time.time()
+            with self._create_progress() as progress:
+                task = progress.add_task("[cyan]构建图结构...", total=len(self.processed_documents))
                 for doc in self.processed_documents:
                     if "chunks" in doc:  # 只处理成功分块的文档
-                        # 根据chunks数量选择处理方法
-                        chunks = doc["chunks"]
-                        title = doc["title"]
-                        if doc.get("chunk_count", 0) > 9:
-                            # 对于大文件使用并行处理
-                            result = self.struct_builder.parallel_process_chunks(
-                                doc["filename"],
-                                chunks,
-                                title,
-                                max_workers=os.cpu_count() or 4
-                            )
-                        else:
-                            # 对于小文件使用标准批处理
-                            result = self.struct_builder.create_relation_between_chunks(
-                                doc["filename"],
-                                chunks,
-                                title
-                            )
-                        doc["graph_result"] = result
-                progress.advance(task)
-                progress.advance(task)
+                        self._create_chunk_structure(doc)
+                    progress.advance(task)
 
             self.performance_stats["图结构构建"] = time.time() - struct_start
 
@@ -720,52 +725,16 @@ class KnowledgeGraphBuilder:
             with self._create_progress() as progress:
                 total_chunks = sum(doc.get("chunk_count", 0) for doc in self.processed_documents)
                 task = progress.add_task("[cyan]提取实体和关系...", total=total_chunks)
+                file_task = progress.add_task("[cyan]已完成文件...", total=len(self.processed_documents))
 
                 def progress_callback(chunk_index):
                     progress.advance(task)
 
-                # 准备处理的数据格式
-                file_contents_format = []
-                for doc in self.processed_documents:
-                    if "chunks" in doc:
-                        file_contents_format.append([
-                            doc["filename"],
-                            doc["content"],
-                            doc["chunks"]
-                        ])
-                self._display_stage_header(f"总chunk数为：{total_chunks}")
-                # 根据数据集大小选择处理方法
-                if total_chunks > 100000000000000:
-                    # 对于大型数据集使用批处理模式
-                    self._display_stage_header("正在使用批处理模式")
-                    processed_file_contents = self.entity_extractor.process_chunks_batch(
-                        file_contents_format,
-                        progress_callback
-                    )
-                else:
-                    # 对于小型数据集使用标准并行处理
-                    self._display_stage_header("正在使用并行处理模式")
-                    processed_file_contents = self.entity_extractor.process_chunks(
-                        file_contents_format,
-                        progress_callback
-                    )
+                def file_callback(file_index, file_content):
+                    progress.advance(file_task)
 
-                # 将处理结果合并回文档数据
-                file_content_map = {}
-                for processed_file in processed_file_contents:
-                    if len(processed_file) >= 4:  # 确保有足够的元素
-                        filename = processed_file[0]
-                        entity_data = processed_file[3]
-                        file_content_map[filename] = entity_data
-
-                # 使用映射将结果放回到原始文档中
-                for doc in self.processed_documents:
-                    if "chunks" in doc:
-                        filename = doc["filename"]
-                        if filename in file_content_map:
-                            doc["entity_data"] = file_content_map[filename]
-                        else:
-                            self.console.print(f"[yellow]警告: 文件 {filename} 的实体抽取结果未找到[/yellow]")
+                self._display_stage_header(f"总chunk数为：{total_chunks}")
+                self._extract_entity_data(self.processed_documents, progress_callback, file_callback)
 
             self.performance_stats["实体抽取"] = time.time() - extract_start
 
@@ -776,6 +745,8 @@ class KnowledgeGraphBuilder:
             cache_rate = (cache_hits / total_requests * 100) if total_requests > 0 else 0
 
             self.console.print(f"[blue]LLM调用缓存命中率: {cache_rate:.1f}% ({cache_hits}/{total_requests})[/blue]")
+            llm_governor.print_stats()
+            self.entity_extractor.print_stream_stats()
 
             # 5. 预解析实体关系字符串和合并相似实体
             self._pre_parse_entity_data()
@@ -783,13 +754,14 @@ class KnowledgeGraphBuilder:
 
             # 6. 内存稀疏化处理
             prune_start = time.time()
-            # 6.1 构建全局实体出处地图s
-            entity_provenance_map = self._build_entity_provenance_map()
+            # 6.1 构建全局实体出处关联矩阵
+            entity_provenance = self._build_entity_provenance()
 
-            # 6.2 基于map在内存中剪除局部三元组  1跳 2跳 仅桥实体
-            # self._prune_triples_in_memory(entity_provenance_map)
-            # self._prune_triples_in_memory_2hop(entity_provenance_map)
-            self._prune_to_bridge_entities(entity_provenance_map)
+            # 6.2 基于关联矩阵在内存中剪除局部三元组，策略见 PRUNING_STRATEGY（local / two_hop / bridge）
+            self._prune_structured_data(entity_provenance)
+
+            # 6.3 记录剪枝后的结构化数据，中断后可直接从这里恢复
+            self._save_structured(self.processed_documents)
 
             # self.performance_stats["内存稀疏化"] = time.time() - prune_start
 
@@ -799,66 +771,864 @@ class KnowledgeGraphBuilder:
             # 8. 写入数据库 (现在写入的是稀疏数据)
             write_start = time.time()
             with self._create_progress() as progress:
-                task = progress.add_task("[cyan]写入数据库...", total=1)
-
-                graph_writer_data = []
-                for doc in self.processed_documents:
-                    if "structured_data" in doc:  # 使用新的键
-                        graph_writer_data.append([
-                            doc["filename"],
-                            doc["content"],
-                            doc["chunks"],
-                            doc.get("graph_result", []),
-                            doc.get("structured_data", []),  # 传入稀疏化的结构化数据
-                        ])
-
-                # 使用优化的GraphWriter
-                graph_writer = GraphWriter(
-                    self.graph,
-                    batch_size=50,
-                    max_workers=os.cpu_count() or 4
-                )
-                # 写入数据库
-                graph_writer.process_and_write_graph_documents(graph_writer_data)
-                progress.update(task, completed=1)
-
+                docs_to_write = self._docs_to_write(self.processed_documents)  # 使用新的键
+                task = progress.add_task("[cyan]写入数据库...", total=len(docs_to_write))
+
+                # 使用优化的GraphWriter，导出模式下为 neo4j-admin 导出器
+                graph_writer = self._create_graph_writer()
+                # 分组写入数据库，每组写完后记录进度
+                for i in range(0, len(docs_to_write), BUILD_JOURNAL_COMMIT_DOCS):
+                    group = docs_to_write[i:i + BUILD_JOURNAL_COMMIT_DOCS]
+                    self._write_documents(graph_writer, group)
+                    progress.advance(task, len(group))
+            self._finish_graph_writer(graph_writer)
+            self._display_chunk_write_stats()
+
+            self._mark_base_stage({"questions": len(docs_to_write)})
             self.performance_stats["写入数据库"] = time.time() - write_start
 
             self.console.print("[green]基础知识图谱构建完成[/green]")
 
             # 显示性能统计
-            performance_table = Table(title="性能统计")
-            performance_table.add_column("处理阶段", style="cyan")
-            performance_table.add_column("耗时(秒)", justify="right")
-            performance_table.add_column("占比(%)", justify="right")
-
-            total_time = sum(self.performance_stats.values())
-            for stage, elapsed in self.performance_stats.items():
-                percentage = (elapsed / total_time * 100) if total_time > 0 else 0
-                performance_table.add_row(stage, f"{elapsed:.2f}", f"{percentage:.1f}")
-
-            performance_table.add_row("总计", f"{total_time:.2f}", "100.0", style="bold")
-            self.console.print(performance_table)
+            self._display_performance_stats()
 
             # 返回处理好的文档列表
-            file_contents_compat = []
-            for doc in self.processed_documents:
-                if "chunks" in doc:
-                    content_list = [
-                        doc["filename"],
-                        doc["content"],
-                        doc["chunks"]
-                    ]
-                    if "entity_data" in doc:
-                        content_list.append(doc["entity_data"])
-                    file_contents_compat.append(content_list)
-
-            return file_contents_compat
+            return self._collect_file_contents()
 
         except Exception as e:
             self.console.print(f"[red]基础图谱构建失败: {str(e)}[/red]")
             raise
 
+    def _extract_entity_data(self, documents: List[Dict], progress_callback=None, file_callback=None):
+        """
+        对一组文档抽取实体和关系，结果保存在 doc['entity_data']
+
+        Args:
+            documents: 文档列表，已从构建日志恢复的问题无需再次抽取
+            progress_callback: 每个chunk抽取完成后的回调
+            file_callback: 每个文件抽取完成后的回调
+        """
+        # 准备处理的数据格式（已从构建日志恢复的问题无需再次抽取）
+        file_contents_format = []
+        for doc in documents:
+            if "chunks" in doc and not doc.get("journal_restored"):
+                file_contents_format.append([
+                    doc["filename"],
+                    doc["content"],
+                    doc["chunks"]
+                ])
+        if not file_contents_format:
+            return
+        total_chunks = sum(doc.get("chunk_count", 0) for doc in documents)
+        # 根据数据集大小选择处理方法
+        if total_chunks > 100000000000000:
+            # 对于大型数据集使用批处理模式
+            self._display_stage_header("正在使用批处理模式")
+            processed_file_contents = self.entity_extractor.process_chunks_batch(
+                file_contents_format,
+                progress_callback
+            )
+        elif ASYNC_LLM:
+            # 异步模式：单进程保持大量在途请求
+            self._display_stage_header("正在使用异步处理模式")
+            processed_file_contents = asyncio.run(self.entity_extractor.aprocess_chunks(
+                file_contents_format,
+                progress_callback,
+                file_callback
+            ))
+        else:
+            # 对于小型数据集使用标准并行处理
+            self._display_stage_header("正在使用并行处理模式")
+            processed_file_contents = self.entity_extractor.process_chunks(
+                file_contents_format,
+                progress_callback,
+                file_callback
+            )
+
+        # 将处理结果合并回文档数据
+        file_content_map = {}
+        for processed_file in processed_file_contents:
+            if len(processed_file) >= 4:  # 确保有足够的元素
+                filename = processed_file[0]
+                entity_data = processed_file[3]
+                file_content_map[filename] = entity_data
+
+        # 使用映射将结果放回到原始文档中
+        for doc in documents:
+            if "chunks" in doc:
+                filename = doc["filename"]
+                if filename in file_content_map:
+                    doc["entity_data"] = file_content_map[filename]
+                    self._record_failed_chunks(doc)
+                elif not doc.get("journal_restored"):
+                    self.console.print(f"[yellow]警告: 文件 {filename} 的实体抽取结果未找到[/yellow]")
+
+    def _record_failed_chunks(self, doc: Dict):
+        """
+        记录文档中抽取失败的chunk（结果为空字符串）。该问题仍然写入数据库，
+        但不记录到构建日志，重新运行时重新抽取（成功的chunk命中缓存）
+
+        Args:
+            doc: 刚取得抽取结果的文档
+        """
+        failed = self.entity_extractor.failed_chunks.get(doc["filename"])
+        if failed:
+            doc["failed_chunks"] = failed
+            self.incomplete_questions.add(doc.get("question_id"))
+
+    def _save_structured(self, documents: List[Dict]):
+        """
+        把剪枝后的结构化数据记录到构建日志。从日志恢复的问题已记录过，有chunk抽取失败的问题不记录
+
+        Args:
+            documents: 已剪枝的文档列表
+        """
+        self.journal.save_structured({
+            doc["question_id"]: doc["structured_data"]
+            for doc in documents
+            if "structured_data" in doc and not doc.get("journal_restored") and not doc.get("failed_chunks")
+        })
+
+    def _mark_base_stage(self, info: Dict[str, Any]):
+        """
+        所有问题都已完整写入时在构建日志中标记基础图谱阶段完成；
+        有问题抽取或写入失败时不标记，重新运行时只重做这些问题
+
+        Args:
+            info: 阶段信息
+        """
+        if self.incomplete_questions:
+            self.console.print(f"[yellow]{len(self.incomplete_questions)} 个问题抽取或写入失败，"
+                               f"基础图谱阶段未标记完成，重新运行时将重做这些问题[/yellow]")
+            return
+        self.journal.mark_stage(self.base_stage, info)
+
+    def _deduplicate_paragraphs(self):
+        """对所有问题的段落做完全重复和近似重复去重，并显示复用率"""
+        stats = ParagraphDeduplicator().deduplicate(self.processed_documents)
+        total = stats["total"]
+        reused = stats["exact"] + stats["near"]
+        self._display_results_table("跨问题段落去重", {
+            "段落引用总数": total,
+            "完全重复": stats["exact"],
+            "近似重复": stats["near"],
+            "唯一段落": stats["unique"],
+            "复用率": f"{reused / total * 100:.1f}%" if total else "0.0%",
+        })
+
+    def _display_chunk_write_stats(self):
+        """显示Chunk节点写入与复用次数"""
+        written = self.struct_builder.chunks_written
+        linked = self.struct_builder.chunks_linked
+        if written + linked:
+            self.console.print(f"[blue]Chunk节点写入 {written} 个，复用已有节点 {linked} 次 "
+                               f"({linked / (written + linked) * 100:.1f}%)[/blue]")
+
+    def _resume_from_journal(self):
+        """
+        根据构建日志恢复进度：
+        - 日志为空时清空数据库，从头构建
+        - 已写入的问题从待处理列表中移除
+        - 已剪枝但未写入的问题恢复结构化数据，跳过抽取、解析、合并和剪枝
+        """
+        if self.journal.is_fresh():
+            # 分片模式下由协调进程统一清空数据库；导出模式不访问数据库
+            if self.shard is None and not self.export_graph:
+                self.struct_builder.clear_database()
+            return
+
+        states = self.journal.question_states()
+        written = self._written_questions(states)
+        total = len(self.processed_documents)
+        self.processed_documents = [
+            doc for doc in self.processed_documents if doc.get("question_id") not in written
+        ]
+
+        restored = self.journal.load_structured([
+            doc["question_id"] for doc in self.processed_documents
+            if states.get(doc.get("question_id")) in ("pruned", "written")
+        ])
+        for doc in self.processed_documents:
+            if doc.get("question_id") in restored:
+                doc["structured_data"] = restored[doc["question_id"]]
+                doc["journal_restored"] = True
+
+        self._display_results_table("断点续建", {
+            "问题总数": total,
+            "已写入(跳过)": total - len(self.processed_documents),
+            "已剪枝(恢复)": len(restored),
+            "待处理": len(self.processed_documents) - len(restored),
+        })
+
+    def _written_questions(self, states: Dict[str, str]) -> set:
+        """
+        构建日志中已写入数据库、可以直接跳过的问题。
+        导出模式需要导出完整的图谱，已写入的问题同样从日志恢复结构化数据后重新导出。
+        """
+        if self.export_graph:
+            return set()
+        return {qid for qid, state in states.items() if state == "written"}
+
+    def _docs_to_write(self, documents: List[Dict]) -> List[Dict]:
+        """
+        需要写入的文档：所有分块成功的文档。没有抽取结果的文档同样需要写入Document和Chunk节点
+        """
+        return [doc for doc in documents if "chunks" in doc]
+
+    def _create_graph_writer(self):
+        """创建基础图谱的写入器：数据库模式为 GraphWriter，导出模式为 neo4j-admin 导出器"""
+        if self.export_graph:
+            return AdminImportExporter()
+        return GraphWriter(
+            self.graph,
+            batch_size=50,
+            max_workers=os.cpu_count() or 4
+        )
+
+    def _finish_graph_writer(self, graph_writer):
+        """导出模式下写出表头文件和导入脚本，并显示导入方法"""
+        if not self.export_graph:
+            return
+        self.admin_import_command = graph_writer.close()
+        self._display_results_table("neo4j-admin 导出", graph_writer.counts)
+        self.console.print(f"[green]基础图谱已导出到 {graph_writer.directory}[/green]")
+        self.console.print("[yellow]请停止Neo4j后执行导入脚本（目标数据库必须为空），启动Neo4j后重新运行构建，"
+                           "基础图谱阶段将被跳过，继续构建索引和社区：[/yellow]")
+        self.console.print(f"  sh {os.path.join(graph_writer.directory, 'import.sh')}")
+
+    def _write_documents(self, graph_writer, docs: List[Dict]):
+        """
+        将一组已剪枝的文档连同其Document、Chunk结构写入数据库，全部提交后才登记新写入的Chunk，
+        并在构建日志中把有抽取结果的问题标记为已写入（没有抽取结果或有chunk抽取失败的问题恢复时重新抽取）；
+        写入失败时两者都不记录，恢复时重新写入。导出模式下写入导出文件，不修改构建日志中的问题状态
+
+        Args:
+            graph_writer: 图写入器或 neo4j-admin 导出器
+            docs: 文档列表，需已包含 chunks、title 和 graph_result
+        """
+        if self.export_graph:
+            graph_writer.write_documents(docs)
+            return
+        # 整组文档的结构合并为少量UNWIND语句，与第一批实体在同一事务中提交
+        structure_statements, new_chunk_ids = self.struct_builder.build_structure_statements(
+            [(doc["filename"], doc["chunks"], doc["title"]) for doc in docs],
+            type="local",
+            uri=str(DATASET_DIR),
+            domain=theme
+        )
+        written = graph_writer.process_and_write_graph_documents([
+            [
+                doc["filename"],
+                doc["content"],
+                doc["chunks"],
+                doc.get("graph_result", []),
+                doc["structured_data"],  # 传入稀疏化的结构化数据
+            ]
+            for doc in docs if "structured_data" in doc
+        ], structure_statements=structure_statements)
+        if not written:
+            self.console.print(f"[yellow]{len(docs)} 个问题写入不完整，未记录为已写入，重新运行时将重新写入[/yellow]")
+            self.incomplete_questions.update(doc.get("question_id") for doc in docs)
+            return
+        self.struct_builder.mark_chunks_written(new_chunk_ids)
+        self.journal.mark_written({
+            doc["question_id"]: [chunk["chunk_id"] for chunk in doc.get("graph_result", [])]
+            for doc in docs if "structured_data" in doc and not doc.get("failed_chunks")
+        })
+
+    def _create_chunk_structure(self, doc: Dict):
+        """
+        计算单个文档的chunk_id和Chunk文档，结果保存在 doc['graph_result']。
+        不访问数据库，Document、Chunk节点及其关系在写入阶段随实体一起提交
+
+        Args:
+            doc: 文档字典
+        """
+        doc["graph_result"] = build_chunk_rows(doc["filename"], doc["chunks"], doc["title"])[2]
+
+    def _display_performance_stats(self):
+        """显示各阶段性能统计"""
+        performance_table = Table(title="性能统计")
+        performance_table.add_column("处理阶段", style="cyan")
+        performance_table.add_column("耗时(秒)", justify="right")
+        performance_table.add_column("占比(%)", justify="right")
+
+        total_time = sum(self.performance_stats.values())
+        for stage, elapsed in self.performance_stats.items():
+            percentage = (elapsed / total_time * 100) if total_time > 0 else 0
+            performance_table.add_row(stage, f"{elapsed:.2f}", f"{percentage:.1f}")
+
+        performance_table.add_row("总计", f"{total_time:.2f}", "100.0", style="bold")
+        self.console.print(performance_table)
+        get_db_manager().session_pool.print_stats()
+
+    def _collect_file_contents(self) -> List:
+        """
+        将处理好的文档整理为 [文件名, 原文, 分块, 抽取结果] 列表
+
+        Returns:
+            List: 文件内容列表
+        """
+        file_contents_compat = []
+        for doc in self.processed_documents:
+            if "chunks" in doc:
+                content_list = [
+                    doc["filename"],
+                    doc["content"],
+                    doc["chunks"]
+                ]
+                if "entity_data" in doc:
+                    content_list.append(doc["entity_data"])
+                file_contents_compat.append(content_list)
+
+        return file_contents_compat
+
+    def _build_base_graph_streaming(self) -> List:
+        """
+        流式构建基础知识图谱
+
+        实体ID按问题隔离(name__question_id)，各问题的子图互不依赖，
+        因此每个问题抽取完成后立即依次经过预解析、局部实体合并、剪枝和写入，
+        LLM抽取与Neo4j写入重叠执行。各阶段之间通过有界队列连接，抽取器不累积结果，
+        抽取字符串在解析后、结构化数据在写入后立即释放。全部问题的原文和分块仍在构建开始时读入内存，
+        字符串驻留表在流水线运行期间也不清空，内存占用随语料规模增长，超出内存的语料请使用 out_of_core 模式。
+
+        Returns:
+            List: 处理后的文件内容列表，抽取结果在解析后已释放，不包含在内
+        """
+        self._display_stage_header("流式构建：抽取 → 解析 → 剪枝 → 写入")
+
+        # 文档和Chunk结构由写入阶段按问题创建
+        documents = [doc for doc in self.processed_documents if "chunks" in doc]
+        # 从构建日志恢复的问题跳过抽取，直接进入写入
+        extract_documents = [doc for doc in documents if not doc.get("journal_restored")]
+        transform_queue = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        write_queue = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        errors = []
+        counter_lock = threading.Lock()
+        stage_times = {"解析与剪枝": 0.0, "写入数据库": 0.0}
+        rel_counts = {"transform_alive": STREAM_TRANSFORM_WORKERS}
+        prune_report = {}
+
+        graph_writer = GraphWriter(
+            self.graph,
+            batch_size=50,
+            max_workers=os.cpu_count() or 4
+        )
+
+        def put(q: queue.Queue, item):
+            # 下游阶段失败后不再阻塞等待
+            while not errors:
+                try:
+                    q.put(item, timeout=1)
+                    return
+                except queue.Full:
+                    continue
+            raise RuntimeError("流式构建的下游阶段已失败")
+
+        def get(q: queue.Queue):
+            while not errors:
+                try:
+                    return q.get(timeout=1)
+                except queue.Empty:
+                    continue
+            return _STREAM_END
+
+        def transform_worker():
+            try:
+                while True:
+                    doc = get(transform_queue)
+                    if doc is _STREAM_END:
+                        break
+                    if doc.get("journal_restored"):
+                        put(write_queue, doc)
+                        continue
+                    t0 = time.time()
+                    self._parse_document_entities(doc)
+                    doc.pop("entity_data", None)
+                    self._merge_document_entities(doc)
+
+                    # chunk_id 与结构构建器保持一致：由chunk内容哈希得到
+                    chunk_ids = [generate_hash(''.join(chunk)) for chunk in doc["chunks"]]
+                    provenance = ProvenanceIncidence.from_documents([(chunk_ids, doc.get("structured_data", []))])
+                    report = self._create_pruning_engine(provenance).prune_document(doc, PRUNING_STRATEGY)
+                    self._save_structured([doc])
+                    with counter_lock:
+                        merge_pruning_reports(prune_report, report)
+                        stage_times["解析与剪枝"] += time.time() - t0
+                    put(write_queue, doc)
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                # 最后一个退出的转换线程通知写入线程结束
+                with counter_lock:
+                    rel_counts["transform_alive"] -= 1
+                    last = rel_counts["transform_alive"] == 0
+                if last and not errors:
+                    put(write_queue, _STREAM_END)
+
+        def write_worker():
+            try:
+                finished = False
+                while not finished:
+                    doc = get(write_queue)
+                    if doc is _STREAM_END:
+                        break
+                    # 尽量攒够一批文档再写入，减少数据库往返
+                    batch = [doc]
+                    while len(batch) < STREAM_WRITE_BATCH_DOCS:
+                        try:
+                            doc = write_queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if doc is _STREAM_END:
+                            finished = True
+                            break
+                        batch.append(doc)
+
+                    t0 = time.time()
+                    for doc in batch:
+                        self._create_chunk_structure(doc)
+
+                    # 文档结构与实体在同一事务中写入
+                    self._write_documents(graph_writer, batch)
+
+                    for doc in batch:
+                        # 写入后释放中间结果，保持内存平稳
+                        doc.pop("structured_data", None)
+                        doc.pop("graph_result", None)
+                        progress.advance(write_task)
+                    stage_times["写入数据库"] += time.time() - t0
+            except BaseException as e:
+                errors.append(e)
+
+        extract_start = time.time()
+        with self._create_progress() as progress:
+            total_chunks = sum(doc.get("chunk_count", 0) for doc in extract_documents)
+            task = progress.add_task("[cyan]提取实体和关系...", total=total_chunks)
+            write_task = progress.add_task("[cyan]已写入问题...", total=len(documents))
+
+            def progress_callback(chunk_index):
+                progress.advance(task)
+
+            def file_callback(file_index, file_content):
+                # 某个问题的全部chunk抽取完成后立即进入下游阶段
+                doc = extract_documents[file_index]
+                doc["entity_data"] = file_content[3]
+                self._record_failed_chunks(doc)
+                put(transform_queue, doc)
+
+            workers = [
+                threading.Thread(target=transform_worker, daemon=True)
+                for _ in range(STREAM_TRANSFORM_WORKERS)
+            ]
+            workers.append(threading.Thread(target=write_worker, daemon=True))
+            for worker in workers:
+                worker.start()
+
+            try:
+                for doc in documents:
+                    if doc.get("journal_restored"):
+                        put(transform_queue, doc)
+
+                file_contents_format = [
+                    [doc["filename"], doc["content"], doc["chunks"]] for doc in extract_documents
+                ]
+                if ASYNC_LLM:
+                    async def afile_callback(file_index, file_content):
+                        # 转换队列已满时在线程中等待，只暂停完成该问题的协程，不阻塞事件循环上的其他请求
+                        await asyncio.to_thread(file_callback, file_index, file_content)
+
+                    asyncio.run(self.entity_extractor.aprocess_chunks(
+                        file_contents_format,
+                        progress_callback,
+                        afile_callback,
+                        keep_results=False
+                    ))
+                else:
+                    self.entity_extractor.process_chunks(
+                        file_contents_format,
+                        progress_callback,
+                        file_callback,
+                        keep_results=False
+                    )
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                extract_end = time.time()
+                if not errors:
+                    for _ in range(STREAM_TRANSFORM_WORKERS):
+                        put(transform_queue, _STREAM_END)
+                for worker in workers:
+                    worker.join()
+
+        if errors:
+            raise errors[0]
+        self._mark_base_stage({"questions": len(documents)})
+
+        # 各阶段重叠执行：抽取阶段记墙钟时间，写入阶段只记抽取结束后的收尾时间
+        total_time = time.time() - extract_start
+        self.performance_stats["实体抽取"] = extract_end - extract_start
+        self.performance_stats["写入数据库"] = total_time - self.performance_stats["实体抽取"]
+        self.console.print(f"[blue]各阶段累计耗时（与抽取重叠）: 解析与剪枝 {stage_times['解析与剪枝']:.2f}秒, "
+                           f"写入数据库 {stage_times['写入数据库']:.2f}秒[/blue]")
+        self._display_chunk_write_stats()
+
+        llm_governor.print_stats()
+        self.entity_extractor.print_stream_stats()
+        self._display_pruning_report(prune_report)
+        self.console.print(f"[green]基础知识图谱构建完成（流式），流水线总耗时: {total_time:.2f}秒[/green]")
+        self._display_performance_stats()
+
+        return self._collect_file_contents()
+
+    def _build_base_graph_out_of_core(self) -> Iterator[List]:
+        """
+        超出内存的分阶段构建
+
+        流程与分阶段模式相同，但每个阶段按窗口（STAGE_WINDOW_DOCS 个问题）从阶段存储读取输入，
+        处理后把输出写回磁盘，内存中只保留一个窗口的文档。段落去重表保存在阶段存储目录下的SQLite文件中，
+        字符串驻留表在每个窗口处理完后清空，已写入的Chunk节点登记在构建日志中，出处关联矩阵按窗口构建并保存到磁盘后再拼接，
+        跨窗口保留在内存中的只有构建日志中的问题状态和拼接后的实体出处关联矩阵。
+
+        Returns:
+            Iterator[List]: 逐个生成 [文件名, 原文, 分块, 抽取结果]，从阶段存储中读取
+        """
+        store = self.stage_store
+
+        # 1. 读取、分块和段落去重，写入 loaded 阶段
+        process_start = time.time()
+        self._load_documents_out_of_core()
+        self.performance_stats["文件处理"] = time.time() - process_start
+
+        # 2. 根据构建日志跳过已完成的工作
+        if self.journal.stage_done(self.base_stage):
+            self.console.print("[green]构建日志显示基础图谱已构建完成，跳过（如需重建请关闭 BUILD_RESUME）[/green]")
+            return self._iter_file_contents("loaded")
+        if self.journal.is_fresh():
+            # 分片模式下由协调进程统一清空数据库；导出模式不访问数据库
+            if self.shard is None and not self.export_graph:
+                self.struct_builder.clear_database()
+            states = {}
+        else:
+            states = self.journal.question_states()
+
+        total = store.count("loaded")
+        resume_counts = {"written": 0, "restored": 0}
+
+        # 3. 构建图结构并抽取实体和关系，写入 extracted 阶段
+        extract_start = time.time()
+        with self._create_progress() as progress, store.writer("extracted") as writer:
+            task = progress.add_task("[cyan]构建图结构并提取实体和关系...", total=total)
+            for window in self._scoped_windows("loaded"):
+                documents = self._resume_window(window, states, resume_counts)
+                for doc in documents:
+                    if "chunks" in doc:
+                        self._create_chunk_structure(doc)
+                self._extract_entity_data(documents)
+                writer.extend(documents)
+                progress.advance(task, len(window))
+        self.performance_stats["实体抽取"] = time.time() - extract_start
+        self._display_results_table("断点续建", {
+            "问题总数": total,
+            "已写入(跳过)": resume_counts["written"],
+            "已剪枝(恢复)": resume_counts["restored"],
+            "待处理": total - resume_counts["written"] - resume_counts["restored"],
+        })
+        llm_governor.print_stats()
+        self.entity_extractor.print_stream_stats()
+
+        # 4. 预解析实体关系字符串和合并相似实体，写入 merged 阶段（不再携带抽取字符串）
+        self._display_stage_header("预解析实体关系字符串并合并相似实体")
+        with store.writer("merged") as writer:
+            for documents in self._scoped_windows("extracted"):
+                self._parse_documents(documents)
+                self._merge_local_entities(documents=documents)
+                for doc in documents:
+                    doc.pop("entity_data", None)
+                writer.extend(documents)
+
+        # 5. 按窗口构建出处关联矩阵并保存到磁盘，全部窗口完成后拼接为全局矩阵
+        entity_provenance = self._build_entity_provenance_out_of_core()
+
+        # 6. 按窗口剪枝、记录到构建日志并写入数据库
+        self._display_stage_header(f"内存稀疏化处理并写入数据库 (策略: {PRUNING_STRATEGY})")
+        engine = self._create_pruning_engine(entity_provenance)
+        self.console.print(f"在 {entity_provenance.entity_count} 个实体中，识别出 {engine.bridge_count} 个桥梁实体。")
+        report = new_pruning_report(engine.strategies)
+        graph_writer = self._create_graph_writer()
+        written = 0
+        write_start = time.time()
+        with self._create_progress() as progress:
+            task = progress.add_task("[cyan]写入数据库...", total=store.count("merged"))
+            for window in self._scoped_windows("merged"):
+                merge_pruning_reports(report, self._prune_documents(engine, window))
+                self._save_structured(window)
+                docs_to_write = self._docs_to_write(window)
+                for i in range(0, len(docs_to_write), BUILD_JOURNAL_COMMIT_DOCS):
+                    group = docs_to_write[i:i + BUILD_JOURNAL_COMMIT_DOCS]
+                    self._write_documents(graph_writer, group)
+                written += len(docs_to_write)
+                progress.advance(task, len(window))
+        self._display_pruning_report(report)
+        self._finish_graph_writer(graph_writer)
+        self._display_chunk_write_stats()
+
+        self._mark_base_stage({"questions": written})
+        self.performance_stats["写入数据库"] = time.time() - write_start
+
+        self.console.print("[green]基础知识图谱构建完成（超出内存模式）[/green]")
+        self._display_performance_stats()
+
+        return self._iter_file_contents("extracted")
+
+    def _scoped_windows(self, stage: str, columns: Optional[List[str]] = None) -> Iterator[List[Dict]]:
+        """
+        逐个窗口读取阶段存储。调用方处理完一个窗口才会读取下一个，此时上一窗口的结构化数据
+        已经写回磁盘、不再使用，清空字符串驻留表，驻留表不随语料增长
+
+        Args:
+            stage: 阶段名称
+            columns: 只读取的列，默认读取全部列
+        """
+        for window in self.stage_store.windows(stage, columns):
+            yield window
+            string_table.clear()
+
+    def _load_documents_out_of_core(self):
+        """逐条读取数据集并分块、去重，按窗口写入阶段存储的 loaded 阶段"""
+        deduplicator = None
+        if PARAGRAPH_DEDUP:
+            # 去重表保存在磁盘上，以段落哈希为键，内存占用不随语料增长
+            deduplicator = ParagraphDeduplicator(db_path=os.path.join(self.stage_store.root, "paragraph_dedup.sqlite"))
+        total_chunks = 0
+        total_length = 0
+        total_chunk_length = 0
+        with self._create_progress() as progress, self.stage_store.writer("loaded") as writer:
+            task = progress.add_task("[cyan]处理文件...", total=len(self.dataset_processor.dataset))
+            for doc in self.dataset_processor.iter_documents():
+                if not self._in_shard(doc):
+                    progress.advance(task)
+                    continue
+                if deduplicator is not None:
+                    deduplicator.deduplicate_document(doc)
+                total_chunks += doc.get("chunk_count", 0)
+                total_length += doc["content_length"]
+                total_chunk_length += sum(doc.get("chunk_lengths", [0]))
+                writer.append(doc)
+                progress.advance(task)
+
+        if deduplicator is not None:
+            deduplicator.close()
+            stats = deduplicator.stats
+            reused = stats["exact"] + stats["near"]
+            self._display_results_table("跨问题段落去重", {
+                "段落引用总数": stats["total"],
+                "完全重复": stats["exact"],
+                "近似重复": stats["near"],
+                "唯一段落": stats["unique"],
+                "复用率": f"{reused / stats['total'] * 100:.1f}%" if stats["total"] else "0.0%",
+            })
+
+        avg_chunk_size = total_chunk_length / total_chunks if total_chunks else 0
+        self.console.print(f"[blue]共处理 {writer.count} 个文件，总计 {total_length} 字符，"
+                           f"分为 {writer.segments} 个分段（每段最多 {STAGE_WINDOW_DOCS} 个问题）[/blue]")
+        self.console.print(f"[blue]共生成 {total_chunks} 个文本块，平均每块 {avg_chunk_size:.1f} 字符[/blue]")
+
+    def _resume_window(self, documents: List[Dict], states: Dict[str, str], counts: Dict[str, int]) -> List[Dict]:
+        """
+        按构建日志处理一个窗口：移除已写入的问题，已剪枝的问题恢复结构化数据
+
+        Args:
+            documents: 一个窗口的文档
+            states: 构建日志中的问题状态
+            counts: 累计的跳过和恢复数量，原地更新
+
+        Returns:
+            List[Dict]: 仍需处理的文档
+        """
+        if not states:
+            return documents
+        written = self._written_questions(states)
+        pending = [doc for doc in documents if doc.get("question_id") not in written]
+        counts["written"] += len(documents) - len(pending)
+
+        restored = self.journal.load_structured([
+            doc["question_id"] for doc in pending if states.get(doc.get("question_id")) in ("pruned", "written")
+        ])
+        for doc in pending:
+            if doc.get("question_id") in restored:
+                doc["structured_data"] = restored[doc["question_id"]]
+                doc["journal_restored"] = True
+        counts["restored"] += len(restored)
+        return pending
+
+    def _iter_file_contents(self, stage: str) -> Iterator[List]:
+        """
+        从阶段存储逐个生成 [文件名, 原文, 分块, 抽取结果]，格式与 _collect_file_contents 相同
+
+        Args:
+            stage: 阶段名称
+        """
+        for doc in self.stage_store.documents(stage, columns=["filename", "content", "chunks", "entity_data"]):
+            if "chunks" in doc:
+                content_list = [
+                    doc["filename"],
+                    doc["content"],
+                    doc["chunks"]
+                ]
+                if "entity_data" in doc:
+                    content_list.append(doc["entity_data"])
+                yield content_list
+
+    def _in_shard(self, doc: Dict) -> bool:
+        """文档是否属于当前进程负责的分片，非分片模式下总是属于"""
+        if self.shard is None:
+            return True
+        shard_index, shard_count = self.shard
+        return question_shard(doc.get("question_id", ""), shard_count) == shard_index
+
+    def _build_base_graph_sharded(self) -> List:
+        """
+        分片并行构建基础知识图谱（协调进程）
+
+        实体ID带有问题ID后缀，社区检测之前各问题的子图互不依赖。协调进程按问题ID的哈希把问题分成
+        BUILD_SHARDS 个分片，每个分片在以 spawn 方式启动的独立进程中运行 SHARD_BUILD_MODE 指定的构建流程，
+        各自创建LLM和Neo4j客户端并直接写入Neo4j。所有进程共享同一个构建日志：问题状态按问题记录，
+        分片完成后记录各自的阶段，中断后重新运行只重做未完成的分片。
+        全部分片完成后合并各分片的出处关联矩阵，并触发实体索引和社区构建。
+
+        Returns:
+            List: 分片模式下文档只存在于各工作进程中，返回空列表
+        """
+        shard_count = max(1, BUILD_SHARDS)
+        self._display_stage_header(f"分片并行构建：{shard_count} 个分片（分片内模式: {SHARD_BUILD_MODE}）")
+
+        if self.journal.stage_done(self.base_stage):
+            self.console.print("[green]构建日志显示基础图谱已构建完成，跳过（如需重建请关闭 BUILD_RESUME）[/green]")
+            return []
+
+        # 日志为空时由协调进程清空一次数据库，随后日志不再为空，工作进程不会重复清空
+        if self.journal.is_fresh():
+            self.struct_builder.clear_database()
+        self.journal.mark_stage("sharded_build", {"shards": shard_count, "mode": SHARD_BUILD_MODE})
+
+        pending = [
+            shard_index for shard_index in range(shard_count)
+            if not self.journal.stage_done(f"base_graph.{shard_suffix(shard_index, shard_count)}")
+        ]
+        if len(pending) < shard_count:
+            self.console.print(f"[green]构建日志显示 {shard_count - len(pending)} 个分片已完成，跳过[/green]")
+
+        results = {}
+        errors = {}
+        build_start = time.time()
+        if pending:
+            # spawn 方式启动的进程重新导入模块，各自创建数据库连接和LLM客户端
+            context = multiprocessing.get_context("spawn")
+            with concurrent.futures.ProcessPoolExecutor(max_workers=len(pending), mp_context=context) as executor:
+                futures = {
+                    executor.submit(run_build_shard, shard_index, shard_count, SHARD_BUILD_MODE): shard_index
+                    for shard_index in pending
+                }
+                for future in concurrent.futures.as_completed(futures):
+                    shard_index = futures[future]
+                    try:
+                        results[shard_index] = future.result()
+                        self.console.print(
+                            f"[green]分片 {shard_index + 1}/{shard_count} 完成: "
+                            f"{results[shard_index]['questions']} 个问题，"
+                            f"耗时 {results[shard_index]['elapsed']:.2f}秒[/green]"
+                        )
+                    except Exception as e:
+                        errors[shard_index] = e
+                        self.console.print(f"[red]分片 {shard_index + 1}/{shard_count} 构建失败: {e}[/red]")
+        self.performance_stats["分片构建"] = time.time() - build_start
+
+        table = Table(title="分片构建结果")
+        table.add_column("分片", style="cyan")
+        table.add_column("问题数", justify="right")
+        table.add_column("耗时(秒)", justify="right")
+        table.add_column("状态")
+        for shard_index in range(shard_count):
+            if shard_index in results:
+                result = results[shard_index]
+                table.add_row(str(shard_index + 1), str(result["questions"]), f"{result['elapsed']:.2f}", "完成")
+            elif shard_index in errors:
+                table.add_row(str(shard_index + 1), "-", "-", "[red]失败[/red]")
+            else:
+                table.add_row(str(shard_index + 1), "-", "-", "已完成(跳过)")
+        self.console.print(table)
+
+        if errors:
+            raise RuntimeError(f"{len(errors)} 个分片构建失败，重新运行时将从构建日志恢复未完成的分片")
+
+        self._merge_shard_provenance(shard_count)
+        incomplete = sum(result["incomplete"] for result in results.values())
+        if incomplete:
+            # 分片各自未标记完成，重新运行时只重做这些分片中未记录的问题
+            self.console.print(f"[yellow]{incomplete} 个问题抽取或写入失败，"
+                               f"基础图谱阶段未标记完成，重新运行时将重做这些问题[/yellow]")
+        else:
+            self.journal.mark_stage(self.base_stage, {
+                "shards": shard_count,
+                "questions": sum(result["questions"] for result in results.values()),
+            })
+        self.console.print("[green]基础知识图谱构建完成（分片模式）[/green]")
+        self._display_performance_stats()
+
+        # 所有分片写入完成后，实体索引和社区检测在完整的图上执行
+        IndexCommunityBuilder().process()
+        self.index_built = True
+        return []
+
+    def _bootstrap_schema(self):
+        """
+        写入前创建所有唯一约束和索引并等待上线，MERGE走索引查找而不是扫描整个标签。
+        分片模式下由协调进程在启动分片前创建，跨分片共享的段落依赖Chunk唯一约束保证只创建一个节点；
+        导出模式下数据库在导入之后才可用，基础图谱阶段完成后的重新运行才创建
+        """
+        if self.shard is not None:
+            return
+        if self.export_graph and not self.journal.stage_done(self.base_stage):
+            return
+        try:
+            status = SchemaManager().apply()
+        except Exception as e:
+            self.console.print(f"[yellow]创建约束和索引失败，写入时MERGE将扫描整个标签: {e}[/yellow]")
+            return
+        kinds = {"constraint": "唯一约束", "range": "范围索引", "vector": "向量索引"}
+        self._display_results_table("约束和索引", {
+            f"{kinds[item['kind']]} {item['schema']}": item["state"] for item in status
+        })
+
+    def _merge_shard_provenance(self, shard_count: int):
+        """
+        合并各分片保存的出处关联矩阵，保存到 PROVENANCE_MATRIX_PATH 供查询端使用
+
+        Args:
+            shard_count: 分片数
+        """
+        if SHARD_BUILD_MODE == "streaming":
+            # 流式模式按问题剪枝，不保存出处关联矩阵
+            return
+        paths = [
+            PROVENANCE_MATRIX_PATH.with_name(
+                f"{PROVENANCE_MATRIX_PATH.stem}.{shard_suffix(shard_index, shard_count)}{PROVENANCE_MATRIX_PATH.suffix}")
+            for shard_index in range(shard_count)
+        ]
+        missing = [str(path) for path in paths if not path.exists()]
+        if missing:
+            self.console.print(f"[yellow]缺少 {len(missing)} 个分片的出处关联矩阵，跳过合并[/yellow]")
+            return
+        try:
+            provenance = ProvenanceIncidence.concatenate([ProvenanceIncidence.load(str(path)) for path in paths])
+            provenance.save(str(PROVENANCE_MATRIX_PATH))
+            self.console.print(f"[green]已合并 {shard_count} 个分片的出处关联矩阵，共计 {provenance.entity_count} 个实体，"
+                               f"{provenance.chunk_count} 个chunk。[/green]")
+        except Exception as e:
+            self.console.print(f"[yellow]合并出处关联矩阵失败: {e}[/yellow]")
+
     def process(self):
         """执行知识图谱构建流程"""
         try:
@@ -904,6 +1674,33 @@ class KnowledgeGraphBuilder:
             raise
 
 
+def run_build_shard(shard_index: int, shard_count: int, build_mode: str) -> Dict[str, Any]:
+    """
+    分片构建的工作进程入口：只构建属于该分片的问题，并直接写入Neo4j
+
+    Args:
+        shard_index: 分片序号
+        shard_count: 分片数
+        build_mode: 分片内部的构建模式
+
+    Returns:
+        Dict[str, Any]: 分片序号、处理的问题数、抽取或写入失败的问题数和耗时
+    """
+    start = time.time()
+    builder = KnowledgeGraphBuilder(build_mode=build_mode, shard=(shard_index, shard_count))
+    builder.build_base_graph()
+    if build_mode == "out_of_core":
+        questions = builder.stage_store.count("loaded")
+    else:
+        questions = len(builder.processed_documents)
+    return {
+        "shard": shard_index,
+        "questions": questions,
+        "incomplete": len(builder.incomplete_questions),
+        "elapsed": time.time() - start,
+    }
+
+
 if __name__ == "__main__":
     try:
         builder = KnowledgeGraphBuilder()
@@ -18,6 +18,7 @@ from graphdatascience import GraphDataScience
 
 from config.neo4jdb import get_db_manager
 from config.settings import MAX_WORKERS, ENTITY_BATCH_SIZE, GDS_MEMORY_LIMIT
+from build.build_journal import open_build_journal
 
 import shutup
 shutup.please()
@@ -94,6 +95,8 @@ class IndexCommunityBuilder:
                 batch_size=ENTITY_BATCH_SIZE,
                 max_workers=MAX_WORKERS
             )
+            # 构建日志：已完成的阶段在重新运行时跳过
+            self.journal = open_build_journal()
             
             # 输出使用的参数
             self.console.print(f"[blue]并行处理线程数: {MAX_WORKERS}[/blue]")
@@ -145,9 +148,14 @@ class IndexCommunityBuilder:
             index_start = time.time()
             self.console.print("[cyan]正在创建实体索引...[/cyan]")
             
-            vector_store = self.index_manager.create_entity_index()  # 创建实体的向量索引
-            if not vector_store:
-                self.console.print("[yellow]警告: 实体索引创建可能不完整[/yellow]")
+            if self.journal.stage_done("entity_index"):
+                self.console.print("[green]构建日志显示实体索引已创建，跳过[/green]")
+            else:
+                vector_store = self.index_manager.create_entity_index()  # 创建实体的向量索引
+                if not vector_store:
+                    self.console.print("[yellow]警告: 实体索引创建可能不完整[/yellow]")
+                else:
+                    self.journal.mark_stage("entity_index")
             
             self.performance_stats["索引创建"] = time.time() - index_start
             
@@ -156,9 +164,10 @@ class IndexCommunityBuilder:
             db_time = getattr(self.index_manager, 'db_time', 0)
             index_total = self.performance_stats["索引创建"]
             
-            self.console.print(f"[blue]索引创建完成，总耗时: {index_total:.2f}秒[/blue]")
-            self.console.print(f"[blue]其中: 嵌入计算: {embedding_time:.2f}秒 ({embedding_time/index_total*100:.1f}%), "
-                              f"数据库操作: {db_time:.2f}秒 ({db_time/index_total*100:.1f}%)[/blue]")
+            if index_total > 0:
+                self.console.print(f"[blue]索引创建完成，总耗时: {index_total:.2f}秒[/blue]")
+                self.console.print(f"[blue]其中: 嵌入计算: {embedding_time:.2f}秒 ({embedding_time/index_total*100:.1f}%), "
+                                  f"数据库操作: {db_time:.2f}秒 ({db_time/index_total*100:.1f}%)[/blue]")
             
             # # 2. 检测和合并相似实体
             # similar_start = time.time()
@@ -0,0 +1,329 @@
+import os
+import time
+import json
+import pickle
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+from config.prompt import system_template_build_graph, human_template_build_graph
+from config.settings import (
+    DATASET_DIR,
+    DATASET_MAX_QUESTIONS,
+    CHUNK_SIZE,
+    OVERLAP,
+    entity_types,
+    relationship_types,
+    BUILD_JOURNAL_PATH,
+    BUILD_RESUME,
+    PARAGRAPH_DEDUP,
+    PARAGRAPH_NEAR_DUP_THRESHOLD,
+    PRUNING_STRATEGY,
+)
+from graph.core import generate_hash
+
+
+class BuildJournal:
+    """
+    构建日志，记录已经提交到Neo4j的问题、chunk以及已完成的构建阶段。
+
+    每个问题依次经历两个状态：
+    - pruned: 已完成解析、局部合并和剪枝，结构化数据保存在日志中
+    - written: 已写入Neo4j，同时记录其chunk_id
+
+    另外按chunk记录已提交的Chunk节点（与问题状态无关），作为 GraphStructureBuilder 的 chunk_registry，
+    跨问题共享的段落只写入一次，已写入的chunk_id不需要保存在内存中。
+
+    进程中断后重新运行时，已写入的问题直接跳过，已剪枝的问题从日志恢复结构化数据，
+    已完成的阶段（如实体索引）不再重复执行，也不会清空数据库。
+    """
+
+    def __init__(self, db_path: str, fingerprint: str = ""):
+        """
+        初始化构建日志
+
+        Args:
+            db_path: 日志数据库文件路径
+            fingerprint: 构建配置指纹，与日志中记录的不一致时日志会被重置
+        """
+        self.db_path = db_path
+
+        journal_dir = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(journal_dir):
+            os.makedirs(journal_dir)
+
+        self._lock = threading.Lock()
+        # 分片构建时多个进程共享同一个日志文件，写锁冲突时等待而不是立即报错
+        self._conn = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS stages (
+                name TEXT PRIMARY KEY,
+                info TEXT,
+                finished_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS questions (
+                question_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                structured_data BLOB,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT NOT NULL,
+                question_id TEXT NOT NULL,
+                PRIMARY KEY (chunk_id, question_id)
+            );
+            CREATE TABLE IF NOT EXISTS written_chunks (
+                chunk_id TEXT PRIMARY KEY
+            ) WITHOUT ROWID;
+        """)
+        self._conn.commit()
+
+        stored = self._conn.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+        if stored is not None and stored[0] != fingerprint:
+            print("构建配置已变化，重置构建日志")
+            self.reset()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta(key, value) VALUES ('fingerprint', ?)", (fingerprint,)
+        )
+        self._conn.commit()
+
+    def reset(self) -> None:
+        """清空所有记录"""
+        with self._lock:
+            self._conn.execute("DELETE FROM stages")
+            self._conn.execute("DELETE FROM questions")
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM written_chunks")
+            self._conn.commit()
+
+    def is_fresh(self) -> bool:
+        """日志中没有任何已提交的工作（包括已提交但所属问题尚未记录为已写入的Chunk节点）"""
+        with self._lock:
+            stages = self._conn.execute("SELECT COUNT(*) FROM stages").fetchone()[0]
+            questions = self._conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+            chunks = self._conn.execute("SELECT EXISTS(SELECT 1 FROM written_chunks)").fetchone()[0]
+        return stages == 0 and questions == 0 and not chunks
+
+    # ---------- 阶段 ----------
+
+    def stage_done(self, name: str) -> bool:
+        """
+        判断阶段是否已完成
+
+        Args:
+            name: 阶段名称
+
+        Returns:
+            bool: 是否已完成
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM stages WHERE name = ?", (name,)).fetchone()
+        return row is not None
+
+    def mark_stage(self, name: str, info: Optional[Dict[str, Any]] = None) -> None:
+        """
+        记录阶段完成
+
+        Args:
+            name: 阶段名称
+            info: 附加信息
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO stages(name, info, finished_at) VALUES (?, ?, ?)",
+                (name, json.dumps(info or {}, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+
+    # ---------- 问题 ----------
+
+    def question_states(self) -> Dict[str, str]:
+        """
+        获取所有已记录问题的状态
+
+        Returns:
+            Dict[str, str]: 问题ID到状态(pruned/written)的映射
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT question_id, state FROM questions").fetchall()
+        return dict(rows)
+
+    def save_structured(self, items: Dict[str, List[Dict]]) -> None:
+        """
+        保存剪枝后的结构化数据，问题状态记为 pruned
+
+        Args:
+            items: 问题ID到结构化数据的映射
+        """
+        if not items:
+            return
+        now = time.time()
+        rows = [
+            (question_id, pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL), now)
+            for question_id, data in items.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO questions(question_id, state, structured_data, updated_at) "
+                "VALUES (?, 'pruned', ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def load_structured(self, question_ids: List[str]) -> Dict[str, List[Dict]]:
+        """
+        读取已保存的结构化数据
+
+        Args:
+            question_ids: 问题ID列表
+
+        Returns:
+            Dict[str, List[Dict]]: 问题ID到结构化数据的映射
+        """
+        found = {}
+        with self._lock:
+            for i in range(0, len(question_ids), 900):
+                batch = question_ids[i:i + 900]
+                rows = self._conn.execute(
+                    f"SELECT question_id, structured_data FROM questions "
+                    f"WHERE structured_data IS NOT NULL AND question_id IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                for question_id, blob in rows:
+                    try:
+                        found[question_id] = pickle.loads(blob)
+                    except Exception as e:
+                        print(f"构建日志反序列化错误 ({question_id}): {e}")
+        return found
+
+    def mark_written(self, items: Dict[str, List[str]]) -> None:
+        """
+        记录问题及其chunk已写入Neo4j
+
+        Args:
+            items: 问题ID到chunk_id列表的映射
+        """
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO questions(question_id, state, updated_at) VALUES (?, 'written', ?) "
+                "ON CONFLICT(question_id) DO UPDATE SET state = 'written', updated_at = excluded.updated_at",
+                [(question_id, now) for question_id in items]
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunks(chunk_id, question_id) VALUES (?, ?)",
+                [(chunk_id, question_id) for question_id, chunk_ids in items.items() for chunk_id in chunk_ids]
+            )
+            self._conn.commit()
+
+    def register_written_chunks(self, chunk_ids: List[str]) -> int:
+        """
+        登记已提交到Neo4j的Chunk节点，只能在写入这些Chunk的事务提交后调用
+
+        Args:
+            chunk_ids: chunk_id列表
+
+        Returns:
+            int: 新登记的chunk数
+        """
+        if not chunk_ids:
+            return 0
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO written_chunks(chunk_id) VALUES (?)",
+                [(chunk_id,) for chunk_id in chunk_ids]
+            )
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def written_chunks_among(self, chunk_ids: List[str]) -> set:
+        """
+        查询给定chunk中已登记为写入的部分
+
+        Args:
+            chunk_ids: chunk_id列表
+
+        Returns:
+            set: 已写入的chunk_id
+        """
+        found = set()
+        with self._lock:
+            for i in range(0, len(chunk_ids), 900):
+                batch = chunk_ids[i:i + 900]
+                rows = self._conn.execute(
+                    f"SELECT chunk_id FROM written_chunks WHERE chunk_id IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                found.update(row[0] for row in rows)
+        return found
+
+    def summary(self) -> Dict[str, int]:
+        """
+        获取日志统计
+
+        Returns:
+            Dict[str, int]: 各状态的问题数、已写入chunk数和已完成阶段数
+        """
+        with self._lock:
+            states = dict(self._conn.execute(
+                "SELECT state, COUNT(*) FROM questions GROUP BY state"
+            ).fetchall())
+            chunk_count = self._conn.execute("SELECT COUNT(DISTINCT chunk_id) FROM chunks").fetchone()[0]
+            stage_count = self._conn.execute("SELECT COUNT(*) FROM stages").fetchone()[0]
+        return {
+            "pruned": states.get("pruned", 0),
+            "written": states.get("written", 0),
+            "chunks": chunk_count,
+            "stages": stage_count,
+        }
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+def build_fingerprint() -> str:
+    """
+    计算构建配置指纹：数据集及读取的问题数、分块参数、实体关系类型或抽取提示词变化时，已记录的进度不再有效
+
+    Returns:
+        str: 配置指纹
+    """
+    return generate_hash(json.dumps({
+        "dataset": str(DATASET_DIR),
+        "max_questions": DATASET_MAX_QUESTIONS,
+        "chunk_size": CHUNK_SIZE,
+        "overlap": OVERLAP,
+        "paragraph_dedup": [PARAGRAPH_DEDUP, PARAGRAPH_NEAR_DUP_THRESHOLD],
+        "pruning_strategy": PRUNING_STRATEGY,
+        "entity_types": list(entity_types),
+        "relationship_types": list(relationship_types),
+        "system_template": system_template_build_graph,
+        "human_template": human_template_build_graph,
+    }, ensure_ascii=False, sort_keys=True))
+
+
+def open_build_journal(allow_reset: bool = True) -> BuildJournal:
+    """
+    打开默认位置的构建日志，BUILD_RESUME 关闭时清空已有记录
+
+    Args:
+        allow_reset: 是否允许按 BUILD_RESUME 清空日志；分片构建的工作进程由协调进程统一处理，不再清空
+
+    Returns:
+        BuildJournal: 构建日志
+    """
+    journal = BuildJournal(str(BUILD_JOURNAL_PATH), build_fingerprint())
+    if allow_reset and not BUILD_RESUME:
+        journal.reset()
+    return journal
@@ -27,9 +27,16 @@ class KnowledgeGraphProcessor:
             graph_builder = KnowledgeGraphBuilder() # 初始化必要组件: 文件处理，模型初始，文档图结构初始，实体关系提取
             graph_builder.process()  # 识图谱构建流程（文档-块-实体-关系）（不包含社区和总结）
             
-            # 2. 构建实体索引和社区
-            index_builder = IndexCommunityBuilder()
-            index_builder.process()
+            if graph_builder.admin_import_command:
+                # 基础图谱已导出为 neo4j-admin 导入文件，导入数据库后重新运行以继续后续步骤
+                stop_text = Text("基础图谱已导出，请执行导入脚本后重新运行", style="bold yellow")
+                self.console.print(Panel(stop_text, border_style="yellow"))
+                return
+            
+            # 2. 构建实体索引和社区（分片模式下协调进程已在构建基础图谱后完成）
+            if not graph_builder.index_built:
+                index_builder = IndexCommunityBuilder()
+                index_builder.process()
             
             # 3. 构建Chunk索引
             chunk_index_builder = ChunkIndexBuilder()
@@ -0,0 +1,198 @@
+import json
+import os
+import pickle
+import shutil
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from langchain_core.documents import Document
+
+from config.settings import STAGE_STORE_DIR, STAGE_WINDOW_DOCS
+
+# 文档字段在Parquet中的列类型；graph_result、structured_data 和其余字段单独编码
+_DOC_SCHEMA = pa.schema([
+    ("filepath", pa.string()),
+    ("filename", pa.string()),
+    ("extension", pa.string()),
+    ("content", pa.large_string()),
+    ("content_length", pa.int64()),
+    ("question_id", pa.string()),
+    ("title", pa.list_(pa.string())),
+    ("chunks", pa.list_(pa.large_string())),
+    ("chunk_count", pa.int64()),
+    ("chunk_lengths", pa.list_(pa.int64())),
+    ("average_chunk_length", pa.float64()),
+    ("chunk_error", pa.string()),
+    ("entity_data", pa.list_(pa.large_string())),
+    ("journal_restored", pa.bool_()),
+    # graph_result 中的Document只保存chunk_id和元数据，文本与 chunks 相同，读取时重建
+    ("chunk_ids", pa.list_(pa.string())),
+    ("chunk_metadata", pa.string()),
+    # ChunkGraph 列表，序列化时只保存字符串
+    ("structured_data", pa.large_binary()),
+    # 其余字段
+    ("extra", pa.binary()),
+])
+_PLAIN_FIELDS = [name for name in _DOC_SCHEMA.names
+                 if name not in ("chunk_ids", "chunk_metadata", "structured_data", "extra")]
+
+
+def encode_document(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    将文档字典编码为一行Parquet记录
+
+    Args:
+        doc: 文档字典
+
+    Returns:
+        Dict[str, Any]: 与 _DOC_SCHEMA 对应的行
+    """
+    row = {name: doc.get(name) for name in _PLAIN_FIELDS}
+    if "graph_result" in doc:
+        row["chunk_ids"] = [chunk["chunk_id"] for chunk in doc["graph_result"]]
+        row["chunk_metadata"] = json.dumps([chunk["chunk_doc"].metadata for chunk in doc["graph_result"]],
+                                           ensure_ascii=False)
+    if "structured_data" in doc:
+        row["structured_data"] = pickle.dumps(doc["structured_data"], protocol=pickle.HIGHEST_PROTOCOL)
+    extra = {key: value for key, value in doc.items()
+             if key not in _DOC_SCHEMA.names and key != "graph_result"}
+    if extra:
+        row["extra"] = pickle.dumps(extra, protocol=pickle.HIGHEST_PROTOCOL)
+    return row
+
+
+def decode_document(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    将一行Parquet记录还原为文档字典，空值字段视为不存在
+
+    Args:
+        row: encode_document 生成的行
+
+    Returns:
+        Dict[str, Any]: 文档字典
+    """
+    doc = {name: row[name] for name in _PLAIN_FIELDS if row.get(name) is not None}
+    if row.get("chunk_ids") is not None:
+        metadata = json.loads(row.get("chunk_metadata") or "[]")
+        doc["graph_result"] = [
+            {"chunk_id": chunk_id, "chunk_doc": Document(page_content=''.join(chunk), metadata=meta)}
+            for chunk_id, chunk, meta in zip(row["chunk_ids"], doc.get("chunks", []), metadata)
+        ]
+    if row.get("structured_data") is not None:
+        doc["structured_data"] = pickle.loads(row["structured_data"])
+    if row.get("extra") is not None:
+        doc.update(pickle.loads(row["extra"]))
+    return doc
+
+
+class StageWriter:
+    """按窗口大小把文档写成一个个Parquet分段文件"""
+
+    def __init__(self, directory: str, window: int):
+        self.directory = directory
+        self.window = window
+        self.buffer: List[Dict] = []
+        self.segments = 0
+        self.count = 0
+
+    def append(self, doc: Dict) -> None:
+        self.buffer.append(encode_document(doc))
+        if len(self.buffer) >= self.window:
+            self.flush()
+
+    def extend(self, docs: Iterable[Dict]) -> None:
+        for doc in docs:
+            self.append(doc)
+
+    def flush(self) -> None:
+        if not self.buffer:
+            return
+        table = pa.Table.from_pylist(self.buffer, schema=_DOC_SCHEMA)
+        path = os.path.join(self.directory, f"part-{self.segments:05d}.parquet")
+        pq.write_table(table, path, compression="zstd")
+        self.segments += 1
+        self.count += len(self.buffer)
+        self.buffer = []
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class StageStore:
+    """
+    磁盘上的阶段存储，用于超出内存的语料。
+    每个阶段的输出是一个目录，由若干Parquet分段组成，每段最多 window 个问题；
+    下一阶段逐段读取、处理后写入自己的目录，任一时刻内存中只保留一个窗口的文档。
+    """
+
+    def __init__(self, root: str = str(STAGE_STORE_DIR), window: int = STAGE_WINDOW_DOCS):
+        """
+        初始化阶段存储
+
+        Args:
+            root: 存储根目录
+            window: 每个分段（即每次处理）的问题数
+        """
+        self.root = root
+        self.window = max(1, window)
+
+    def _stage_dir(self, stage: str) -> str:
+        return os.path.join(self.root, stage)
+
+    def _segments(self, stage: str) -> List[str]:
+        directory = self._stage_dir(stage)
+        if not os.path.isdir(directory):
+            return []
+        return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                if name.endswith(".parquet")]
+
+    def clear(self, stage: Optional[str] = None) -> None:
+        """删除某个阶段或全部阶段的数据"""
+        path = self.root if stage is None else self._stage_dir(stage)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+
+    def writer(self, stage: str) -> StageWriter:
+        """
+        创建阶段输出的写入器，已有的同名阶段数据会被覆盖
+
+        Args:
+            stage: 阶段名称
+
+        Returns:
+            StageWriter: 写入器，可作为上下文管理器使用
+        """
+        self.clear(stage)
+        os.makedirs(self._stage_dir(stage))
+        return StageWriter(self._stage_dir(stage), self.window)
+
+    def windows(self, stage: str, columns: Optional[List[str]] = None) -> Iterator[List[Dict]]:
+        """
+        逐个分段读取阶段数据
+
+        Args:
+            stage: 阶段名称
+            columns: 只读取的列，默认读取全部列
+
+        Returns:
+            Iterator[List[Dict]]: 每次产出一个窗口的文档列表
+        """
+        for path in self._segments(stage):
+            rows = pq.read_table(path, columns=columns).to_pylist()
+            yield [decode_document(row) for row in rows]
+
+    def documents(self, stage: str, columns: Optional[List[str]] = None) -> Iterator[Dict]:
+        """逐个文档读取阶段数据"""
+        for window in self.windows(stage, columns):
+            yield from window
+
+    def count(self, stage: str) -> int:
+        """阶段中的文档数，只读取Parquet元数据"""
+        return sum(pq.ParquetFile(path).metadata.num_rows for path in self._segments(stage))
@@ -0,0 +1,227 @@
+"""
+解析、合并改写与剪枝等CPU密集阶段的进程池执行。
+
+这些阶段是纯Python计算，受GIL限制，多线程无法提速。这里把问题按分片提交到进程池：
+任务载荷只包含原始字符串或 ChunkGraph（序列化时只保存字符串），
+各分片的结果按提交顺序拼接，因此与在主进程内顺序执行的结果完全一致。
+工作函数都定义在模块顶层，只依赖参数和进程内的全局状态，可以被子进程直接调用。
+进程池在一次构建的各阶段之间复用，工作进程以 spawn 或 forkserver 方式启动，
+不继承主进程中的数据库连接、LLM客户端和线程。
+"""
+import concurrent.futures
+import multiprocessing
+import os
+import pickle
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from config.settings import PROCESS_POOL_START_METHOD, PROCESS_POOL_WORKERS, PROCESS_SHARD_SIZE
+from graph.extraction.tuple_parser import parse_extraction_output
+from graph.processing.pruning import PruningEngine, PRUNING_STRATEGIES
+from graph.processing.provenance import ProvenanceIncidence
+from graph.structure.columnar_store import ChunkGraph, string_table
+
+# 一个问题的解析载荷：(问题ID, 每个chunk的标题, 每个chunk的LLM返回字符串)
+ParsePayload = Tuple[str, List[str], List[str]]
+# 一个问题的合并载荷：(结构化数据, 源实体ID到目标实体ID的映射)
+MergePayload = Tuple[List[ChunkGraph], Dict[str, str]]
+# 剪枝上下文：(出处关联矩阵文件, 文件修改时间, 参与计算的策略名称, 实际应用的策略名称)
+PruneContext = Tuple[str, Optional[int], Optional[Tuple[str, ...]], Optional[str]]
+
+
+def parse_document_structure(question_id: str, titles: Sequence[str], entity_data: Sequence[str],
+                             tuple_delimiter: str, record_delimiter: str) -> List[ChunkGraph]:
+    """
+    将单个问题的LLM返回字符串解析为列式结构化数据
+
+    Args:
+        question_id: 问题ID
+        titles: 每个chunk所属段落的标题
+        entity_data: 每个chunk的LLM返回字符串
+        tuple_delimiter: 字段分隔符
+        record_delimiter: 记录分隔符
+
+    Returns:
+        List[ChunkGraph]: 与chunk一一对应的结构化数据
+    """
+    structured_data = []
+    # 逐行解析，格式错误的记录只跳过该行
+    for i, raw_text in enumerate(entity_data):
+        # 每个chunk的节点和关系
+        chunk_graph = ChunkGraph(titles[i], question_id)
+        records = parse_extraction_output(raw_text, tuple_delimiter, record_delimiter)
+
+        # 1. 节点定义，获取它们的类型和描述
+        for record in records:
+            if record["kind"] == "entity":
+                chunk_graph.set_node(record["name"] + "__" + question_id, record["type"], record["description"])
+
+        # 2. 关系
+        for record in records:
+            if record["kind"] != "relationship":
+                continue
+            source_id = record["source"] + "__" + question_id
+            target_id = record["target"] + "__" + question_id
+
+            chunk_graph.add_relationship(source_id, record["relation"], target_id,
+                                         record["description"], record["weight"])
+            # 确保关系中涉及的实体也被添加到节点列表中（以防万一它们没有被'entity'标签定义）
+            for entity_id in (source_id, target_id):
+                if not chunk_graph.has_node(entity_id):
+                    chunk_graph.set_node(entity_id, "未知", "从关系中推断")
+
+        structured_data.append(chunk_graph)
+    return structured_data
+
+
+def parse_shard(payloads: List[ParsePayload], tuple_delimiter: str,
+                record_delimiter: str) -> List[List[ChunkGraph]]:
+    """解析一个分片中的所有问题"""
+    return [
+        parse_document_structure(question_id, titles, entity_data, tuple_delimiter, record_delimiter)
+        for question_id, titles, entity_data in payloads
+    ]
+
+
+def merge_shard(payloads: List[MergePayload]) -> List[List[ChunkGraph]]:
+    """按确认的合并映射改写一个分片中所有问题的结构化数据"""
+    results = []
+    for structured_data, confirmed_merges in payloads:
+        for chunk_data in structured_data:
+            chunk_data.merge_entities(confirmed_merges)
+        results.append(structured_data)
+    return results
+
+
+# 进程内缓存的剪枝引擎：(剪枝上下文, 引擎)。进程池在各阶段之间复用，
+# 任务只携带出处关联矩阵的文件路径，每个工作进程对同一个矩阵文件只加载一次
+_prune_state: Optional[Tuple[PruneContext, PruningEngine]] = None
+
+
+def prune_context(provenance_path: str, strategy_names: Optional[List[str]],
+                  apply: Optional[str]) -> PruneContext:
+    """
+    生成剪枝上下文，矩阵文件的修改时间用于区分不同构建保存的同名文件
+
+    Args:
+        provenance_path: 出处关联矩阵文件路径
+        strategy_names: 参与计算的策略名称，None表示全部策略
+        apply: 实际应用的策略名称
+
+    Returns:
+        PruneContext: 剪枝上下文
+    """
+    mtime = os.stat(provenance_path).st_mtime_ns if os.path.exists(provenance_path) else None
+    names = None if strategy_names is None else tuple(strategy_names)
+    return provenance_path, mtime, names, apply
+
+
+def install_prune_engine(context: PruneContext, engine: PruningEngine) -> None:
+    """在当前进程中登记已创建的引擎，主进程内执行剪枝时不再从文件加载矩阵"""
+    global _prune_state
+    _prune_state = (context, engine)
+
+
+def prune_shard(payloads: List[List[ChunkGraph]],
+                context: PruneContext) -> Tuple[List[List[ChunkGraph]], Dict[str, Dict[str, int]]]:
+    """
+    对一个分片的问题一次性向量化剪枝
+
+    Args:
+        payloads: 各问题的结构化数据
+        context: 剪枝上下文，与缓存的引擎不一致时从文件加载出处关联矩阵并重建引擎
+
+    Returns:
+        Tuple: (剪枝后的结构化数据列表, 本分片的剪枝统计)
+    """
+    global _prune_state
+    provenance_path, _, strategy_names, apply = context
+    if _prune_state is None or _prune_state[0] != context:
+        strategies = None if strategy_names is None else [PRUNING_STRATEGIES[name]() for name in strategy_names]
+        _prune_state = (context, PruningEngine(ProvenanceIncidence.load(provenance_path), strategies))
+    documents = [{"structured_data": structured_data} for structured_data in payloads]
+    report = _prune_state[1].run(documents, apply=apply)
+    return [doc["structured_data"] for doc in documents], report
+
+
+def run_in_worker(func: Callable, shard: List, *args) -> bytes:
+    """
+    在工作进程中执行分片任务。结果在这里序列化后清空驻留表，
+    载荷中的 ChunkGraph 反序列化时驻留的字符串随任务结束释放，工作进程的驻留表不随任务数增长
+
+    Returns:
+        bytes: 序列化后的分片结果
+    """
+    result = pickle.dumps(func(shard, *args), protocol=pickle.HIGHEST_PROTOCOL)
+    string_table.clear()
+    return result
+
+
+class StageExecutor:
+    """
+    按分片把任务提交到进程池，并按提交顺序返回每个分片的结果。
+    进程池在第一次需要时创建，之后各阶段复用，构建结束时由 close 关闭。
+    工作进程数不大于1或只有一个分片时直接在主进程内执行，省去序列化开销；
+    进程池不可用（如资源受限或载荷无法序列化）时同样退回主进程执行。
+    """
+
+    def __init__(self, workers: int = PROCESS_POOL_WORKERS, shard_size: int = PROCESS_SHARD_SIZE,
+                 start_method: str = PROCESS_POOL_START_METHOD):
+        """
+        Args:
+            workers: 工作进程数，不超过CPU核数
+            shard_size: 每个分片包含的问题数
+            start_method: 工作进程的启动方式，spawn 或 forkserver
+        """
+        self.workers = min(workers, os.cpu_count() or 1)
+        self.shard_size = max(1, shard_size)
+        self.start_method = start_method
+        self._pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+
+    def _executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        """获取复用的进程池，不存在时创建"""
+        if self._pool is None:
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context(self.start_method)
+            )
+        return self._pool
+
+    def close(self) -> None:
+        """关闭进程池，之后再次调用 map_shards 会重新创建"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def shard(self, items: Sequence) -> List[List]:
+        """按固定大小顺序切分"""
+        return [list(items[i:i + self.shard_size]) for i in range(0, len(items), self.shard_size)]
+
+    def map_shards(self, func: Callable, items: Sequence, *args) -> List[Any]:
+        """
+        对每个分片调用 func(shard, *args)
+
+        Args:
+            func: 模块顶层定义的分片处理函数
+            items: 待处理的问题载荷
+            args: 传给 func 的额外参数
+
+        Returns:
+            List[Any]: 与分片顺序一致的结果列表
+        """
+        shards = self.shard(items)
+        if not shards:
+            return []
+
+        if self.workers > 1 and len(shards) > 1:
+            try:
+                # map 按提交顺序返回结果，合并结果与顺序执行一致
+                results = self._executor().map(run_in_worker, [func] * len(shards), shards,
+                                               *[[arg] * len(shards) for arg in args])
+                return [pickle.loads(result) for result in results]
+            except (BrokenProcessPool, OSError, pickle.PicklingError) as e:
+                print(f"进程池执行失败，改为在主进程内执行: {e}")
+                # 损坏的进程池无法继续使用，下次调用时重新创建
+                if isinstance(e, BrokenProcessPool):
+                    self.close()
+
+        return [func(shard, *args) for shard in shards]
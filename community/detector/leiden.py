@@ -3,6 +3,7 @@ from .base import BaseCommunityDetector
 from .projections import GraphProjectionMixin
 
 from config.settings import GDS_CONCURRENCY
+from graph.core import SchemaManager
 
 class LeidenDetector(GraphProjectionMixin, BaseCommunityDetector):
     """Leiden算法社区检测实现"""
@@ -94,9 +95,7 @@ class LeidenDetector(GraphProjectionMixin, BaseCommunityDetector):
         
         try:
             # 创建约束
-            self.graph.query(
-                "CREATE CONSTRAINT IF NOT EXISTS FOR (c:__Community__) REQUIRE c.id IS UNIQUE;"
-            )
+            SchemaManager().ensure()
             
             # 保存基础社区关系
             base_result = self.graph.query("""
@@ -3,6 +3,7 @@ from .base import BaseCommunityDetector
 from .projections import GraphProjectionMixin
 
 from config.settings import GDS_CONCURRENCY
+from graph.core import SchemaManager
 
 class SLLPADetector(GraphProjectionMixin, BaseCommunityDetector):
     """SLLPA算法社区检测实现"""
@@ -85,9 +86,7 @@ class SLLPADetector(GraphProjectionMixin, BaseCommunityDetector):
         
         try:
             # 创建约束
-            self.graph.query(
-                "CREATE CONSTRAINT IF NOT EXISTS FOR (c:__Community__) REQUIRE c.id IS UNIQUE;"
-            )
+            SchemaManager().ensure()
             
             # 保存社区
             result = self.graph.query("""
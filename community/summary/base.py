@@ -1,13 +1,15 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from typing import List, Dict, Optional
 from langchain_community.graphs import Neo4jGraph
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from model.get_models import get_llm_model
+from graph.core import llm_governor
+import asyncio
 import concurrent.futures
 import time
 
-from config.settings import MAX_WORKERS
+from config.settings import MAX_WORKERS, ASYNC_LLM, ASYNC_MAX_CONCURRENCY
 
 class BaseCommunityDescriber:
     """社区信息格式化工具"""
@@ -196,10 +198,13 @@ class BaseSummarizer(ABC):
             print(f"开始并行生成 {len(community_info)} 个社区摘要，"
                   f"使用 {optimal_workers} 个线程...")
             
-            summaries = self._process_communities_parallel(
-                community_info, 
-                optimal_workers
-            )
+            if ASYNC_LLM:
+                summaries = asyncio.run(self._aprocess_communities(community_info))
+            else:
+                summaries = self._process_communities_parallel(
+                    community_info, 
+                    optimal_workers
+                )
             
             self.llm_time = time.time() - llm_start
             
@@ -249,6 +254,59 @@ class BaseSummarizer(ABC):
         
         return summaries
     
+    async def _aprocess_communities(
+        self,
+        community_info: List[Dict],
+        max_concurrency: Optional[int] = None
+    ) -> List[Dict]:
+        """异步处理社区摘要，基于 ainvoke 并由信号量限制在途请求数"""
+        semaphore = asyncio.Semaphore(max_concurrency or ASYNC_MAX_CONCURRENCY)
+        completed = 0
+
+        async def bounded(info: Dict) -> Dict:
+            nonlocal completed
+            async with semaphore:
+                result = await self._aprocess_single_community(info)
+            completed += 1
+            if completed % 10 == 0 or completed == len(community_info):
+                print(f"已处理 {completed}/{len(community_info)} "
+                      f"({completed/len(community_info)*100:.1f}%)")
+            return result
+
+        return list(await asyncio.gather(*(bounded(info) for info in community_info)))
+
+    async def _aprocess_single_community(self, community: Dict) -> Dict:
+        """处理单个社区摘要 - 异步版本"""
+        community_id = community.get('communityId', 'unknown')
+
+        try:
+            stringify_info = self.describer.prepare_string(community)
+
+            if len(stringify_info) < 10:
+                print(f"社区 {community_id} 的信息太少，跳过摘要生成")
+                return {
+                    "community": community_id,
+                    "summary": "此社区没有足够的信息生成摘要。",
+                    "full_content": stringify_info
+                }
+
+            summary = await llm_governor.acall(self.community_chain.ainvoke, {'community_info': stringify_info})
+
+            return {
+                "community": community_id,
+                "summary": summary,
+                "full_content": stringify_info
+            }
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"处理社区 {community_id} 摘要时出错: {e}")
+            return {
+                "community": community_id,
+                "summary": f"生成摘要时出错: {str(e)}",
+                "full_content": str(community)
+            }
+
     def _process_single_community(self, community: Dict) -> Dict:
         """处理单个社区摘要"""
         community_id = community.get('communityId', 'unknown')
@@ -264,7 +322,7 @@ class BaseSummarizer(ABC):
                     "full_content": stringify_info
                 }
             
-            summary = self.community_chain.invoke({'community_info': stringify_info})
+            summary = llm_governor.call(self.community_chain.invoke, {'community_info': stringify_info})
             
             return {
                 "community": community_id,
@@ -1,10 +1,232 @@
 import os
-from typing import Dict, Any
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
 import pandas as pd
 from neo4j import GraphDatabase, Result
 from langchain_neo4j import Neo4jGraph
 from dotenv import load_dotenv
 
+from config.settings import NEO4J_POOL_SIZE, NEO4J_ACQUIRE_TIMEOUT, NEO4J_TX_RETRY_SECONDS
+
+
+class SessionPoolTimeoutError(TimeoutError):
+    """在等待时限内没有可借出的会话时抛出"""
+
+
+class SessionPool:
+    """
+    线程安全的Neo4j会话池。
+
+    neo4j的Session不是线程安全的，每个线程必须持有自己的会话。
+    这里用信号量限制同时借出的会话数，归还的会话放回空闲队列复用；
+    事务出错的会话直接关闭，不再放回池中。
+    """
+
+    def __init__(self, driver, max_size: int = NEO4J_POOL_SIZE,
+                 acquire_timeout: float = NEO4J_ACQUIRE_TIMEOUT):
+        """
+        初始化会话池
+
+        参数:
+            driver: Neo4j驱动
+            max_size: 同时借出的会话数上限
+            acquire_timeout: 借出会话的默认最长等待(秒)
+        """
+        self.driver = driver
+        self.max_size = max(1, max_size)
+        self.acquire_timeout = acquire_timeout
+
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._idle = deque()
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.leases = 0
+        self.created = 0
+        self.discarded = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.transactions = 0
+        self.retries = 0
+        self.failures = 0
+
+    def acquire(self, timeout: Optional[float] = None):
+        """
+        借出一个会话，池满时阻塞等待
+
+        参数:
+            timeout: 最长等待(秒)，None表示使用默认值
+
+        返回:
+            neo4j.Session: Neo4j会话
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        start = time.monotonic()
+        acquired = self._slots.acquire(timeout=timeout)
+        waited = time.monotonic() - start
+
+        with self._lock:
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            if not acquired:
+                self.timeouts += 1
+                raise SessionPoolTimeoutError(
+                    f"等待Neo4j会话超时({timeout}秒)，当前借出 {self.in_use}/{self.max_size}")
+            self.leases += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            session = self._idle.pop() if self._idle else None
+
+        if session is None:
+            try:
+                session = self.driver.session()
+            except Exception:
+                self._release_slot()
+                raise
+            with self._lock:
+                self.created += 1
+        return session
+
+    def release(self, session, discard: bool = False) -> None:
+        """
+        归还会话
+
+        参数:
+            session: 借出的会话
+            discard: 为True时关闭会话而不放回池中
+        """
+        if discard:
+            try:
+                session.close()
+            except Exception:
+                pass
+            with self._lock:
+                self.discarded += 1
+        else:
+            with self._lock:
+                self._idle.append(session)
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        with self._lock:
+            self.in_use -= 1
+        self._slots.release()
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None):
+        """
+        以上下文管理器的方式借出会话，块内抛出异常时会话被丢弃
+
+        参数:
+            timeout: 最长等待(秒)
+        """
+        session = self.acquire(timeout)
+        try:
+            yield session
+        except BaseException:
+            self.release(session, discard=True)
+            raise
+        self.release(session)
+
+    def run_transaction(self, cypher: str, params: Optional[Dict[str, Any]] = None,
+                        write: bool = True, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        在借出的会话中执行单条语句的托管事务
+
+        参数:
+            cypher: Cypher语句
+            params: 查询参数
+            write: 是否为写事务
+            timeout: 借出会话的最长等待(秒)
+
+        返回:
+            List[Dict[str, Any]]: 查询结果，每条记录为一个字典
+        """
+        return self.run_statements([(cypher, params)], write, timeout)[0]
+
+    def run_statements(self, statements: List[Tuple[str, Optional[Dict[str, Any]]]], write: bool = True,
+                       timeout: Optional[float] = None) -> List[List[Dict[str, Any]]]:
+        """
+        在借出的会话中把多条语句放在同一个托管事务内执行，全部成功或全部回滚。
+        瞬时错误（死锁、主节点切换、连接中断等）由驱动在 NEO4J_TX_RETRY_SECONDS 内自动重试，
+        事务函数每多执行一次计为一次重试。
+
+        参数:
+            statements: (Cypher语句, 查询参数) 列表
+            write: 是否为写事务
+            timeout: 借出会话的最长等待(秒)
+
+        返回:
+            List[List[Dict[str, Any]]]: 每条语句的查询结果
+        """
+        attempts = 0
+
+        def work(tx):
+            nonlocal attempts
+            attempts += 1
+            return [[record.data() for record in tx.run(cypher, params or {})]
+                    for cypher, params in statements]
+
+        try:
+            with self.lease(timeout) as session:
+                if write:
+                    return session.execute_write(work)
+                return session.execute_read(work)
+        except SessionPoolTimeoutError:
+            raise
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+        finally:
+            with self._lock:
+                self.transactions += 1
+                self.retries += max(0, attempts - 1)
+
+    def close(self) -> None:
+        """关闭所有空闲会话"""
+        with self._lock:
+            sessions = list(self._idle)
+            self._idle.clear()
+        for session in sessions:
+            try:
+                session.close()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """返回会话池统计信息"""
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "in_use": self.in_use,
+                "idle": len(self._idle),
+                "peak_in_use": self.peak_in_use,
+                "leases": self.leases,
+                "created": self.created,
+                "discarded": self.discarded,
+                "timeouts": self.timeouts,
+                "wait_total": self.wait_total,
+                "wait_avg": self.wait_total / (self.leases + self.timeouts) if self.leases + self.timeouts else 0.0,
+                "wait_max": self.wait_max,
+                "transactions": self.transactions,
+                "retries": self.retries,
+                "failures": self.failures,
+            }
+
+    def print_stats(self) -> None:
+        """打印会话池统计信息"""
+        s = self.stats()
+        print(f"Neo4j会话池统计: 事务 {s['transactions']} 次, 重试 {s['retries']}, 失败 {s['failures']}, "
+              f"借出 {s['leases']} 次 (峰值并发 {s['peak_in_use']}/{s['max_size']}, 超时 {s['timeouts']}), "
+              f"平均等待 {s['wait_avg'] * 1000:.1f}毫秒, 最长等待 {s['wait_max'] * 1000:.1f}毫秒")
+
 
 class DBConnectionManager:
     """数据库连接管理器，实现单例模式"""
@@ -30,10 +252,13 @@ class DBConnectionManager:
         self.neo4j_username = os.getenv('NEO4J_USERNAME')
         self.neo4j_password = os.getenv('NEO4J_PASSWORD')
         
-        # 初始化Neo4j驱动
+        # 初始化Neo4j驱动，连接池不小于会话池，借出的会话总能拿到连接
         self.driver = GraphDatabase.driver(
             self.neo4j_uri,
-            auth=(self.neo4j_username, self.neo4j_password)
+            auth=(self.neo4j_username, self.neo4j_password),
+            max_connection_pool_size=max(NEO4J_POOL_SIZE, 100),
+            connection_acquisition_timeout=NEO4J_ACQUIRE_TIMEOUT,
+            max_transaction_retry_time=NEO4J_TX_RETRY_SECONDS,
         )
         
         # 初始化LangChain Neo4j图实例
@@ -44,9 +269,9 @@ class DBConnectionManager:
             refresh_schema=False,
         )
         
-        # 连接池配置
-        self.session_pool = []
-        self.max_pool_size = 10
+        # 会话池
+        self.session_pool = SessionPool(self.driver, NEO4J_POOL_SIZE, NEO4J_ACQUIRE_TIMEOUT)
+        self.max_pool_size = self.session_pool.max_size
         
         # 标记为已初始化
         self._initialized = True
@@ -76,44 +301,83 @@ class DBConnectionManager:
             result_transformer_=Result.to_df
         )
     
-    def get_session(self):
+    def execute_write(self, cypher: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """
-        从连接池获取会话
+        在会话池中执行写事务，瞬时错误自动重试。各线程并行调用时使用各自的会话。
         
+        参数:
+            cypher: Cypher语句
+            params: 查询参数
+            
+        返回:
+            List[Dict[str, Any]]: 查询结果
+        """
+        return self.session_pool.run_transaction(cypher, params, write=True)
+    
+    def execute_read(self, cypher: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        在会话池中执行读事务，瞬时错误自动重试
+        
+        参数:
+            cypher: Cypher语句
+            params: 查询参数
+            
+        返回:
+            List[Dict[str, Any]]: 查询结果
+        """
+        return self.session_pool.run_transaction(cypher, params, write=False)
+    
+    def execute_write_batch(self, statements: List[Tuple[str, Optional[Dict[str, Any]]]]) -> List[List[Dict[str, Any]]]:
+        """
+        在同一个写事务中依次执行多条语句，全部成功或全部回滚
+        
+        参数:
+            statements: (Cypher语句, 查询参数) 列表
+            
+        返回:
+            List[List[Dict[str, Any]]]: 每条语句的查询结果
+        """
+        return self.session_pool.run_statements(statements, write=True)
+    
+    def get_session(self, timeout: Optional[float] = None):
+        """
+        从会话池借出会话，池满时等待其他线程归还
+        
+        参数:
+            timeout: 最长等待(秒)，None表示使用 NEO4J_ACQUIRE_TIMEOUT
+            
         返回:
             neo4j.Session: Neo4j会话
         """
-        if self.session_pool:
-            # 从池中获取会话
-            return self.session_pool.pop()
-        else:
-            # 创建新会话
-            return self.driver.session()
+        return self.session_pool.acquire(timeout)
     
-    def release_session(self, session):
+    def release_session(self, session, discard: bool = False):
         """
-        释放会话回连接池
+        释放会话回会话池
         
         参数:
             session: Neo4j会话
+            discard: 会话出错时为True，关闭会话而不放回池中
         """
-        if len(self.session_pool) < self.max_pool_size:
-            self.session_pool.append(session)
-        else:
-            # 池已满，关闭会话
-            session.close()
+        self.session_pool.release(session, discard)
+    
+    def session(self, timeout: Optional[float] = None):
+        """
+        以上下文管理器的方式借出会话
+        
+        参数:
+            timeout: 最长等待(秒)
+        """
+        return self.session_pool.lease(timeout)
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """获取会话池统计信息（借出数、等待时间、重试和失败次数等）"""
+        return self.session_pool.stats()
     
     def close(self):
         """关闭所有资源"""
         # 关闭所有池中的会话
-        for session in self.session_pool:
-            try:
-                session.close()
-            except:
-                pass
-        
-        # 清空池
-        self.session_pool = []
+        self.session_pool.close()
         
         # 关闭驱动
         if self.driver:
@@ -108,6 +108,24 @@ user_template_build_index = """
 输出：
 """
 
+merge_confirmation_template = """你是一个实体识别和链接专家。你的任务是根据实体名称及其类型描述，判断每一对实体是否指向同一个真实世界的实体。
+
+请分析下面的实体对列表：
+{formatted_pairs}
+
+你的回答必须遵循以下规则：
+1.  返回一个单独的 Python 列表，其中包含布尔值（True 或 False）。
+2.  列表中的每个值必须与上面列表中的每个实体对一一对应。
+3.  除了这个 Python 列表，不要包含任何其他文字、解释或前缀。
+
+例如，对于输入：
+1. 实体1: "苹果公司" (详细信息: 公司) | 实体2: "Apple Inc." (详细信息: 公司)
+2. 实体1: "亚马逊" (详细信息: 公司) | 实体2: "亚马逊河" (详细信息: 地理位置)
+
+你的输出应该是：
+[True, False]
+"""
+
 community_template = """
 基于所提供的属于同一图社区的节点和关系， 
 生成所提供图社区信息的自然语言摘要： 
@@ -4,6 +4,7 @@ from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent.parent
 FILES_DIR = BASE_DIR / 'files'
 DATASET_DIR = BASE_DIR / 'dataset/musique/musique_ans_dev.parquet'
+DATASET_MAX_QUESTIONS = 500  # 读取的最大问题数，<=0 表示读取全部
 
 # 知识库主题设置，用于deepsearch（reasoning提示词）
 KB_NAME = "数据集"
@@ -40,6 +41,18 @@ relationship_types = [
 CHUNK_SIZE = 1000
 OVERLAP = 100
 similarity_threshold = 0.9
+CANDIDATE_BLOCK_SIZE = 1024  # 生成候选合并实体对时相似度矩阵的分块行数
+CONTAINMENT_MIN_LENGTH = 2   # 子串别名检测中被包含名称的最短长度；设为1可发现单字简称，但单字几乎包含于同一问题的所有名称中，待LLM确认的实体对会成倍增加
+
+# 跨问题段落去重：同一段落在多个问题的上下文中重复出现时只抽取一次
+PARAGRAPH_DEDUP = True
+PARAGRAPH_NEAR_DUP_THRESHOLD = 0.9  # 同标题段落字符n-gram的Jaccard相似度达到该值视为近似重复
+PARAGRAPH_SHINGLE_SIZE = 5
+
+# 内存稀疏化配置
+PRUNING_STRATEGY = "bridge"   # 实际应用的剪枝策略：local(剪除纯局部关系) / two_hop(桥梁实体一跳与二跳关系) / bridge(仅桥梁实体)
+PRUNING_COMPARE = True         # 是否在同一次遍历中计算所有策略并输出稀疏率对比
+PROVENANCE_MATRIX_PATH = BASE_DIR / 'cache' / 'provenance_incidence.npz'  # 实体×chunk出处关联矩阵（CSR），供查询端复用
 
 # 冲突解决与更新策略
 # manual_first: 优先保留手动编辑
@@ -78,6 +91,77 @@ ENTITY_BATCH_SIZE = 50         # 实体处理批次大小
 CHUNK_BATCH_SIZE = 100         # 文本块处理批次大小
 EMBEDDING_BATCH_SIZE = 64      # 嵌入向量计算批次大小
 LLM_BATCH_SIZE = 5             # LLM处理批次大小
+LLM_BATCH_PROMPT_TOKENS = 6000       # 批量抽取时单次请求中文本块的输入token预算
+LLM_BATCH_COMPLETION_TOKENS = 4000   # 批量抽取时单次请求的输出token预算
+LLM_BATCH_COMPLETION_RATIO = 0.8     # 预估输出token数与输入token数之比
+MERGE_CONFIRM_PROMPT_TOKENS = 2000   # 实体合并确认时单次请求中实体对的输入token预算
+MERGE_CONFIRM_MAX_PAIRS = 30         # 实体合并确认时单次请求的最大实体对数
+EXTRACTION_STREAMING = True          # 流式读取抽取结果，按记录增量解析
+EXTRACTION_MAX_RECORDS = 0           # 单个文本块最多接收的记录数，达到后提前结束生成（截断的结果同样写入缓存），<=0 表示不限制
+# 抽取输出格式
+# text: 元组文本协议，按正则逐行解析
+# structured: 通过 with_structured_output 返回JSON结构（method 可选 function_calling / json_schema / json_mode）
+EXTRACTION_OUTPUT_MODE = "text"
+EXTRACTION_STRUCTURED_METHOD = "function_calling"
+
+# 构建模式
+# staged: 按阶段依次执行（抽取全部完成后再解析、剪枝、写入）
+# streaming: 流式执行，每个问题抽取完成后立即解析、剪枝并写入，各阶段重叠
+# out_of_core: 按阶段执行，但每个阶段按窗口从磁盘读取输入、把输出写回磁盘，内存占用与语料规模无关
+# sharded: 按问题ID把问题分成 BUILD_SHARDS 个分片，每个分片在独立进程中（各自的LLM和Neo4j客户端）构建并直接写入Neo4j
+BUILD_MODE = "staged"
+BUILD_SHARDS = 4               # 分片模式下的分片数（即工作进程数）
+SHARD_BUILD_MODE = "staged"    # 分片模式下每个分片内部的构建模式：staged / streaming / out_of_core
+STREAM_QUEUE_SIZE = 32         # 流式模式下阶段间有界队列的容量（问题数）
+STREAM_TRANSFORM_WORKERS = 4   # 流式模式下解析、合并与剪枝阶段的线程数
+STREAM_WRITE_BATCH_DOCS = 16   # 流式模式下每次写入数据库的最大问题数
+# 分阶段模式下解析、合并改写与剪枝等CPU密集阶段的进程池配置
+PROCESS_POOL_WORKERS = 4       # 工作进程数，<=1 表示在主进程内执行
+PROCESS_SHARD_SIZE = 32        # 每个进程任务包含的问题数
+PROCESS_POOL_START_METHOD = "spawn"  # 工作进程启动方式：spawn 或 forkserver，不使用 fork（主进程持有数据库连接和线程）
+# out_of_core 模式的阶段存储（Parquet分段）
+STAGE_STORE_DIR = BASE_DIR / 'cache' / 'stage_store'  # 各阶段输出的存放目录
+STAGE_WINDOW_DOCS = 1000       # 每个分段的问题数，即每次驻留内存的问题数
+# 基础图谱的写入目标（staged / out_of_core 模式）
+# neo4j: 通过事务批量写入Neo4j
+# admin_import: 首次构建时导出为 neo4j-admin database import 的CSV文件，由离线导入工具直接生成数据库
+GRAPH_WRITE_TARGET = "neo4j"
+ADMIN_IMPORT_DIR = BASE_DIR / 'cache' / 'admin_import'  # 导出的CSV、表头文件和导入脚本的存放目录
+
+# 断点续建配置
+BUILD_RESUME = True            # 是否根据构建日志跳过已完成的工作；关闭后每次都清空数据库重新构建
+BUILD_JOURNAL_PATH = BASE_DIR / 'cache' / 'build_journal.sqlite'  # 构建日志文件
+BUILD_JOURNAL_COMMIT_DOCS = 50 # 分阶段模式下每写入多少个问题记录一次进度
+
+# 异步LLM调用配置
+ASYNC_LLM = False              # 是否使用基于ainvoke的异步模式调用LLM（抽取、实体合并、社区摘要）
+ASYNC_MAX_CONCURRENCY = 64     # 异步模式下的最大在途请求数
+
+# LLM调度配置（自适应并发、限流、重试与熔断）
+LLM_MIN_CONCURRENCY = 1        # 自适应并发上限的下界
+LLM_MAX_CONCURRENCY = 32       # 自适应并发上限的上界，初始值为 MAX_WORKERS
+LLM_RPM_LIMIT = 0              # 每分钟请求数上限，0 表示不限制
+LLM_TPM_LIMIT = 0              # 每分钟token数上限，0 表示不限制
+LLM_MAX_ATTEMPTS = 4           # 单个请求的最大尝试次数（含首次）
+LLM_BACKOFF_BASE = 1.0         # 指数退避基数(秒)，实际等待在 [0, base*2^n] 内随机抖动
+LLM_BACKOFF_MAX = 30.0         # 单次退避的最长等待(秒)
+LLM_RETRY_BUDGET_RATIO = 0.2   # 全局重试预算：重试总数不超过请求总数的该比例
+LLM_RETRY_BUDGET_MIN = 10      # 重试预算的保底次数
+LLM_CIRCUIT_BREAKER_THRESHOLD = 10  # 连续失败多少次后熔断
+LLM_CIRCUIT_BREAKER_COOLDOWN = 30   # 熔断冷却时间(秒)
+LLM_LATENCY_TOLERANCE = 2.0    # 平均延迟超过基线（最近两个调整窗口内的最低平均延迟）的该倍数时收缩并发
+
+# Neo4j会话池配置
+NEO4J_POOL_SIZE = 16           # 同时借出的会话数上限，同时作为驱动的连接池大小
+NEO4J_ACQUIRE_TIMEOUT = 60     # 借出会话的最长等待(秒)，超时抛出异常
+NEO4J_TX_RETRY_SECONDS = 30    # 托管事务遇到瞬时错误（死锁、连接中断等）时的重试时限(秒)
+
+# 缓存配置
+EXTRACTION_CACHE_MAX_MB = 2048 # 实体抽取缓存容量上限(MB)，超过后按最近访问时间淘汰
+NAME_EMBEDDING_CACHE_PATH = BASE_DIR / 'cache' / 'name_embeddings.sqlite'  # 实体名称向量缓存文件
+NAME_EMBEDDING_CACHE_MAX_MB = 2048  # 实体名称向量缓存容量上限(MB)
+MERGE_DECISION_CACHE_PATH = BASE_DIR / 'cache' / 'merge_decisions.sqlite'  # 实体合并确认结果缓存文件
+MERGE_DECISION_CACHE_MAX_MB = 256  # 实体合并确认缓存容量上限(MB)
 
 # GDS相关配置
 GDS_MEMORY_LIMIT = 6           # GDS内存限制(GB)
@@ -96,5 +180,10 @@ CHUNK_LABEL = "__Chunk__"
 DOCUMENT_LABEL = "__Document__"
 ENTITY_EMBED_FIELD = "embedding"
 CHUNK_EMBED_FIELD = "embedding"
+
+# 图数据库模式（约束、范围索引和向量索引）配置，声明见 graph/core/schema_manager.py
+VECTOR_INDEX_DIMENSIONS = None  # 向量索引维度，需与嵌入模型一致；None 表示由 Neo4jVector 在首次建立向量存储时创建
+VECTOR_SIMILARITY_FUNCTION = "cosine"  # 向量索引相似度函数：cosine / euclidean
+SCHEMA_AWAIT_SECONDS = 300  # 等待约束和索引上线的最长时间(秒)
 TOP_K = 3
 SIMILARITY_THRESHOLD = 0.3
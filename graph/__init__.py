@@ -1,7 +1,12 @@
 from graph.core import (
     GraphConnectionManager, 
     connection_manager,
+    SchemaManager,
     BaseIndexer,
+    SQLiteCache,
+    LLMGovernor,
+    CircuitOpenError,
+    llm_governor,
     timer,
     generate_hash,
     batch_process,
@@ -13,32 +18,55 @@ from graph.core import (
 # Indexing
 from graph.indexing import (
     ChunkIndexManager,
-    EntityIndexManager
+    EntityIndexManager,
+    NameEmbeddingCache,
+    get_name_embedding_cache
 )
 
 # Structure
 from graph.structure import (
-    GraphStructureBuilder
+    GraphStructureBuilder,
+    ChunkGraph,
+    StringTable,
+    string_table
 )
 
 # Extraction
 from graph.extraction import (
     EntityRelationExtractor,
-    GraphWriter
+    GraphWriter,
+    BulkGraphWriter,
+    ExtractionTupleParser,
+    parse_extraction_output
 )
 
 # Similar Entity
 from graph.processing import (
     EntityMerger,
     SimilarEntityDetector,
-    GDSConfig
+    GDSConfig,
+    find_candidate_pairs,
+    ContainmentIndex,
+    find_containment_pairs,
+    MergeConfirmer,
+    PruningEngine,
+    PruningStrategy,
+    PRUNING_STRATEGIES,
+    merge_pruning_reports,
+    new_pruning_report,
+    ProvenanceIncidence
 )
 
 __all__ = [
     # Core
     'GraphConnectionManager',
     'connection_manager',
+    'SchemaManager',
     'BaseIndexer',
+    'SQLiteCache',
+    'LLMGovernor',
+    'CircuitOpenError',
+    'llm_governor',
     'timer',
     'generate_hash',
     'batch_process',
@@ -49,16 +77,34 @@ __all__ = [
     # Indexing
     'ChunkIndexManager',
     'EntityIndexManager',
+    'NameEmbeddingCache',
+    'get_name_embedding_cache',
     
     # Structure
     'GraphStructureBuilder',
+    'ChunkGraph',
+    'StringTable',
+    'string_table',
     
     # Extraction
     'EntityRelationExtractor',
     'GraphWriter',
+    'BulkGraphWriter',
+    'ExtractionTupleParser',
+    'parse_extraction_output',
     
     # Processing
     'EntityMerger',
     'SimilarEntityDetector',
-    'GDSConfig'
+    'GDSConfig',
+    'find_candidate_pairs',
+    'ContainmentIndex',
+    'find_containment_pairs',
+    'MergeConfirmer',
+    'PruningEngine',
+    'PruningStrategy',
+    'PRUNING_STRATEGIES',
+    'merge_pruning_reports',
+    'new_pruning_report',
+    'ProvenanceIncidence'
 ]
\ No newline at end of file
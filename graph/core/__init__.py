@@ -1,5 +1,8 @@
 from .graph_connection import GraphConnectionManager, connection_manager
+from .schema_manager import SchemaManager
 from .base_indexer import BaseIndexer
+from .sqlite_cache import SQLiteCache
+from .llm_governor import LLMGovernor, CircuitOpenError, llm_governor
 from .utils import (
     timer, 
     generate_hash, 
@@ -12,7 +15,12 @@ from .utils import (
 __all__ = [
     'GraphConnectionManager',
     'connection_manager',
+    'SchemaManager',
     'BaseIndexer',
+    'SQLiteCache',
+    'LLMGovernor',
+    'CircuitOpenError',
+    'llm_governor',
     'timer',
     'generate_hash',
     'batch_process',
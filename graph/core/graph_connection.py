@@ -1,4 +1,4 @@
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from config.neo4jdb import get_db_manager
 
 class GraphConnectionManager:
@@ -19,8 +19,8 @@ class GraphConnectionManager:
     def __init__(self):
         """初始化连接管理器，只在第一次创建时执行"""
         if not getattr(self, "_initialized", False):
-            db_manager = get_db_manager()
-            self.graph = db_manager.graph
+            self.db_manager = get_db_manager()
+            self.graph = self.db_manager.graph
             self._initialized = True
     
     def get_connection(self):
@@ -49,6 +49,45 @@ class GraphConnectionManager:
         """
         return self.graph.query(query, params or {})
     
+    def execute_write(self, query: str, params: Optional[dict] = None) -> List[Dict[str, Any]]:
+        """
+        在会话池中以托管写事务执行查询，瞬时错误自动重试。
+        与共享的 graph.query 不同，每个线程使用自己借出的会话，并行写入互不阻塞。
+        
+        Args:
+            query: 查询语句
+            params: 查询参数
+            
+        Returns:
+            List[Dict[str, Any]]: 查询结果
+        """
+        return self.db_manager.execute_write(query, params)
+    
+    def execute_write_batch(self, statements: List[Tuple[str, Optional[dict]]]) -> List[List[Dict[str, Any]]]:
+        """
+        在同一个写事务中依次执行多条语句，全部成功或全部回滚
+        
+        Args:
+            statements: (查询语句, 查询参数) 列表
+            
+        Returns:
+            List[List[Dict[str, Any]]]: 每条语句的查询结果
+        """
+        return self.db_manager.execute_write_batch(statements)
+    
+    def execute_read(self, query: str, params: Optional[dict] = None) -> List[Dict[str, Any]]:
+        """
+        在会话池中以托管读事务执行查询
+        
+        Args:
+            query: 查询语句
+            params: 查询参数
+            
+        Returns:
+            List[Dict[str, Any]]: 查询结果
+        """
+        return self.db_manager.execute_read(query, params)
+    
     def create_index(self, index_query: str) -> None:
         """
         创建索引
@@ -56,7 +95,11 @@ class GraphConnectionManager:
         Args:
             index_query: 索引创建查询
         """
-        self.graph.query(index_query)
+        try:
+            self.graph.query(index_query)
+        except Exception as e:
+            # 同一属性上已有唯一约束时，约束自带的索引已经覆盖该查询
+            print(f"创建索引时出错 (可忽略): {e}")
         
     def create_multiple_indexes(self, index_queries: list) -> None:
         """
@@ -0,0 +1,344 @@
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from config.settings import (
+    MAX_WORKERS,
+    LLM_MIN_CONCURRENCY,
+    LLM_MAX_CONCURRENCY,
+    LLM_RPM_LIMIT,
+    LLM_TPM_LIMIT,
+    LLM_MAX_ATTEMPTS,
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+    LLM_RETRY_BUDGET_RATIO,
+    LLM_RETRY_BUDGET_MIN,
+    LLM_CIRCUIT_BREAKER_THRESHOLD,
+    LLM_CIRCUIT_BREAKER_COOLDOWN,
+    LLM_LATENCY_TOLERANCE,
+)
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器处于打开状态时抛出，调用方应直接放弃本次请求"""
+
+
+class LLMGovernor:
+    """
+    LLM调用调度器，所有抽取、实体合并和社区摘要的LLM请求都经过这里。
+
+    主要功能：
+    - 按RPM/TPM滑动窗口限流
+    - 根据观测到的延迟和429比例以AIMD方式自适应调整并发上限
+    - 统一的抖动指数退避重试，重试次数受全局重试预算约束
+    - 连续失败达到阈值后熔断，冷却期内快速失败
+    """
+
+    _WINDOW = 60.0
+
+    def __init__(self,
+                 initial_concurrency: int = MAX_WORKERS,
+                 min_concurrency: int = LLM_MIN_CONCURRENCY,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 rpm_limit: int = LLM_RPM_LIMIT,
+                 tpm_limit: int = LLM_TPM_LIMIT,
+                 max_attempts: int = LLM_MAX_ATTEMPTS):
+        """
+        初始化调度器
+
+        Args:
+            initial_concurrency: 初始并发上限
+            min_concurrency: 并发上限的下界
+            max_concurrency: 并发上限的上界
+            rpm_limit: 每分钟请求数上限，<=0 表示不限制
+            tpm_limit: 每分钟token数上限，<=0 表示不限制
+            max_attempts: 单个请求的最大尝试次数（含首次）
+        """
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.limit = float(min(max(initial_concurrency, self.min_concurrency), self.max_concurrency))
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.max_attempts = max(1, max_attempts)
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self.in_flight = 0
+
+        # 滑动窗口：请求时间戳、(时间戳, token数)
+        self._request_times = deque()
+        self._token_usage = deque()
+
+        # 延迟统计：指数加权平均；基线取当前和上一个调整窗口内平均值的最小值，
+        # 输出长度变化导致的延迟整体上移会在两个窗口后进入基线
+        self._latency_ewma = None
+        self._window_min = None
+        self._prev_window_min = None
+        # 调整窗口：每完成约 limit 个请求评估一次延迟并调整并发上限
+        self._window_completions = 0
+
+        # 熔断器
+        self._consecutive_failures = 0
+        self._circuit_open_until = 0.0
+
+        # 统计信息
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.budget_exhausted = 0
+        self.circuit_trips = 0
+        self.tokens = 0
+
+    # ---------- 限流与并发控制 ----------
+
+    def _prune(self, now: float) -> None:
+        while self._request_times and now - self._request_times[0] > self._WINDOW:
+            self._request_times.popleft()
+        while self._token_usage and now - self._token_usage[0][0] > self._WINDOW:
+            self._token_usage.popleft()
+
+    def _try_acquire(self, est_tokens: int) -> float:
+        """
+        尝试占用一个并发槽位（调用方需持有锁）
+
+        Returns:
+            float: 0 表示成功占用，否则为建议等待的秒数
+        """
+        now = time.time()
+        if now < self._circuit_open_until:
+            raise CircuitOpenError(f"LLM熔断中，{self._circuit_open_until - now:.1f}秒后恢复")
+
+        if self.in_flight >= int(self.limit):
+            return 0.05
+
+        self._prune(now)
+        if self.rpm_limit > 0 and len(self._request_times) >= self.rpm_limit:
+            return max(0.05, self._request_times[0] + self._WINDOW - now)
+        if self.tpm_limit > 0 and self._token_usage:
+            used = sum(tokens for _, tokens in self._token_usage)
+            if used + est_tokens > self.tpm_limit:
+                return max(0.05, self._token_usage[0][0] + self._WINDOW - now)
+
+        self.in_flight += 1
+        self.requests += 1
+        self._request_times.append(now)
+        if est_tokens:
+            self._token_usage.append((now, est_tokens))
+        return 0
+
+    def _acquire(self, est_tokens: int) -> None:
+        with self._cond:
+            while True:
+                wait = self._try_acquire(est_tokens)
+                if not wait:
+                    return
+                self._cond.wait(timeout=wait)
+
+    async def _aacquire(self, est_tokens: int) -> None:
+        while True:
+            with self._lock:
+                wait = self._try_acquire(est_tokens)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def _release(self, latency: Optional[float], error: Optional[BaseException],
+                 response: Any = None, est_tokens: int = 0) -> None:
+        """释放槽位并根据本次结果调整并发上限和熔断状态"""
+        with self._cond:
+            self.in_flight -= 1
+            now = time.time()
+
+            if isinstance(error, asyncio.CancelledError):
+                # 被取消的请求不计入成功或失败
+                pass
+            elif error is None:
+                self.successes += 1
+                self._consecutive_failures = 0
+                self._record_tokens(now, response, est_tokens)
+                self._observe_latency(latency)
+                self._window_completions += 1
+                if self._window_completions >= int(self.limit):
+                    self._adjust_for_latency()
+            else:
+                self.failures += 1
+                self._consecutive_failures += 1
+                if self._is_rate_limit(error):
+                    # 乘性减：遇到429并发上限减半
+                    self.rate_limited += 1
+                    self.limit = max(self.min_concurrency, self.limit / 2)
+                if self._consecutive_failures >= LLM_CIRCUIT_BREAKER_THRESHOLD and \
+                        now >= self._circuit_open_until:
+                    self._circuit_open_until = now + LLM_CIRCUIT_BREAKER_COOLDOWN
+                    self._consecutive_failures = 0
+                    self.circuit_trips += 1
+                    print(f"LLM连续失败 {LLM_CIRCUIT_BREAKER_THRESHOLD} 次，"
+                          f"熔断 {LLM_CIRCUIT_BREAKER_COOLDOWN} 秒: {error}")
+
+            self._cond.notify_all()
+
+    def _observe_latency(self, latency: Optional[float]) -> None:
+        if latency is None:
+            return
+        if self._latency_ewma is None:
+            self._latency_ewma = latency
+        else:
+            self._latency_ewma = 0.8 * self._latency_ewma + 0.2 * latency
+        if self._window_min is None or self._latency_ewma < self._window_min:
+            self._window_min = self._latency_ewma
+
+    def _latency_baseline(self) -> Optional[float]:
+        """当前和上一个调整窗口内延迟平均值的最小值"""
+        values = [value for value in (self._window_min, self._prev_window_min) if value is not None]
+        return min(values) if values else None
+
+    def _adjust_for_latency(self) -> None:
+        """
+        一个调整窗口结束时调整并发上限（调用方需持有锁）：
+        延迟未明显劣化时加性增1，否则乘性减为0.9倍，每个窗口最多调整一次
+        """
+        baseline = self._latency_baseline()
+        if baseline is None or self._latency_ewma <= baseline * LLM_LATENCY_TOLERANCE:
+            self.limit = min(self.max_concurrency, self.limit + 1.0)
+        else:
+            self.limit = max(self.min_concurrency, self.limit * 0.9)
+        self._prev_window_min = self._window_min
+        self._window_min = None
+        self._window_completions = 0
+
+    def _record_tokens(self, now: float, response: Any, est_tokens: int) -> None:
+        """记录响应中的实际token用量（若模型返回了usage信息），并修正请求前的预估值"""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None and isinstance(response, dict):
+            # with_structured_output(include_raw=True) 返回字典，用量在原始消息上
+            usage = getattr(response.get("raw"), "usage_metadata", None)
+        total = usage.get("total_tokens", 0) if isinstance(usage, dict) else 0
+        if total:
+            self.tokens += total
+            if self.tpm_limit > 0:
+                self._token_usage.append((now, total - est_tokens))
+
+    @staticmethod
+    def _is_rate_limit(error: BaseException) -> bool:
+        if getattr(error, "status_code", None) == 429:
+            return True
+        text = f"{type(error).__name__} {error}".lower()
+        return "ratelimit" in text or "rate limit" in text or "429" in text
+
+    # ---------- 重试预算与退避 ----------
+
+    def _take_retry(self) -> bool:
+        """从全局重试预算中取出一次重试机会，预算为请求总数的固定比例"""
+        with self._lock:
+            budget = LLM_RETRY_BUDGET_MIN + LLM_RETRY_BUDGET_RATIO * self.requests
+            if self.retries >= budget:
+                self.budget_exhausted += 1
+                return False
+            self.retries += 1
+            return True
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """全抖动指数退避"""
+        return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+    def _should_retry(self, attempt: int, error: BaseException) -> bool:
+        if isinstance(error, CircuitOpenError):
+            return False
+        if attempt + 1 >= self.max_attempts:
+            return False
+        return self._take_retry()
+
+    # ---------- 调用入口 ----------
+
+    def call(self, func: Callable, *args, est_tokens: int = 0, **kwargs) -> Any:
+        """
+        经调度器执行一次同步LLM调用
+
+        Args:
+            func: 实际的调用函数，如 chain.invoke
+            est_tokens: 预估token数，用于TPM限流
+            *args, **kwargs: 传给func的参数
+
+        Returns:
+            func的返回值，重试耗尽后抛出最后一次异常
+        """
+        attempt = 0
+        while True:
+            self._acquire(est_tokens)
+            start = time.time()
+            try:
+                response = func(*args, **kwargs)
+            except Exception as e:
+                self._release(None, e)
+                if not self._should_retry(attempt, e):
+                    raise
+                delay = self._backoff(attempt)
+                attempt += 1
+                print(f"LLM调用失败: {e}，{delay:.1f}秒后重试 ({attempt}/{self.max_attempts - 1})")
+                time.sleep(delay)
+                continue
+            self._release(time.time() - start, None, response, est_tokens)
+            return response
+
+    async def acall(self, func: Callable, *args, est_tokens: int = 0, **kwargs) -> Any:
+        """
+        经调度器执行一次异步LLM调用，参数同 call，func 需返回可等待对象（如 chain.ainvoke）
+        """
+        attempt = 0
+        while True:
+            await self._aacquire(est_tokens)
+            start = time.time()
+            try:
+                response = await func(*args, **kwargs)
+            except asyncio.CancelledError as e:
+                self._release(None, e)
+                raise
+            except Exception as e:
+                self._release(None, e)
+                if not self._should_retry(attempt, e):
+                    raise
+                delay = self._backoff(attempt)
+                attempt += 1
+                print(f"LLM调用失败: {e}，{delay:.1f}秒后重试 ({attempt}/{self.max_attempts - 1})")
+                await asyncio.sleep(delay)
+                continue
+            self._release(time.time() - start, None, response, est_tokens)
+            return response
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取调度统计信息
+
+        Returns:
+            Dict[str, Any]: 请求、失败、限流、重试、熔断次数以及当前并发上限
+        """
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "successes": self.successes,
+                "failures": self.failures,
+                "rate_limited": self.rate_limited,
+                "retries": self.retries,
+                "budget_exhausted": self.budget_exhausted,
+                "circuit_trips": self.circuit_trips,
+                "tokens": self.tokens,
+                "concurrency_limit": int(self.limit),
+                "latency_ewma": self._latency_ewma or 0.0,
+            }
+
+    def print_stats(self) -> None:
+        """打印调度统计信息"""
+        s = self.stats()
+        print(f"LLM调度统计: 请求 {s['requests']} 次, 成功 {s['successes']}, 失败 {s['failures']} "
+              f"(限流 {s['rate_limited']}), 重试 {s['retries']}, 熔断 {s['circuit_trips']} 次, "
+              f"当前并发上限 {s['concurrency_limit']}, 平均延迟 {s['latency_ewma']:.2f}秒")
+
+
+# 全局调度器实例，所有LLM调用共享
+llm_governor = LLMGovernor()
@@ -0,0 +1,209 @@
+"""
+图数据库模式管理：所有唯一约束、范围索引和向量索引在这里统一声明。
+
+写入路径按 __Entity__.id、__Chunk__.id、__Document__.fileName 和 __Community__.id 执行MERGE，
+没有约束时每次MERGE都要扫描整个标签。SchemaManager 在构建基础图谱之前幂等地创建这些约束和索引，
+等待它们上线并报告状态；各组件需要索引时也统一调用这里，不再各自创建。
+"""
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import (
+    CHUNK_EMBED_FIELD,
+    CHUNK_LABEL,
+    CHUNK_VECTOR,
+    DOCUMENT_LABEL,
+    ENTITY_EMBED_FIELD,
+    ENTITY_LABEL,
+    ENTITY_VECTOR,
+    SCHEMA_AWAIT_SECONDS,
+    VECTOR_INDEX_DIMENSIONS,
+    VECTOR_SIMILARITY_FUNCTION,
+)
+from graph.core.graph_connection import connection_manager
+
+COMMUNITY_LABEL = "__Community__"
+
+# (名称, 标签, 属性)：MERGE所依赖的唯一约束，约束自带同一属性上的范围索引
+CONSTRAINTS: List[Tuple[str, str, str]] = [
+    ("entity_id_unique", ENTITY_LABEL, "id"),
+    ("chunk_id_unique", CHUNK_LABEL, "id"),
+    ("document_file_name_unique", DOCUMENT_LABEL, "fileName"),
+    ("community_id_unique", COMMUNITY_LABEL, "id"),
+]
+
+# (名称, 标签, 属性)：查询中按属性过滤的范围索引
+RANGE_INDEXES: List[Tuple[str, str, str]] = [
+    ("entity_wcc", ENTITY_LABEL, "wcc"),
+    ("chunk_file_name", CHUNK_LABEL, "fileName"),
+    ("chunk_position", CHUNK_LABEL, "position"),
+    ("community_level", COMMUNITY_LABEL, "level"),
+]
+
+# (名称, 标签, 属性)：向量索引，名称与 Neo4jVector 使用的 index_name 一致
+VECTOR_INDEXES: List[Tuple[str, str, str]] = [
+    (CHUNK_VECTOR, CHUNK_LABEL, CHUNK_EMBED_FIELD),
+    (ENTITY_VECTOR, ENTITY_LABEL, ENTITY_EMBED_FIELD),
+]
+
+_SHOW_INDEXES = """
+SHOW INDEXES
+YIELD name, type, labelsOrTypes, properties, owningConstraint, state, populationPercent
+RETURN name, type, labelsOrTypes, properties, owningConstraint, state, populationPercent
+"""
+
+
+class SchemaManager:
+    """
+    图数据库模式管理器，负责创建声明的约束和索引、等待其上线并报告状态。
+    所有语句都带 IF NOT EXISTS，可以重复执行；同一进程中 ensure 只执行一次。
+    """
+
+    _applied = False
+
+    def __init__(self, connection=None, await_seconds: float = SCHEMA_AWAIT_SECONDS):
+        """
+        初始化模式管理器
+
+        Args:
+            connection: 提供 execute_query 的连接管理器，默认使用全局连接管理器
+            await_seconds: 等待约束和索引上线的最长时间(秒)
+        """
+        self.connection = connection or connection_manager
+        self.await_seconds = await_seconds
+
+    def _declared(self) -> List[Tuple[str, str, str, str]]:
+        """全部声明的 (类别, 名称, 标签, 属性)，未配置向量维度时不包含向量索引"""
+        items = [("constraint", *item) for item in CONSTRAINTS]
+        items += [("range", *item) for item in RANGE_INDEXES]
+        if VECTOR_INDEX_DIMENSIONS:
+            items += [("vector", *item) for item in VECTOR_INDEXES]
+        return items
+
+    def _index_rows(self) -> List[Dict[str, Any]]:
+        """读取数据库中现有的全部索引（包括约束自带的索引）"""
+        return list(self.connection.execute_query(_SHOW_INDEXES))
+
+    @staticmethod
+    def _find(rows: List[Dict[str, Any]], kind: str, name: str, label: str,
+              prop: str) -> Optional[Dict[str, Any]]:
+        """
+        在现有索引中查找与声明对应的一项：约束按标签和属性匹配（可能由旧代码以其他名称创建），
+        范围索引还可以由同一属性上的约束覆盖，向量索引按名称匹配
+
+        Returns:
+            Optional[Dict[str, Any]]: 匹配的索引行，不存在时返回None
+        """
+        for row in rows:
+            if kind == "vector":
+                if row["name"] == name:
+                    return row
+                continue
+            if row["type"] != "RANGE" or row["labelsOrTypes"] != [label] or row["properties"] != [prop]:
+                continue
+            if kind == "range" or row.get("owningConstraint"):
+                return row
+        return None
+
+    def _create_constraint(self, rows: List[Dict[str, Any]], name: str, label: str, prop: str) -> None:
+        """
+        创建唯一约束。同一属性上已有普通范围索引时无法创建约束，
+        先删除这个索引，约束会自带一个同样的索引
+        """
+        for row in rows:
+            if (row["type"] == "RANGE" and not row.get("owningConstraint")
+                    and row["labelsOrTypes"] == [label] and row["properties"] == [prop]):
+                self.connection.execute_query(f"DROP INDEX `{row['name']}` IF EXISTS")
+                print(f"已删除索引 {row['name']}，由唯一约束 {name} 取代")
+        self.connection.execute_query(
+            f"CREATE CONSTRAINT `{name}` IF NOT EXISTS FOR (n:`{label}`) REQUIRE n.`{prop}` IS UNIQUE"
+        )
+
+    def _create_range_index(self, name: str, label: str, prop: str) -> None:
+        self.connection.execute_query(f"CREATE INDEX `{name}` IF NOT EXISTS FOR (n:`{label}`) ON (n.`{prop}`)")
+
+    def _create_vector_index(self, name: str, label: str, prop: str) -> None:
+        self.connection.execute_query(
+            f"CREATE VECTOR INDEX `{name}` IF NOT EXISTS FOR (n:`{label}`) ON (n.`{prop}`) "
+            f"OPTIONS {{indexConfig: {{`vector.dimensions`: {int(VECTOR_INDEX_DIMENSIONS)}, "
+            f"`vector.similarity_function`: '{VECTOR_SIMILARITY_FUNCTION}'}}}}"
+        )
+
+    def apply(self) -> List[Dict[str, Any]]:
+        """
+        创建所有缺失的约束和索引，等待它们上线
+
+        Returns:
+            List[Dict[str, Any]]: 每个声明项的状态，见 status
+        """
+        rows = self._index_rows()
+        for kind, name, label, prop in self._declared():
+            if self._find(rows, kind, name, label, prop):
+                continue
+            try:
+                if kind == "constraint":
+                    self._create_constraint(rows, name, label, prop)
+                elif kind == "range":
+                    self._create_range_index(name, label, prop)
+                else:
+                    self._create_vector_index(name, label, prop)
+            except Exception as e:
+                print(f"创建 {name} 时出错: {e}")
+
+        status = self.await_online()
+        SchemaManager._applied = True
+        return status
+
+    def ensure(self) -> None:
+        """同一进程中只执行一次 apply，出错时只打印错误"""
+        if SchemaManager._applied:
+            return
+        try:
+            self.apply()
+        except Exception as e:
+            print(f"创建图数据库约束和索引时出错: {e}")
+
+    def await_online(self) -> List[Dict[str, Any]]:
+        """
+        轮询直到所有声明项都不再处于 POPULATING 状态，或超过等待时间
+
+        Returns:
+            List[Dict[str, Any]]: 每个声明项的最终状态
+        """
+        deadline = time.time() + self.await_seconds
+        while True:
+            status = self.status()
+            populating = [item["name"] for item in status if item["state"] == "POPULATING"]
+            if not populating:
+                return status
+            if time.time() >= deadline:
+                print(f"等待索引上线超时 ({self.await_seconds}秒)，仍在填充: {', '.join(populating)}")
+                return status
+            time.sleep(0.5)
+
+    def status(self) -> List[Dict[str, Any]]:
+        """
+        获取每个声明项在数据库中的状态
+
+        Returns:
+            List[Dict[str, Any]]: 包含 kind、name、schema、state（ONLINE/POPULATING/FAILED/MISSING）
+                                  和 progress（填充百分比）的字典列表
+        """
+        rows = self._index_rows()
+        status = []
+        for kind, name, label, prop in self._declared():
+            row = self._find(rows, kind, name, label, prop)
+            status.append({
+                "kind": kind,
+                "name": row["name"] if row else name,
+                "schema": f":{label}({prop})",
+                "state": row["state"] if row else "MISSING",
+                "progress": row.get("populationPercent") if row else None,
+            })
+        return status
+
+    def print_status(self, status: Optional[List[Dict[str, Any]]] = None) -> None:
+        """打印每个声明项的状态"""
+        kinds = {"constraint": "唯一约束", "range": "范围索引", "vector": "向量索引"}
+        for item in status or self.status():
+            print(f"{kinds[item['kind']]} {item['name']} {item['schema']}: {item['state']}")
@@ -0,0 +1,224 @@
+import os
+import time
+import pickle
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class SQLiteCache:
+    """
+    基于SQLite的单文件键值缓存。
+    所有条目保存在同一个数据库文件中，支持批量读写、按容量淘汰（LRU）以及命中统计，
+    避免"一个条目一个文件"带来的海量inode和逐个stat/open开销。
+    """
+
+    # SQLite单条语句的参数个数上限为999，这里留出余量
+    _MAX_PARAMS = 900
+    # 命中时只在内存中记录访问时间，积累到这个数量或下次写入时再批量更新
+    _ACCESS_FLUSH = 1000
+
+    def __init__(self, db_path: str, max_size_mb: float = 1024):
+        """
+        初始化缓存
+
+        Args:
+            db_path: 缓存数据库文件路径
+            max_size_mb: 缓存容量上限(MB)，超过后按最近访问时间淘汰，<=0 表示不限制
+        """
+        self.db_path = db_path
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024) if max_size_mb and max_size_mb > 0 else 0
+
+        cache_dir = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        # 单连接 + 锁，允许多个工作线程共享同一个缓存；多个进程共享同一文件时等待对方的写事务
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache(accessed_at)")
+        self._conn.commit()
+
+        # 待写回的访问时间：键 -> 最近一次命中的时间
+        self._pending_access: Dict[str, float] = {}
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def _chunked(self, items: List[Any]) -> Iterable[List[Any]]:
+        for i in range(0, len(items), self._MAX_PARAMS):
+            yield items[i:i + self._MAX_PARAMS]
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        批量读取缓存
+
+        Args:
+            keys: 缓存键列表
+
+        Returns:
+            Dict[str, Any]: 命中的键值映射，未命中的键不会出现在结果中
+        """
+        unique_keys = list(dict.fromkeys(keys))
+        if not unique_keys:
+            return {}
+
+        found = {}
+        now = time.time()
+        with self._lock:
+            for key_batch in self._chunked(unique_keys):
+                placeholders = ",".join("?" * len(key_batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM cache WHERE key IN ({placeholders})", key_batch
+                ).fetchall()
+                for key, value in rows:
+                    self._pending_access[key] = now
+                    try:
+                        found[key] = pickle.loads(value)
+                    except Exception as e:
+                        print(f"缓存反序列化错误 ({key}): {e}")
+
+            # 读取不再逐次提交写事务，访问时间攒够一批再写回
+            if len(self._pending_access) >= self._ACCESS_FLUSH:
+                self._flush_access()
+                self._conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(unique_keys) - len(found)
+
+        return found
+
+    def get(self, key: str) -> Optional[Any]:
+        """读取单个缓存条目，未命中返回None"""
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: Dict[str, Any]) -> None:
+        """
+        批量写入缓存，写入后按需淘汰最久未访问的条目
+
+        Args:
+            items: 键值映射
+        """
+        if not items:
+            return
+
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            rows.append((key, blob, len(blob), now))
+
+        with self._lock:
+            # 立即获取写锁，其他进程的写入在此事务提交前等待，容量统计与淘汰基于同一快照
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._flush_access()
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO cache(key, value, size, accessed_at) VALUES (?, ?, ?, ?)", rows
+                )
+                self.writes += len(rows)
+
+                if self.max_size_bytes:
+                    self._evict()
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def put(self, key: str, value: Any) -> None:
+        """写入单个缓存条目"""
+        self.put_many({key: value})
+
+    def _flush_access(self) -> None:
+        """把内存中记录的访问时间写回数据库（调用方需持有锁并负责提交）"""
+        if not self._pending_access:
+            return
+        self._conn.executemany(
+            "UPDATE cache SET accessed_at = ? WHERE key = ?",
+            [(accessed_at, key) for key, accessed_at in self._pending_access.items()]
+        )
+        self._pending_access.clear()
+
+    def _size(self) -> int:
+        """数据库中所有条目的总大小，其他进程写入的条目同样计入"""
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+
+    def _evict(self) -> None:
+        """
+        超过容量上限时淘汰最久未访问的条目，直到容量降到上限的90%以下。
+        在写事务中执行，总大小从数据库重新统计（调用方需持有锁）
+        """
+        total_size = self._size()
+        if total_size <= self.max_size_bytes:
+            return
+        target = int(self.max_size_bytes * 0.9)
+        while total_size > target:
+            rows = self._conn.execute(
+                "SELECT key, size FROM cache ORDER BY accessed_at ASC LIMIT 500"
+            ).fetchall()
+            if not rows:
+                break
+
+            victims = []
+            for key, size in rows:
+                victims.append(key)
+                total_size -= size
+                if total_size <= target:
+                    break
+
+            for key_batch in self._chunked(victims):
+                self._conn.execute(
+                    f"DELETE FROM cache WHERE key IN ({','.join('?' * len(key_batch))})", key_batch
+                )
+            self.evictions += len(victims)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._pending_access.clear()
+            self._conn.execute("DELETE FROM cache")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            Dict[str, Any]: 命中、未命中、写入、淘汰次数以及当前容量
+        """
+        lookups = self.hits + self.misses
+        with self._lock:
+            size = self._size()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "entries": len(self),
+            "size_mb": size / (1024 * 1024),
+        }
+
+    def close(self) -> None:
+        """写回访问时间并关闭数据库连接"""
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+            self._conn.close()
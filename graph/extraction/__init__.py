@@ -1,7 +1,13 @@
 from .entity_extractor import EntityRelationExtractor
 from .graph_writer import GraphWriter
+from .bulk_writer import BulkGraphWriter, build_write_statements
+from .tuple_parser import ExtractionTupleParser, parse_extraction_output
 
 __all__ = [
     'EntityRelationExtractor',
-    'GraphWriter'
+    'GraphWriter',
+    'BulkGraphWriter',
+    'build_write_statements',
+    'ExtractionTupleParser',
+    'parse_extraction_output'
 ]
\ No newline at end of file
@@ -0,0 +1,142 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_community.graphs.graph_document import GraphDocument
+
+from graph.core import SchemaManager, connection_manager
+
+# 按标签写入实体节点：__Entity__ 上按id合并，实体类型作为第二个标签
+_NODE_QUERY = """
+UNWIND $rows AS row
+MERGE (e:`__Entity__` {id: row.id})
+SET e += row.properties
+"""
+
+# 按类型写入关系：同一对实体之间已有同类型关系时保留首次写入的属性
+_RELATIONSHIP_QUERY = """
+UNWIND $rows AS row
+MERGE (s:`__Entity__` {{id: row.source}})
+MERGE (t:`__Entity__` {{id: row.target}})
+MERGE (s)-[r:`{rel_type}`]->(t)
+ON CREATE SET r += row.properties
+"""
+
+# Chunk直接指向其中出现的实体，不再经过临时的Document节点
+_MENTIONS_QUERY = """
+UNWIND $rows AS row
+MATCH (c:`__Chunk__` {id: row.chunk_id})
+UNWIND row.entity_ids AS entity_id
+MATCH (e:`__Entity__` {id: entity_id})
+MERGE (c)-[:MENTIONS]->(e)
+"""
+
+
+def sanitize_label(text: str) -> str:
+    """去掉反引号，标签和关系类型写在反引号内"""
+    return text.replace("`", "")
+
+
+def relationship_type(text: str) -> str:
+    """关系类型规范化，与 add_graph_documents 的处理一致：空格替换为下划线并转为大写"""
+    return sanitize_label(text.replace(" ", "_").upper())
+
+
+def group_graph_documents(documents: List[GraphDocument]) -> Tuple[Dict[str, List[Dict]], Dict[str, List[Dict]], List[Dict]]:
+    """
+    将一批GraphDocument按节点标签和关系类型分组
+
+    Args:
+        documents: 图文档列表，source.metadata 中需包含 chunk_id
+
+    Returns:
+        Tuple: (标签 -> 节点行, 关系类型 -> 关系行, chunk提及的实体行)。
+               同一实体在批内出现多次时使用最后一次的属性，并带上出现过的所有类型标签；
+               关系行保持文档顺序
+    """
+    properties: Dict[str, Dict] = {}
+    labels: Dict[str, Dict[str, None]] = {}
+    relationships: Dict[str, List[Dict]] = {}
+    mentions = []
+
+    for document in documents:
+        for node in document.nodes:
+            properties[node.id] = node.properties
+            labels.setdefault(sanitize_label(node.type), {})[node.id] = None
+
+        for rel in document.relationships:
+            relationships.setdefault(relationship_type(rel.type), []).append({
+                "source": rel.source.id,
+                "target": rel.target.id,
+                "properties": rel.properties,
+            })
+
+        chunk_id = document.source.metadata.get("chunk_id") if document.source else None
+        if chunk_id and document.nodes:
+            mentions.append({"chunk_id": chunk_id, "entity_ids": [node.id for node in document.nodes]})
+
+    node_rows = {
+        label: [{"id": node_id, "properties": properties[node_id]} for node_id in node_ids]
+        for label, node_ids in labels.items()
+    }
+    return node_rows, relationships, mentions
+
+
+def build_write_statements(documents: List[GraphDocument]) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    生成写入一批GraphDocument的参数化UNWIND语句：每个节点标签、每种关系类型各一条，最后写入MENTIONS
+
+    Args:
+        documents: 图文档列表
+
+    Returns:
+        List[Tuple[str, Dict[str, Any]]]: (Cypher语句, 参数) 列表，按执行顺序排列
+    """
+    node_rows, rel_rows, mentions = group_graph_documents(documents)
+    statements = []
+    for label, rows in node_rows.items():
+        query = _NODE_QUERY + f"SET e:`{label}`\n" if label else _NODE_QUERY
+        statements.append((query, {"rows": rows}))
+    for rel_type, rows in rel_rows.items():
+        statements.append((_RELATIONSHIP_QUERY.format(rel_type=rel_type), {"rows": rows}))
+    if mentions:
+        statements.append((_MENTIONS_QUERY, {"rows": mentions}))
+    return statements
+
+
+class BulkGraphWriter:
+    """
+    原生批量图写入器，替代 Neo4jGraph.add_graph_documents。
+    add_graph_documents 为每个chunk创建一个临时Document节点并逐文档发送查询，之后还要把
+    MENTIONS 关系搬到Chunk节点上再删除Document；这里把一批文档的节点按标签、关系按类型
+    分组成少量UNWIND语句，连同 (:__Chunk__)-[:MENTIONS]->(:__Entity__) 在一个事务中写入。
+    """
+
+    def __init__(self, connection=None):
+        """
+        初始化批量写入器
+
+        Args:
+            connection: 提供 execute_write / execute_write_batch 的连接管理器，默认使用全局连接管理器
+        """
+        self.connection = connection or connection_manager
+
+    def ensure_constraint(self) -> None:
+        """实体、Chunk和文档上的唯一约束，MERGE依赖它们走索引查找；同一进程中只创建一次"""
+        SchemaManager(self.connection).ensure()
+
+    def write(self, documents: List[GraphDocument],
+              leading_statements: Optional[List[Tuple[str, Dict[str, Any]]]] = None) -> Optional[List[List[Dict[str, Any]]]]:
+        """
+        在一个事务中写入一批GraphDocument
+
+        Args:
+            documents: 图文档列表
+            leading_statements: 在实体之前执行的语句（如文档和Chunk结构），与实体在同一事务中提交
+
+        Returns:
+            每条语句的查询结果，没有需要写入的数据时返回None
+        """
+        statements = list(leading_statements or []) + build_write_statements(documents)
+        if not statements:
+            return None
+        self.ensure_constraint()
+        return self.connection.execute_write_batch(statements)
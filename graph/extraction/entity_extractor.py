@@ -1,17 +1,163 @@
+import re
 import time
 import os
-import pickle
+import asyncio
+import json
+import threading
 import concurrent.futures
-from typing import List, Tuple, Optional
+from collections import deque
+from typing import List, Tuple, Optional, Dict
 from langchain.prompts import (
     ChatPromptTemplate,
     HumanMessagePromptTemplate,
     MessagesPlaceholder,
     SystemMessagePromptTemplate,
 )
+from langchain_core.messages import AIMessage
+from langchain_core.messages.ai import add_usage
+
+from graph.core import generate_hash, SQLiteCache, llm_governor
+from graph.extraction.tuple_parser import ExtractionTupleParser
+from graph.extraction.structured_output import (
+    STRUCTURED_OUTPUT_INSTRUCTION,
+    EXTRACTION_SCHEMA,
+    BATCH_EXTRACTION_SCHEMA,
+    unwrap_structured_response,
+    dump_extraction,
+    split_batch_extraction,
+)
+from model.get_models import count_tokens
+from config.settings import (
+    MAX_WORKERS as DEFAULT_MAX_WORKERS,
+    BATCH_SIZE as DEFAULT_BATCH_SIZE,
+    EXTRACTION_CACHE_MAX_MB,
+    ASYNC_MAX_CONCURRENCY,
+    LLM_BATCH_PROMPT_TOKENS,
+    LLM_BATCH_COMPLETION_TOKENS,
+    LLM_BATCH_COMPLETION_RATIO,
+    EXTRACTION_STREAMING,
+    EXTRACTION_MAX_RECORDS,
+    EXTRACTION_OUTPUT_MODE,
+    EXTRACTION_STRUCTURED_METHOD,
+)
+
+# 批量抽取时每个文本块的编号标记
+_CHUNK_MARKER = re.compile(r"^[ \t]*<<<CHUNK (\d+)>>>[ \t]*$", re.MULTILINE)
+
+class _CorpusExtractionState:
+    """
+    语料级抽取状态：维护每个文件的结果槽位和剩余任务数，
+    负责按原始顺序组装结果并触发进度回调和文件完成回调。
+    缓存键相同的chunk（跨文件重复的段落）只抽取一次，结果分发到所有引用它的槽位。
+    """
+
+    def __init__(self, extractor, file_contents, file_keys, cached, progress_callback, file_callback,
+                 keep_results=True):
+        self.extractor = extractor
+        self.file_contents = file_contents
+        self.file_keys = file_keys
+        self.progress_callback = progress_callback
+        self.file_callback = file_callback
+        # 为False时结果只交给文件回调，完成的文件不在 file_contents 中保留结果
+        self.keep_results = keep_results
+        # 异步文件回调不在 record 中直接调用，先排队，由抽取协程通过 adrain 等待
+        self.async_file_callback = asyncio.iscoroutinefunction(file_callback)
+        self.pending_files = deque()
+
+        self.file_results = [[cached.get(key) for key in keys] for keys in file_keys]
+        # 每个文件中抽取失败的chunk序号（包括熔断期间被拒绝的请求），失败的结果为空字符串
+        self.failed_chunks = [[] for _ in file_keys]
+        self.remaining = [sum(1 for result in results if result is None) for results in self.file_results]
+        self.total_chunks = sum(len(keys) for keys in file_keys)
+        self.chunk_index = 0
+        self.finished_files = 0
+        # 缓存键 -> 等待该结果的 (文件序号, chunk序号) 列表
+        self.waiters = {}
+        self.reused = 0
+
+    def pending_tasks(self) -> List[Tuple[int, int]]:
+        """按文件顺序返回所有未命中缓存的 (文件序号, chunk序号)，相同缓存键只返回首次出现的位置"""
+        tasks = []
+        for file_idx, results in enumerate(self.file_results):
+            for chunk_idx, result in enumerate(results):
+                if result is not None:
+                    continue
+                key = self.file_keys[file_idx][chunk_idx]
+                if key not in self.waiters:
+                    self.waiters[key] = []
+                    tasks.append((file_idx, chunk_idx))
+                self.waiters[key].append((file_idx, chunk_idx))
+        self.reused = sum(len(slots) - 1 for slots in self.waiters.values())
+        return tasks
+
+    def chunk_text(self, file_idx: int, chunk_idx: int) -> str:
+        return ''.join(self.file_contents[file_idx][2][chunk_idx])
+
+    def _advance(self) -> None:
+        if self.progress_callback:
+            self.progress_callback(self.chunk_index)
+        self.chunk_index += 1
+
+    def _finish_file(self, file_idx: int) -> None:
+        file_content = self.file_contents[file_idx]
+        if self.keep_results:
+            file_content.append(self.file_results[file_idx])
+        else:
+            file_content = [*file_content, self.file_results[file_idx]]
+            self.file_results[file_idx] = []
+        self.finished_files += 1
+        if self.failed_chunks[file_idx]:
+            self.extractor.failed_chunks[file_content[0]] = sorted(self.failed_chunks[file_idx])
+
+        hits, misses = self.extractor.cache_hits, self.extractor.cache_misses
+        cache_ratio = hits / (hits + misses) * 100 if (hits + misses) > 0 else 0
+        print(f"文件 {self.finished_files}/{len(self.file_contents)} 处理完成, 缓存命中率: {cache_ratio:.1f}%")
+
+        if self.file_callback:
+            if self.async_file_callback:
+                self.pending_files.append((file_idx, file_content))
+            else:
+                self.file_callback(file_idx, file_content)
+
+    async def adrain(self) -> None:
+        """依次等待排队的异步文件回调，回调等待期间只暂停当前协程，其他在途请求继续执行"""
+        while self.pending_files:
+            await self.file_callback(*self.pending_files.popleft())
+
+    def flush_cached(self) -> None:
+        """为命中缓存的chunk推进进度，并完成全部命中的文件"""
+        for file_idx, results in enumerate(self.file_results):
+            for _ in range(len(results) - self.remaining[file_idx]):
+                self._advance()
+            if self.remaining[file_idx] == 0:
+                self._finish_file(file_idx)
+
+    def record(self, file_idx: int, chunk_idx: int, result: str, failed: bool = False) -> None:
+        """
+        记录一个chunk的结果并分发给所有相同缓存键的槽位，文件全部完成时触发文件回调
+
+        Args:
+            file_idx: 文件序号
+            chunk_idx: chunk序号
+            result: 抽取结果
+            failed: 抽取是否失败，失败的chunk记入 failed_chunks
+        """
+        key = self.file_keys[file_idx][chunk_idx]
+        for slot_file_idx, slot_chunk_idx in self.waiters.pop(key, [(file_idx, chunk_idx)]):
+            self.file_results[slot_file_idx][slot_chunk_idx] = result
+            if failed:
+                self.failed_chunks[slot_file_idx].append(slot_chunk_idx)
+            self._advance()
+            self.remaining[slot_file_idx] -= 1
+            if self.remaining[slot_file_idx] == 0:
+                self._finish_file(slot_file_idx)
+
+    def print_summary(self, process_time: float) -> None:
+        print(f"所有chunks处理完成, 总耗时: {process_time:.2f}秒, "
+              f"平均每chunk: {process_time / max(self.total_chunks, 1):.2f}秒")
+        if self.reused:
+            print(f"跨文件重复chunk复用抽取结果 {self.reused} 次")
 
-from graph.core import retry, generate_hash
-from config.settings import MAX_WORKERS as DEFAULT_MAX_WORKERS, BATCH_SIZE as DEFAULT_BATCH_SIZE
 
 class EntityRelationExtractor:
     """
@@ -21,7 +167,8 @@ class EntityRelationExtractor:
     
     def __init__(self, llm, system_template, human_template, 
              entity_types: List[str], relationship_types: List[str],
-             cache_dir="./cache/graph", max_workers=4, batch_size=5):
+             cache_dir="./cache/graph", max_workers=4, batch_size=5,
+             output_mode: Optional[str] = None):
         """
         初始化实体关系提取器
         
@@ -34,6 +181,7 @@ class EntityRelationExtractor:
             cache_dir: 缓存目录
             max_workers: 并行工作线程数
             batch_size: 批处理大小
+            output_mode: 输出格式 text/structured，默认使用 EXTRACTION_OUTPUT_MODE
         """
         self.llm = llm
         self.entity_types = entity_types
@@ -57,170 +205,327 @@ class EntityRelationExtractor:
         
         # 创建处理链
         self.chain = self.chat_prompt | self.llm
+        # 流式链要求模型在流末尾返回token用量（ChatOpenAI 默认不返回），供LLM调度器做TPM限流
+        if hasattr(self.llm, "stream_usage"):
+            self.stream_chain = self.chat_prompt | self.llm.bind(stream_usage=True)
+        else:
+            self.stream_chain = self.chain
+        # 提示模板本身的token数，加上输入文本即为一次请求的预估输入token数
+        self.template_tokens = count_tokens("\n".join([
+            system_template, human_template, *entity_types, *relationship_types
+        ]))
+
+        # 结构化输出模式：模型直接返回符合JSON Schema的实体和关系，不再需要正则解析
+        self.output_mode = output_mode or EXTRACTION_OUTPUT_MODE
+        self.structured_chain = None
+        self.structured_batch_chain = None
+        if self.output_mode == "structured":
+            try:
+                self.structured_chain = self._build_structured_chain(EXTRACTION_SCHEMA)
+                self.structured_batch_chain = self._build_structured_chain(BATCH_EXTRACTION_SCHEMA)
+            except Exception as e:
+                print(f"当前模型不支持结构化输出，回退到文本协议: {e}")
+                self.output_mode = "text"
         
-        # 缓存设置
+        # 缓存设置：所有抽取结果保存在同一个SQLite文件中
         self.cache_dir = cache_dir
         self.enable_cache = True
-        
-        # 确保缓存目录存在
-        if not os.path.exists(cache_dir):
-            os.makedirs(cache_dir)
-        
+        self.cache = SQLiteCache(
+            os.path.join(cache_dir, "extraction_cache.sqlite"),
+            max_size_mb=EXTRACTION_CACHE_MAX_MB
+        )
+
+        # 提示词、模型和类型的指纹，任何一项变化都会使旧缓存失效
+        self.prompt_fingerprint = generate_hash(json.dumps({
+            "system_template": system_template,
+            "human_template": human_template,
+            "model": self._get_model_name(),
+            "entity_types": list(entity_types),
+            "relationship_types": list(relationship_types),
+            "delimiters": [self.tuple_delimiter, self.record_delimiter, self.completion_delimiter],
+            "max_records": EXTRACTION_MAX_RECORDS if EXTRACTION_STREAMING else 0,
+            "output_mode": self.output_mode,
+        }, ensure_ascii=False, sort_keys=True))
+
+        # 流式抽取配置与统计
+        self.streaming = EXTRACTION_STREAMING
+        self.max_records = EXTRACTION_MAX_RECORDS
+        self.stream_stats = {"chunks": 0, "first_record_time": 0.0, "truncated": 0, "malformed": 0}
+        self._stream_lock = threading.Lock()
+
+        # 最近一次抽取中失败的chunk：文件名 -> chunk序号列表，文件完成回调之前写入。
+        # 失败的chunk结果为空字符串，调用方不应把这些文件记录为已完成
+        self.failed_chunks: Dict[str, List[int]] = {}
+
         # 并行处理配置
         self.max_workers = max_workers or DEFAULT_MAX_WORKERS
         self.batch_size = batch_size or DEFAULT_BATCH_SIZE
-        
-        # 缓存统计
-        self.cache_hits = 0
-        self.cache_misses = 0
-        
-    def _generate_cache_key(self, text: str) -> str:
+
+    def _build_structured_chain(self, schema: Dict):
         """
-        生成文本的缓存键
-        
+        构建结构化输出的处理链
+
         Args:
-            text: 输入文本
-            
+            schema: 输出的JSON Schema
+
         Returns:
-            str: 缓存键
+            处理链，invoke 返回包含 raw、parsed、parsing_error 的字典
         """
-        return generate_hash(text)
-    
-    def _cache_path(self, cache_key: str) -> str:
+        prompt = self.chat_prompt + HumanMessagePromptTemplate.from_template(STRUCTURED_OUTPUT_INSTRUCTION)
+        structured_llm = self.llm.with_structured_output(
+            schema,
+            method=EXTRACTION_STRUCTURED_METHOD,
+            include_raw=True
+        )
+        return prompt | structured_llm
+
+    @property
+    def cache_hits(self) -> int:
+        """缓存命中次数"""
+        return self.cache.hits
+
+    @property
+    def cache_misses(self) -> int:
+        """缓存未命中次数"""
+        return self.cache.misses
+
+    def _get_model_name(self) -> str:
+        """获取LLM的模型名称，用于区分不同模型的缓存"""
+        for attr in ("model_name", "model", "model_id"):
+            value = getattr(self.llm, attr, None)
+            if isinstance(value, str) and value:
+                return value
+        return type(self.llm).__name__
+
+    def _generate_cache_key(self, text: str) -> str:
         """
-        获取缓存文件路径
-        
+        生成文本的缓存键
+
         Args:
-            cache_key: 缓存键
-            
+            text: 输入文本
+
         Returns:
-            str: 缓存文件路径
+            str: 缓存键，由提示词指纹和文本共同决定
         """
-        return os.path.join(self.cache_dir, f"{cache_key}.pkl")
-    
+        return generate_hash(self.prompt_fingerprint + text)
+
     def _save_to_cache(self, cache_key: str, result: str) -> None:
         """
         保存结果到缓存
-        
+
         Args:
             cache_key: 缓存键
             result: 结果
         """
-        if not self.enable_cache:
+        self._save_many_to_cache({cache_key: result})
+
+    def _save_many_to_cache(self, results: Dict[str, str]) -> None:
+        """
+        批量保存结果到缓存
+
+        Args:
+            results: 缓存键到结果的映射
+        """
+        if not self.enable_cache or not results:
             return
-            
-        cache_path = self._cache_path(cache_key)
+
         try:
-            with open(cache_path, 'wb') as f:
-                pickle.dump(result, f)
+            self.cache.put_many(results)
         except Exception as e:
             print(f"缓存保存错误: {e}")
-    
+
     def _load_from_cache(self, cache_key: str) -> Optional[str]:
         """
         从缓存加载结果
-        
+
         Args:
             cache_key: 缓存键
-            
+
         Returns:
             Optional[str]: 缓存的结果，如果不存在则返回None
         """
+        return self._load_many_from_cache([cache_key]).get(cache_key)
+
+    def _load_many_from_cache(self, cache_keys: List[str]) -> Dict[str, str]:
+        """
+        通过一次查询批量加载缓存结果
+
+        Args:
+            cache_keys: 缓存键列表
+
+        Returns:
+            Dict[str, str]: 命中的缓存键到结果的映射
+        """
         if not self.enable_cache:
-            return None
-            
-        cache_path = self._cache_path(cache_key)
-        if os.path.exists(cache_path):
-            try:
-                with open(cache_path, 'rb') as f:
-                    result = pickle.load(f)
-                    self.cache_hits += 1
-                    return result
-            except Exception as e:
-                print(f"缓存加载错误: {e}")
-        
-        self.cache_misses += 1
-        return None
-        
-    def process_chunks(self, file_contents: List[Tuple], progress_callback=None) -> List[Tuple]:
+            return {}
+
+        try:
+            return self.cache.get_many(cache_keys)
+        except Exception as e:
+            print(f"缓存加载错误: {e}")
+            return {}
+
+    def _prepare_corpus(self, file_contents: List[Tuple], progress_callback=None,
+                        file_callback=None, keep_results: bool = True) -> "_CorpusExtractionState":
+        """
+        预取整个语料的缓存并初始化结果槽位，供线程模式和异步模式共用
+
+        Args:
+            file_contents: 文件内容列表
+            progress_callback: 进度回调函数
+            file_callback: 文件完成回调函数
+            keep_results: 是否把结果追加到 file_contents 中返回
+
+        Returns:
+            _CorpusExtractionState: 语料抽取状态
+        """
+        file_keys = [
+            [self._generate_cache_key(''.join(chunk)) for chunk in file_content[2]]
+            for file_content in file_contents
+        ]
+        cached = self._load_many_from_cache([key for keys in file_keys for key in keys])
+        self.failed_chunks.clear()
+
+        state = _CorpusExtractionState(self, file_contents, file_keys, cached,
+                                       progress_callback, file_callback, keep_results)
+        # 完全命中缓存的文件直接完成
+        state.flush_cached()
+        return state
+
+    def process_chunks(self, file_contents: List[Tuple], progress_callback=None,
+                       file_callback=None, keep_results: bool = True) -> List[Tuple]:
         """
         并行处理所有文件的所有chunks
         
+        所有文件中未命中缓存的chunk进入同一个全局工作队列，由一个线程池持续消费，
+        避免在文件边界处线程空闲。结果按文件内原始顺序重新组装。
+        
         Args:
             file_contents: 文件内容列表
-            progress_callback: 进度回调函数
+            progress_callback: 进度回调函数，每完成一个chunk调用一次
+            file_callback: 文件完成回调函数，参数为(文件序号, file_content)，
+                           在该文件全部chunk完成后立即调用
+            keep_results: 为False时结果只交给 file_callback，不在返回的列表中累积
             
         Returns:
             List[Tuple]: 处理结果
         """
         t0 = time.time()
-        chunk_index = 0
-        total_chunks = sum(len(file_content[2]) for file_content in file_contents)
-        
-        # 使用多线程分配策略
-        for i, file_content in enumerate(file_contents):
-            chunks = file_content[2]
-            
-            # 预检查缓存命中率
-            cache_keys = [self._generate_cache_key(''.join(chunk)) for chunk in chunks]
-            cached_results = {key: self._load_from_cache(key) for key in cache_keys}
-            non_cached_indices = [idx for idx, key in enumerate(cache_keys) if cached_results[key] is None]
-            
-            if len(non_cached_indices) > 0:
-                # 只为未缓存的chunks创建任务
-                with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                    # 创建任务字典
-                    future_to_chunk = {
-                        executor.submit(self._process_single_chunk, ''.join(chunks[idx])): idx 
-                        for idx in non_cached_indices
-                    }
-                    
-                    # 处理完成的任务
-                    for future in concurrent.futures.as_completed(future_to_chunk):
-                        chunk_idx = future_to_chunk[future]
+        state = self._prepare_corpus(file_contents, progress_callback, file_callback, keep_results)
+        tasks = deque(state.pending_tasks())
+
+        # 全局工作队列：限制在途任务数量，保持线程池持续饱和
+        # 实际并发由LLM调度器自适应控制，线程池按其上限分配
+        if tasks:
+            pool_size = max(self.max_workers, llm_governor.max_concurrency)
+            max_in_flight = pool_size * 2
+            with concurrent.futures.ThreadPoolExecutor(max_workers=pool_size) as executor:
+                future_to_task = {}
+
+                def fill_queue():
+                    while tasks and len(future_to_task) < max_in_flight:
+                        file_idx, chunk_idx = tasks.popleft()
+                        future = executor.submit(
+                            self._extract_chunk,
+                            state.chunk_text(file_idx, chunk_idx),
+                            state.file_keys[file_idx][chunk_idx]
+                        )
+                        future_to_task[future] = (file_idx, chunk_idx)
+
+                fill_queue()
+                while future_to_task:
+                    done, _ = concurrent.futures.wait(
+                        list(future_to_task), return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    for future in done:
+                        file_idx, chunk_idx = future_to_task.pop(future)
+                        failed = False
                         try:
                             result = future.result()
-                            cached_results[cache_keys[chunk_idx]] = result
-                            
-                            # 更新进度
-                            if progress_callback:
-                                progress_callback(chunk_index)
-                            chunk_index += 1
-                            
                         except Exception as exc:
-                            print(f'Chunk {chunk_idx} 处理异常: {exc}')
-                            # 重试逻辑
-                            retry_count = 0
-                            while retry_count < 3:
-                                try:
-                                    print(f'尝试重试 Chunk {chunk_idx}, 第 {retry_count+1} 次')
-                                    result = self._process_single_chunk(''.join(chunks[chunk_idx]))
-                                    cached_results[cache_keys[chunk_idx]] = result
-                                    break
-                                except Exception as retry_exc:
-                                    print(f'重试失败: {retry_exc}')
-                                    retry_count += 1
-                                    time.sleep(1)  # 短暂延迟
-                            
-                            if cached_results[cache_keys[chunk_idx]] is None:
-                                cached_results[cache_keys[chunk_idx]] = ""
-            
-            # 整理结果，保持原始顺序
-            ordered_results = [cached_results[key] for key in cache_keys]
-            file_content.append(ordered_results)
-            
-            # 输出缓存统计
-            cache_ratio = self.cache_hits / (self.cache_hits + self.cache_misses) * 100 if (self.cache_hits + self.cache_misses) > 0 else 0
-            print(f"文件 {i+1}/{len(file_contents)} 处理完成, 缓存命中率: {cache_ratio:.1f}%")
-        
-        process_time = time.time() - t0
-        print(f"所有chunks处理完成, 总耗时: {process_time:.2f}秒, 平均每chunk: {process_time/total_chunks:.2f}秒")
+                            # 重试已由LLM调度器统一处理，这里不再重复重试
+                            print(f'文件 {file_idx} Chunk {chunk_idx} 处理异常: {exc}')
+                            result = ""
+                            failed = True
+
+                        state.record(file_idx, chunk_idx, result, failed)
+                    fill_queue()
+
+        state.print_summary(time.time() - t0)
+        return file_contents
+
+    async def aprocess_chunks(self, file_contents: List[Tuple], progress_callback=None,
+                              file_callback=None, max_concurrency: Optional[int] = None,
+                              keep_results: bool = True) -> List[Tuple]:
+        """
+        基于 chain.ainvoke 的异步抽取模式，结果与 process_chunks 完全一致
+
+        在途请求数由信号量限制，单个进程即可同时保持数百个请求。
+        外部取消（如 Ctrl+C 或 task.cancel()）会取消所有在途请求，已完成的结果保留在缓存中。
+
+        Args:
+            file_contents: 文件内容列表
+            progress_callback: 进度回调函数，每完成一个chunk调用一次
+            file_callback: 文件完成回调函数，参数为(文件序号, file_content)；
+                           可以是协程函数，回调在完成该文件的协程中等待，用于向下游施加背压
+            max_concurrency: 最大在途请求数
+            keep_results: 为False时结果只交给 file_callback，不在返回的列表中累积
+
+        Returns:
+            List[Tuple]: 处理结果
+        """
+        t0 = time.time()
+        state = self._prepare_corpus(file_contents, progress_callback, file_callback, keep_results)
+        await state.adrain()
+        tasks = deque(state.pending_tasks())
+        if not tasks:
+            state.print_summary(time.time() - t0)
+            return file_contents
+
+        concurrency = max_concurrency or ASYNC_MAX_CONCURRENCY
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def worker():
+            # 每个协程持续从全局队列取任务，协程数量不超过并发上限，避免为每个chunk创建任务
+            while tasks:
+                file_idx, chunk_idx = tasks.popleft()
+                failed = False
+                async with semaphore:
+                    try:
+                        result = await self._aextract_chunk(
+                            state.chunk_text(file_idx, chunk_idx),
+                            state.file_keys[file_idx][chunk_idx]
+                        )
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as exc:
+                        # 重试已由LLM调度器统一处理
+                        print(f'文件 {file_idx} Chunk {chunk_idx} 处理异常: {exc}')
+                        result = ""
+                        failed = True
+                state.record(file_idx, chunk_idx, result, failed)
+                await state.adrain()
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(tasks)))]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            # 任何一个协程失败或外部取消时，取消所有在途请求
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            raise
+
+        state.print_summary(time.time() - t0)
         return file_contents
     
     def process_chunks_batch(self, file_contents: List[Tuple], progress_callback=None) -> List[Tuple]:
         """
         批量处理chunks，减少LLM调用次数
         
+        按token预算将多个文本块装入同一次请求，每个文本块带有编号标记以便解析时对齐；
+        若返回结果与标记对不上，则对缺失部分二分重试，最坏情况下只需 O(log N) 次额外调用。
+        
         Args:
             file_contents: 文件内容列表
             progress_callback: 进度回调函数
@@ -228,110 +533,159 @@ class EntityRelationExtractor:
         Returns:
             List[Tuple]: 处理结果
         """
+        chunk_index = 0
+        self.failed_chunks.clear()
         for file_content in file_contents:
-            chunks = file_content[2]
-            results = []
-            
-            # 智能动态批处理大小
-            chunk_lengths = [len(''.join(chunk)) for chunk in chunks]
-            avg_chunk_size = sum(chunk_lengths) / len(chunk_lengths) if chunk_lengths else 0
-            
-            # 根据平均chunk大小动态调整批处理大小
-            dynamic_batch_size = max(1, min(self.batch_size, int(10000 / (avg_chunk_size + 1))))
-            
-            # 按批次处理
-            for i in range(0, len(chunks), dynamic_batch_size):
-                batch_chunks = chunks[i:i+dynamic_batch_size]
-                
-                # 缓存检查
-                batch_keys = [self._generate_cache_key(''.join(chunk)) for chunk in batch_chunks]
-                cached_batch_results = [self._load_from_cache(key) for key in batch_keys]
-                
-                # 如果所有结果都已缓存，则跳过LLM调用
-                if None not in cached_batch_results:
-                    results.extend(cached_batch_results)
+            texts = [''.join(chunk) for chunk in file_content[2]]
+            keys = [self._generate_cache_key(text) for text in texts]
+
+            # 一次查询预取整个文件的缓存
+            file_cache = self._load_many_from_cache(keys)
+            results = [file_cache.get(key) for key in keys]
+            pending = [i for i, result in enumerate(results) if result is None]
+
+            if progress_callback:
+                for _ in range(len(texts) - len(pending)):
+                    progress_callback(chunk_index)
+                    chunk_index += 1
+
+            # 按token预算装箱后逐批处理
+            token_counts = {i: count_tokens(texts[i]) for i in pending}
+            for batch in self._pack_batches(pending, token_counts):
+                batch_results = self._extract_batch(batch, texts, keys)
+                for i in batch:
+                    if i not in batch_results:
+                        self.failed_chunks.setdefault(file_content[0], []).append(i)
+                    results[i] = batch_results.get(i, "")
                     if progress_callback:
-                        for j in range(len(batch_chunks)):
-                            progress_callback(i + j)
-                    continue
-                
-                # 准备批处理输入
-                batch_inputs = []
-                for chunk in batch_chunks:
-                    batch_inputs.append(''.join(chunk))
-                
-                # 使用分隔符合并多个文本块
-                batch_text = f"\n{'-'*50}\n".join(batch_inputs)
-                
-                try:
-                    # 使用原始提示模板处理批量输入
-                    batch_response = self.chain.invoke({
-                        "chat_history": self.chat_history,
-                        "entity_types": self.entity_types,
-                        "relationship_types": self.relationship_types,
-                        "tuple_delimiter": self.tuple_delimiter,
-                        "record_delimiter": self.record_delimiter,
-                        "completion_delimiter": self.completion_delimiter,
-                        "input_text": batch_text
-                    })
-                    
-                    # 解析批量响应
-                    batch_results = self._parse_batch_response(batch_response.content)
-                    
-                    # 处理结果数量不匹配的情况
-                    if len(batch_results) != len(batch_chunks):
-                        # 如果无法正确解析批处理响应，则单独处理每个chunk
-                        # print(f"批处理结果数量不匹配 (期望 {len(batch_chunks)}, 实际 {len(batch_results)}), 将单独处理每个chunk")
-                        batch_results = []
-                        for idx, chunk in enumerate(batch_chunks):
-                            # 检查缓存
-                            cached_result = cached_batch_results[idx]
-                            if cached_result is not None:
-                                batch_results.append(cached_result)
-                            else:
-                                individual_result = self._process_single_chunk(''.join(chunk))
-                                batch_results.append(individual_result)
-                    else:
-                        # 缓存批处理结果
-                        for idx, result in enumerate(batch_results):
-                            if cached_batch_results[idx] is None:  # 只缓存未命中的结果
-                                self._save_to_cache(batch_keys[idx], result)
-                    
-                    results.extend(batch_results)
-                except Exception as e:
-                    print(f"批处理错误，切换到单个处理: {e}")
-                    for idx, chunk in enumerate(batch_chunks):
-                        try:
-                            individual_result = self._process_single_chunk(''.join(chunk))
-                            results.append(individual_result)
-                        except Exception as e2:
-                            print(f"单个chunk处理失败: {e2}")
-                            results.append("")
-                
-                # 更新进度
-                if progress_callback:
-                    for j in range(len(batch_chunks)):
-                        progress_callback(i + j)
-            
+                        progress_callback(chunk_index)
+                        chunk_index += 1
+
             file_content.append(results)
         
         return file_contents
 
-    def _parse_batch_response(self, batch_content: str) -> List[str]:
+    def _pack_batches(self, indices: List[int], token_counts: Dict[int, int]) -> List[List[int]]:
         """
-        解析批量响应，将其分割为单独的结果
+        首次适应(First-Fit)装箱：在输入和预估输出token预算内，把文本块放入第一个能容纳它的批次
+        
+        Args:
+            indices: 待处理的chunk序号
+            token_counts: chunk序号到token数的映射
+            
+        Returns:
+            List[List[int]]: 批次列表，每个批次为chunk序号列表
+        """
+        batches = []  # [输入token数, 预估输出token数, chunk序号列表]
+        for i in indices:
+            prompt_tokens = token_counts[i]
+            completion_tokens = int(prompt_tokens * LLM_BATCH_COMPLETION_RATIO)
+            for batch in batches:
+                if (len(batch[2]) < self.batch_size
+                        and batch[0] + prompt_tokens <= LLM_BATCH_PROMPT_TOKENS
+                        and batch[1] + completion_tokens <= LLM_BATCH_COMPLETION_TOKENS):
+                    batch[0] += prompt_tokens
+                    batch[1] += completion_tokens
+                    batch[2].append(i)
+                    break
+            else:
+                # 超出预算的单个chunk也会独占一个批次
+                batches.append([prompt_tokens, completion_tokens, [i]])
+        return [sorted(batch[2]) for batch in batches]
+
+    def _extract_batch(self, indices: List[int], texts: List[str], keys: List[str]) -> Dict[int, str]:
+        """
+        用一次LLM调用抽取一批文本块，解析失败的部分按二分法拆开重试
+        
+        Args:
+            indices: 本批次的chunk序号
+            texts: 文件内所有chunk文本
+            keys: 文件内所有chunk的缓存键
+            
+        Returns:
+            Dict[int, str]: chunk序号到抽取结果的映射，最终失败的chunk不在结果中
+        """
+        if len(indices) == 1:
+            i = indices[0]
+            try:
+                return {i: self._extract_chunk(texts[i], keys[i])}
+            except Exception as e:
+                print(f"单个chunk处理失败: {e}")
+                return {}
+
+        parsed = {}
+        try:
+            batch_text = self._format_batch_input([texts[i] for i in indices])
+            if self.structured_batch_chain is not None:
+                response = llm_governor.call(self.structured_batch_chain.invoke, self._chain_inputs(batch_text),
+                                             est_tokens=self._estimate_tokens(batch_text))
+                parsed = split_batch_extraction(unwrap_structured_response(response), len(indices))
+            else:
+                response = llm_governor.call(self.chain.invoke, self._chain_inputs(batch_text),
+                                             est_tokens=self._estimate_tokens(batch_text))
+                parsed = self._parse_batch_response(response.content, len(indices))
+        except Exception as e:
+            print(f"批处理错误: {e}")
+
+        results = {indices[pos]: result for pos, result in parsed.items()}
+        self._save_many_to_cache({keys[i]: result for i, result in results.items()})
+
+        missing = [i for i in indices if i not in results]
+        if not missing:
+            return results
+
+        if len(missing) < len(indices):
+            # 只对未对齐的部分重新发起请求
+            results.update(self._extract_batch(missing, texts, keys))
+        else:
+            # 整批失败时二分拆开
+            mid = len(indices) // 2
+            results.update(self._extract_batch(indices[:mid], texts, keys))
+            results.update(self._extract_batch(indices[mid:], texts, keys))
+        return results
+
+    def _format_batch_input(self, batch_texts: List[str]) -> str:
+        """
+        为批量输入中的每个文本块加上编号标记
+        
+        Args:
+            batch_texts: 文本块列表
+            
+        Returns:
+            str: 合并后的输入文本
+        """
+        parts = [
+            f"以下共有 {len(batch_texts)} 个相互独立的文本块，每个文本块以 <<<CHUNK 编号>>> 开头。"
+            f"请分别处理每个文本块，输出时先单独一行写出对应的 <<<CHUNK 编号>>>，再给出该文本块的结果。"
+        ]
+        for pos, text in enumerate(batch_texts, 1):
+            parts.append(f"<<<CHUNK {pos}>>>\n{text}")
+        return "\n\n".join(parts)
+
+    def _parse_batch_response(self, batch_content: str, expected: int) -> Dict[int, str]:
+        """
+        按编号标记解析批量响应
         
         Args:
             batch_content: 批处理响应内容
+            expected: 本批次的文本块数量
             
         Returns:
-            List[str]: 分割后的结果列表
+            Dict[int, str]: 批内位置(从0开始)到结果的映射，缺失或重复的编号不会出现在结果中
         """
-        # 使用分隔符分割响应
-        parts = batch_content.split(f"\n{'-'*50}\n")
-        return [part.strip() for part in parts]
+        parts = _CHUNK_MARKER.split(batch_content)
+        results = {}
+        seen = set()
+        # split 结果形如 [前导文本, 编号1, 内容1, 编号2, 内容2, ...]
+        for number, content in zip(parts[1::2], parts[2::2]):
+            pos = int(number) - 1
+            if pos in seen or not 0 <= pos < expected:
+                results.pop(pos, None)
+                continue
+            seen.add(pos)
+            results[pos] = content.strip()
+        return results
     
-    @retry(times=3, exceptions=(Exception,), delay=1.0)
     def _process_single_chunk(self, input_text: str) -> str:
         """
         处理单个文本块（带缓存）
@@ -350,8 +704,164 @@ class EntityRelationExtractor:
         if cached_result:
             return cached_result
         
-        # 未缓存，调用LLM处理
-        response = self.chain.invoke({
+        return self._extract_chunk(input_text, cache_key)
+
+    def _extract_chunk(self, input_text: str, cache_key: str) -> str:
+        """
+        调用LLM抽取单个文本块并写入缓存（调用方已确认缓存未命中）
+        限流、退避重试和熔断由LLM调度器统一处理
+        
+        Args:
+            input_text: 输入文本
+            cache_key: 缓存键
+            
+        Returns:
+            str: 处理结果
+        """
+        est_tokens = self._estimate_tokens(input_text)
+        if self.structured_chain is not None:
+            response = llm_governor.call(self.structured_chain.invoke, self._chain_inputs(input_text),
+                                         est_tokens=est_tokens)
+            result = dump_extraction(unwrap_structured_response(response))
+        elif self.streaming:
+            result = llm_governor.call(self._stream_chunk, input_text, est_tokens=est_tokens).content
+        else:
+            response = llm_governor.call(self.chain.invoke, self._chain_inputs(input_text), est_tokens=est_tokens)
+            result = response.content
+
+        # 保存结果到缓存
+        self._save_to_cache(cache_key, result)
+
+        return result
+
+    async def _aextract_chunk(self, input_text: str, cache_key: str) -> str:
+        """
+        _extract_chunk 的异步版本，基于 chain.ainvoke
+
+        Args:
+            input_text: 输入文本
+            cache_key: 缓存键
+
+        Returns:
+            str: 处理结果
+        """
+        est_tokens = self._estimate_tokens(input_text)
+        if self.structured_chain is not None:
+            response = await llm_governor.acall(self.structured_chain.ainvoke, self._chain_inputs(input_text),
+                                                est_tokens=est_tokens)
+            result = dump_extraction(unwrap_structured_response(response))
+        elif self.streaming:
+            result = (await llm_governor.acall(self._astream_chunk, input_text, est_tokens=est_tokens)).content
+        else:
+            response = await llm_governor.acall(self.chain.ainvoke, self._chain_inputs(input_text),
+                                                est_tokens=est_tokens)
+            result = response.content
+        self._save_to_cache(cache_key, result)
+        return result
+
+    def _new_tuple_parser(self) -> ExtractionTupleParser:
+        return ExtractionTupleParser(self.tuple_delimiter, self.record_delimiter, self.max_records)
+
+    def _record_stream_stats(self, parser: ExtractionTupleParser, first_record_time: Optional[float]) -> None:
+        with self._stream_lock:
+            self.stream_stats["chunks"] += 1
+            self.stream_stats["first_record_time"] += first_record_time or 0.0
+            self.stream_stats["truncated"] += int(parser.done)
+            self.stream_stats["malformed"] += parser.malformed
+
+    def _stream_chunk(self, input_text: str) -> AIMessage:
+        """
+        流式调用LLM并增量解析，达到记录上限时关闭流以提前结束生成
+
+        Args:
+            input_text: 输入文本
+
+        Returns:
+            AIMessage: 内容为已接收部分的原始文本（截断在最后一条完整记录之后），
+                usage_metadata 为各片段的token用量之和（提前结束或模型未返回时为None）
+        """
+        parser = self._new_tuple_parser()
+        start = time.time()
+        first_record_time = None
+        usage = None
+        stream = self.stream_chain.stream(self._chain_inputs(input_text))
+        try:
+            for piece in stream:
+                if piece.usage_metadata:
+                    usage = add_usage(usage, piece.usage_metadata)
+                if parser.feed(piece.content) and first_record_time is None:
+                    first_record_time = time.time() - start
+                if parser.done:
+                    break
+            else:
+                parser.close()
+        finally:
+            stream.close()
+        self._record_stream_stats(parser, first_record_time)
+        return AIMessage(content=parser.text, usage_metadata=usage)
+
+    async def _astream_chunk(self, input_text: str) -> AIMessage:
+        """
+        _stream_chunk 的异步版本，基于 chain.astream
+
+        Args:
+            input_text: 输入文本
+
+        Returns:
+            AIMessage: 已接收部分的原始文本及token用量
+        """
+        parser = self._new_tuple_parser()
+        start = time.time()
+        first_record_time = None
+        usage = None
+        stream = self.stream_chain.astream(self._chain_inputs(input_text))
+        try:
+            async for piece in stream:
+                if piece.usage_metadata:
+                    usage = add_usage(usage, piece.usage_metadata)
+                if parser.feed(piece.content) and first_record_time is None:
+                    first_record_time = time.time() - start
+                if parser.done:
+                    break
+            else:
+                parser.close()
+        finally:
+            await stream.aclose()
+        self._record_stream_stats(parser, first_record_time)
+        return AIMessage(content=parser.text, usage_metadata=usage)
+
+    def print_stream_stats(self) -> None:
+        """打印流式抽取统计"""
+        stats = self.stream_stats
+        if not stats["chunks"]:
+            return
+        print(f"流式抽取: {stats['chunks']} 个文本块, 平均首条记录耗时 "
+              f"{stats['first_record_time'] / stats['chunks']:.2f}秒, "
+              f"达到记录上限提前结束 {stats['truncated']} 次, 格式错误记录 {stats['malformed']} 条")
+
+    def _estimate_tokens(self, input_text: str) -> int:
+        """
+        预估一次抽取请求的输入token数，供LLM调度器在请求前做TPM限流，响应返回后按实际用量修正
+
+        Args:
+            input_text: 输入文本
+
+        Returns:
+            int: 提示模板与输入文本的token数之和
+        """
+        return self.template_tokens + count_tokens(input_text)
+
+    def _chain_inputs(self, input_text: str) -> Dict:
+        """
+        构建抽取链的输入参数
+
+        Args:
+            input_text: 输入文本
+
+        Returns:
+            Dict: 提示模板所需的全部变量
+        """
+        return {
             "chat_history": self.chat_history,
             "entity_types": self.entity_types,
             "relationship_types": self.relationship_types,
@@ -359,14 +869,7 @@ class EntityRelationExtractor:
             "record_delimiter": self.record_delimiter,
             "completion_delimiter": self.completion_delimiter,
             "input_text": input_text
-        })
-        
-        result = response.content
-        
-        # 保存结果到缓存
-        self._save_to_cache(cache_key, result)
-        
-        return result
+        }
     
     def stream_process_large_files(self, file_path: str, chunk_size: int = 5000, 
                                    structure_builder=None, graph_writer=None) -> None:
@@ -438,11 +941,7 @@ class EntityRelationExtractor:
                         )
                         
                         if len(graph_document.nodes) > 0 or len(graph_document.relationships) > 0:
-                            graph_writer.graph.add_graph_documents(
-                                [graph_document],
-                                baseEntityLabel=True,
-                                include_source=True
-                            )
+                            graph_writer.bulk_writer.write([graph_document])
                     except Exception as e:
                         print(f"处理缓存结果时出错: {e}")
                 else:
@@ -464,11 +963,7 @@ class EntityRelationExtractor:
                     )
                     
                     if len(graph_document.nodes) > 0 or len(graph_document.relationships) > 0:
-                        graph_writer.graph.add_graph_documents(
-                            [graph_document],
-                            baseEntityLabel=True,
-                            include_source=True
-                        )
+                        graph_writer.bulk_writer.write([graph_document])
                         
                 except Exception as exc:
                     print(f"处理chunk {chunk_data['chunk_id']} 时发生错误: {exc}")
\ No newline at end of file
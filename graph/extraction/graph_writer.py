@@ -4,8 +4,10 @@ from typing import List, Set
 from langchain_community.graphs import Neo4jGraph
 from langchain_core.documents import Document
 from langchain_community.graphs.graph_document import GraphDocument, Node, Relationship
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from graph.core import connection_manager
+from graph.extraction.bulk_writer import BulkGraphWriter
+from graph.structure.columnar_store import ChunkGraph
 from config.settings import BATCH_SIZE as DEFAULT_BATCH_SIZE, MAX_WORKERS as DEFAULT_MAX_WORKERS
 
 class GraphWriter:
@@ -33,6 +35,9 @@ class GraphWriter:
         # 用于跟踪已经处理的节点，减少重复操作
         self.processed_nodes: Set[str] = set()
 
+        # 原生批量写入器，按标签/类型分组的UNWIND语句直接写入Chunk与实体的MENTIONS关系
+        self.bulk_writer = BulkGraphWriter()
+
 
     def convert_to_graph_document(self, chunk_id: str, input_text: str,
                                   structured_chunk_data: Dict[str, Any]) -> GraphDocument:
@@ -42,11 +47,14 @@ class GraphWriter:
         Args:
             chunk_id: 文本块ID
             input_text: 输入文本
-            structured_chunk_data: 包含'nodes'和'relationships'的字典
+            structured_chunk_data: 列式存储的 ChunkGraph，或包含'nodes'和'relationships'的字典
 
         Returns:
             GraphDocument: 转换后的图文档对象
         """
+        if isinstance(structured_chunk_data, ChunkGraph):
+            return self._convert_chunk_graph(chunk_id, input_text, structured_chunk_data)
+
         nodes = {}
         relationships = []
 
@@ -95,7 +103,61 @@ class GraphWriter:
             source=Document(page_content=input_text, metadata={"chunk_id": chunk_id})
         )
 
-    def process_and_write_graph_documents(self, file_contents: List) -> None:
+    def _convert_chunk_graph(self, chunk_id: str, input_text: str, chunk_graph: ChunkGraph) -> GraphDocument:
+        """
+        将列式存储的 ChunkGraph 转换为GraphDocument对象，节点属性只在这里展开为字典
+
+        Args:
+            chunk_id: 文本块ID
+            input_text: 输入文本
+            chunk_graph: 剪枝后的chunk结构化数据
+
+        Returns:
+            GraphDocument: 转换后的图文档对象
+        """
+        nodes = {}
+        relationships = []
+
+        try:
+            for node_id, properties in chunk_graph.node_items():
+                if node_id not in self.node_cache:
+                    self.node_cache[node_id] = Node(
+                        id=node_id,
+                        type=properties.get("type", "未知"),
+                        properties=properties
+                    )
+                nodes[node_id] = self.node_cache[node_id]
+
+            for rel_data in chunk_graph.relationships():
+                source_id = rel_data["head"]
+                target_id = rel_data["tail"]
+                if source_id in nodes and target_id in nodes:
+                    relationships.append(
+                        Relationship(
+                            source=nodes[source_id],
+                            target=nodes[target_id],
+                            type=rel_data["relation"],
+                            properties={
+                                "description": rel_data["description"],
+                                "weight": rel_data["weight"]
+                            }
+                        )
+                    )
+
+        except Exception as e:
+            print(f"转换GraphDocument时出错 (Chunk ID: {chunk_id}): {e}")
+            return GraphDocument(nodes=[], relationships=[], source=Document(page_content=input_text,
+                                                                             metadata={"chunk_id": chunk_id,
+                                                                                       "error": str(e)}))
+
+        return GraphDocument(
+            nodes=list(nodes.values()),
+            relationships=relationships,
+            source=Document(page_content=input_text, metadata={"chunk_id": chunk_id})
+        )
+
+    def process_and_write_graph_documents(self, file_contents: List,
+                                          structure_statements: Optional[List[Tuple[str, Dict]]] = None) -> bool:
         """
         处理并写入所有文件的GraphDocument对象。
         此版本已更新，以处理预解析和剪枝后的结构化数据。
@@ -103,9 +165,13 @@ class GraphWriter:
         Args:
             file_contents: 文件内容列表。
                            其中 file_content[4] 现在是稀疏化的 structured_data 列表。
+            structure_statements: 文档和Chunk结构的写入语句，与第一批实体在同一事务中提交
+
+        Returns:
+            bool: 所有chunk都转换成功且文档结构和所有批次都已提交时为True；
+                  出错时只打印错误并返回False，调用方据此决定是否记录为已写入
         """
         all_graph_documents = []
-        all_chunk_ids = []
 
         # 预计算总chunks数，用于预分配列表
         total_chunks = 0
@@ -115,10 +181,10 @@ class GraphWriter:
                 total_chunks += len(file_content[3])
 
         all_graph_documents = [None] * total_chunks
-        all_chunk_ids = [None] * total_chunks
 
         chunk_index = 0
         error_count = 0
+        skipped_files = 0
 
         print(f"开始转换并写入 {total_chunks} 个 chunks 的稀疏图数据...")
 
@@ -137,6 +203,7 @@ class GraphWriter:
                 # 确保数据对齐
                 if len(chunks_with_hash) != len(sparse_structured_data):
                     print(f"警告: 文件 {file_content[0]} 的 chunk 数量和结构化数据数量不匹配。")
+                    skipped_files += 1
                     continue
 
                 for i, (chunk_meta, structured_chunk) in enumerate(zip(chunks_with_hash, sparse_structured_data)):
@@ -157,119 +224,74 @@ class GraphWriter:
                     graph_document = future.result()
                     if graph_document and (graph_document.nodes or graph_document.relationships):
                         all_graph_documents[idx] = graph_document
-                        all_chunk_ids[idx] = graph_document.source.metadata.get("chunk_id")
                     else:
                         all_graph_documents[idx] = None
-                        all_chunk_ids[idx] = None
                 except Exception as e:
                     error_count += 1
                     print(f"处理chunk时出错 (已有{error_count}个错误): {e}")
                     all_graph_documents[idx] = None
-                    all_chunk_ids[idx] = None
 
         # 后续处理逻辑也完全保持不变
         all_graph_documents = [doc for doc in all_graph_documents if doc is not None]
-        all_chunk_ids = [id for id in all_chunk_ids if id is not None]
 
         print(f"共转换 {len(all_graph_documents)} 个有效的 GraphDocument，处理期间有 {error_count} 个错误。")
 
-        self._batch_write_graph_documents(all_graph_documents)
-
-        if all_chunk_ids:
-            self.merge_chunk_relationships(all_chunk_ids)
+        written = self._batch_write_graph_documents(all_graph_documents, structure_statements)
+        return written and error_count == 0 and skipped_files == 0
     
-    def _batch_write_graph_documents(self, documents: List[GraphDocument]) -> None:
+    def _batch_write_graph_documents(self, documents: List[GraphDocument],
+                                     structure_statements: Optional[List[Tuple[str, Dict]]] = None) -> bool:
         """
         批量写入图文档
         
         Args:
             documents: 图文档列表
+            structure_statements: 文档和Chunk结构的写入语句，放在第一批的事务中执行
+
+        Returns:
+            bool: 文档结构和所有文档都已提交时为True
         """
+        structure_statements = list(structure_statements or [])
         if not documents:
-            return
+            # 没有实体时只写入文档结构
+            if structure_statements:
+                return self._write_structure(structure_statements)
+            return True
             
         # 增加批处理大小的动态调整
         optimal_batch_size = min(self.batch_size, max(10, len(documents) // 10))
         total_batches = (len(documents) + optimal_batch_size - 1) // optimal_batch_size
         
         print(f"开始批量写入 {len(documents)} 个文档，批次大小: {optimal_batch_size}, 总批次: {total_batches}")
+        written = True
         
-        # 批量写入图文档
+        # 批量写入图文档：每批一个事务，实体、关系和 Chunk-[:MENTIONS]->实体 一起提交
         for i in range(0, len(documents), optimal_batch_size):
             batch = documents[i:i+optimal_batch_size]
             if batch:
+                # 文档结构只随第一批提交，MENTIONS 依赖其中的Chunk节点
+                leading, structure_statements = structure_statements, []
                 try:
-                    self.graph.add_graph_documents(
-                        batch,
-                        baseEntityLabel=True,
-                        include_source=True
-                    )
+                    self.bulk_writer.write(batch, leading)
                     print(f"已写入批次 {i//optimal_batch_size + 1}/{total_batches}")
                 except Exception as e:
                     print(f"写入图文档批次时出错: {e}")
+                    if leading and not self._write_structure(leading):
+                        written = False
                     # 如果批次写入失败，尝试逐个写入以避免整批失败
                     for doc in batch:
                         try:
-                            self.graph.add_graph_documents(
-                                [doc],
-                                baseEntityLabel=True,
-                                include_source=True
-                            )
+                            self.bulk_writer.write([doc])
                         except Exception as e2:
+                            written = False
                             print(f"单个文档写入失败: {e2}")
-    
-    def merge_chunk_relationships(self, chunk_ids: List[str]) -> None:
-        """
-        合并Chunk节点与Document节点的关系
-        
-        Args:
-            chunk_ids: 块ID列表
-        """
-        if not chunk_ids:
-            return
-        
-        # 去除重复的chunk_id以减少操作数量
-        unique_chunk_ids = list(set(chunk_ids))
-        print(f"开始合并 {len(unique_chunk_ids)} 个唯一chunk关系")
-            
-        # 动态批处理大小
-        optimal_batch_size = min(self.batch_size, max(20, len(unique_chunk_ids) // 5))
-        total_batches = (len(unique_chunk_ids) + optimal_batch_size - 1) // optimal_batch_size
-        
-        print(f"合并关系批次大小: {optimal_batch_size}, 总批次: {total_batches}")
-        
-        # 分批处理，避免一次性处理过多数据
-        for i in range(0, len(unique_chunk_ids), optimal_batch_size):
-            batch_chunk_ids = unique_chunk_ids[i:i+optimal_batch_size]
-            batch_data = [{"chunk_id": chunk_id} for chunk_id in batch_chunk_ids]
-            
-            try:
-                # 使用原始的查询，确保兼容性
-                merge_query = """
-                    UNWIND $batch_data AS data
-                    MATCH (c:`__Chunk__` {id: data.chunk_id}), (d:Document{chunk_id:data.chunk_id})
-                    WITH c, d
-                    MATCH (d)-[r:MENTIONS]->(e)
-                    MERGE (c)-[newR:MENTIONS]->(e)
-                    ON CREATE SET newR += properties(r)
-                    DETACH DELETE d
-                """
-                
-                self.graph.query(merge_query, params={"batch_data": batch_data})
-                print(f"已处理合并关系批次 {i//optimal_batch_size + 1}/{total_batches}")
-            except Exception as e:
-                print(f"合并关系批次时出错: {e}")
-                # 如果批处理失败，尝试逐个处理
-                for chunk_id in batch_chunk_ids:
-                    try:
-                        single_query = """
-                            MATCH (c:`__Chunk__` {id: $chunk_id}), (d:Document{chunk_id:$chunk_id})
-                            WITH c, d
-                            MATCH (d)-[r:MENTIONS]->(e)
-                            MERGE (c)-[newR:MENTIONS]->(e)
-                            ON CREATE SET newR += properties(r)
-                            DETACH DELETE d
-                        """
-                        self.graph.query(single_query, params={"chunk_id": chunk_id})
-                    except Exception as e2:
-                        print(f"处理单个chunk关系时出错: {e2}")
\ No newline at end of file
+        return written
+
+    def _write_structure(self, structure_statements: List[Tuple[str, Dict]]) -> bool:
+        """单独写入文档结构，失败时只打印错误并返回False"""
+        try:
+            self.bulk_writer.connection.execute_write_batch(structure_statements)
+            return True
+        except Exception as e:
+            print(f"写入文档结构时出错: {e}")
+            return False
@@ -0,0 +1,177 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# 结构化输出模式下追加在提示词末尾的说明，替代文本协议中的元组格式要求
+STRUCTURED_OUTPUT_INSTRUCTION = (
+    "请忽略上文中关于元组格式、分隔符和结束标记的要求，"
+    "直接通过提供的结构化输出格式返回识别出的所有实体和关系。"
+)
+
+_ENTITY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string", "description": "实体名称"},
+        "type": {"type": "string", "description": "实体类型，必须是给定的实体类型之一"},
+        "description": {"type": "string", "description": "实体描述"},
+    },
+    "required": ["name", "type", "description"],
+}
+
+_RELATIONSHIP_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "source": {"type": "string", "description": "源实体名称"},
+        "relation": {"type": "string", "description": "关系类型，必须是给定的关系类型之一"},
+        "target": {"type": "string", "description": "目标实体名称"},
+        "description": {"type": "string", "description": "关系描述"},
+        "weight": {"type": "number", "description": "关系强度，1到10之间"},
+    },
+    "required": ["source", "relation", "target", "description", "weight"],
+}
+
+# 单个文本块的抽取结果
+EXTRACTION_SCHEMA = {
+    "title": "extract_entities_and_relationships",
+    "description": "从文本中抽取的实体和关系",
+    "type": "object",
+    "properties": {
+        "entities": {"type": "array", "items": _ENTITY_SCHEMA},
+        "relationships": {"type": "array", "items": _RELATIONSHIP_SCHEMA},
+    },
+    "required": ["entities", "relationships"],
+}
+
+# 批量抽取结果：每个文本块的结果带有其编号
+BATCH_EXTRACTION_SCHEMA = {
+    "title": "extract_entities_and_relationships_batch",
+    "description": "按文本块编号分别给出的实体和关系",
+    "type": "object",
+    "properties": {
+        "chunks": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "chunk": {"type": "integer", "description": "文本块编号，与 <<<CHUNK 编号>>> 一致"},
+                    "entities": {"type": "array", "items": _ENTITY_SCHEMA},
+                    "relationships": {"type": "array", "items": _RELATIONSHIP_SCHEMA},
+                },
+                "required": ["chunk", "entities", "relationships"],
+            },
+        },
+    },
+    "required": ["chunks"],
+}
+
+
+def unwrap_structured_response(response: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    取出 with_structured_output(include_raw=True) 返回的解析结果
+
+    Args:
+        response: 包含 raw、parsed、parsing_error 的字典
+
+    Returns:
+        Dict[str, Any]: 解析后的结构化数据，解析失败时抛出 ValueError
+    """
+    if response.get("parsing_error") is not None or not isinstance(response.get("parsed"), dict):
+        raise ValueError(f"结构化输出解析失败: {response.get('parsing_error')}")
+    return response["parsed"]
+
+
+def dump_extraction(data: Dict[str, Any]) -> str:
+    """
+    将单个文本块的结构化结果序列化为缓存字符串
+
+    Args:
+        data: 包含 entities 和 relationships 的字典
+
+    Returns:
+        str: JSON字符串
+    """
+    return json.dumps({
+        "entities": data.get("entities") or [],
+        "relationships": data.get("relationships") or [],
+    }, ensure_ascii=False)
+
+
+def split_batch_extraction(data: Dict[str, Any], expected: int) -> Dict[int, str]:
+    """
+    按编号拆分批量结构化结果
+
+    Args:
+        data: 包含 chunks 的字典
+        expected: 本批次的文本块数量
+
+    Returns:
+        Dict[int, str]: 批内位置(从0开始)到JSON字符串的映射，缺失或重复的编号不会出现在结果中
+    """
+    results = {}
+    seen = set()
+    for item in data.get("chunks") or []:
+        try:
+            pos = int(item.get("chunk")) - 1
+        except (TypeError, ValueError):
+            continue
+        if pos in seen or not 0 <= pos < expected:
+            results.pop(pos, None)
+            continue
+        seen.add(pos)
+        results[pos] = dump_extraction(item)
+    return results
+
+
+def load_extraction(raw_text: str) -> Optional[Dict[str, Any]]:
+    """
+    尝试将缓存字符串解析为结构化结果
+
+    Args:
+        raw_text: 缓存中的抽取结果
+
+    Returns:
+        Optional[Dict[str, Any]]: 结构化模式的结果；文本协议结果返回None
+    """
+    if not raw_text or not raw_text.lstrip().startswith("{"):
+        return None
+    try:
+        data = json.loads(raw_text)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) and "entities" in data else None
+
+
+def records_from_extraction(data: Dict[str, Any]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    将结构化结果转换为与文本协议解析器相同格式的记录
+
+    Args:
+        data: 包含 entities 和 relationships 的字典
+
+    Returns:
+        Tuple[List[Dict], List[Dict]]: (记录列表, 字段缺失或类型错误而跳过的条目)
+    """
+    records = []
+    invalid = []
+    for entity in data.get("entities") or []:
+        try:
+            records.append({
+                "kind": "entity",
+                "name": str(entity["name"]),
+                "type": str(entity["type"]),
+                "description": str(entity.get("description", "")),
+            })
+        except (KeyError, TypeError):
+            invalid.append(entity)
+    for rel in data.get("relationships") or []:
+        try:
+            records.append({
+                "kind": "relationship",
+                "source": str(rel["source"]),
+                "relation": str(rel["relation"]),
+                "target": str(rel["target"]),
+                "description": str(rel.get("description", "")),
+                "weight": float(rel.get("weight", 1.0)),
+            })
+        except (KeyError, TypeError, ValueError):
+            invalid.append(rel)
+    return records, invalid
@@ -0,0 +1,156 @@
+import re
+from typing import Dict, List
+
+from graph.extraction.structured_output import load_extraction, records_from_extraction
+
+
+class ExtractionTupleParser:
+    """
+    抽取结果的增量解析器
+
+    LLM按记录输出 ("entity" : ...) 和 ("relationship" : ...) 元组，记录之间以记录分隔符隔开。
+    解析器逐段接收流式输出，每遇到一个记录分隔符就解析出完整的记录，
+    格式错误的记录只跳过该行，不影响同一文本块中的其他记录。
+    """
+
+    def __init__(self, tuple_delimiter: str = " : ", record_delimiter: str = "\n",
+                 max_records: int = 0):
+        """
+        初始化解析器
+
+        Args:
+            tuple_delimiter: 元组字段分隔符
+            record_delimiter: 记录分隔符
+            max_records: 记录数上限，达到后 done 为 True，<=0 表示不限制
+        """
+        sep = re.escape(tuple_delimiter)
+        self.node_pattern = re.compile(r'\("entity"' + sep + r'"(.+?)"' + sep + r'"(.+?)"' + sep + r'"(.+?)"\)')
+        self.rel_pattern = re.compile(
+            r'\("relationship"' + sep + r'"(.+?)"' + sep + r'"(.+?)"' + sep + r'"(.+?)"' + sep +
+            r'"(.+?)"' + sep + r'(.+?)\)'
+        )
+        self.record_delimiter = record_delimiter
+        self.max_records = max_records
+
+        self.records = []
+        self.malformed_lines = []
+        self._buffer = ""
+        self._consumed = []
+
+    @property
+    def malformed(self) -> int:
+        """格式错误的记录数"""
+        return len(self.malformed_lines)
+
+    @property
+    def done(self) -> bool:
+        """是否已达到记录数上限"""
+        return 0 < self.max_records <= len(self.records)
+
+    @property
+    def text(self) -> str:
+        """已解析部分的原始文本，达到上限时截断在最后一条完整记录之后"""
+        return self.record_delimiter.join(self._consumed)
+
+    def feed(self, piece: str) -> List[Dict]:
+        """
+        接收一段输出
+
+        Args:
+            piece: 流式输出的文本片段
+
+        Returns:
+            List[Dict]: 本次新解析出的记录
+        """
+        if self.done or not piece:
+            return []
+        self._buffer += piece
+        new_records = []
+        while not self.done and self.record_delimiter in self._buffer:
+            line, self._buffer = self._buffer.split(self.record_delimiter, 1)
+            new_records.extend(self._parse_line(line))
+        return new_records
+
+    def close(self) -> List[Dict]:
+        """
+        输出结束，解析缓冲区中剩余的最后一条记录
+
+        Returns:
+            List[Dict]: 新解析出的记录
+        """
+        if self.done or not self._buffer:
+            self._buffer = ""
+            return []
+        line, self._buffer = self._buffer, ""
+        return self._parse_line(line)
+
+    def _parse_line(self, line: str) -> List[Dict]:
+        """解析一行，一行中可能包含多条记录"""
+        self._consumed.append(line)
+        found = []
+        invalid = False
+        for match in self.node_pattern.finditer(line):
+            name, entity_type, description = match.groups()
+            found.append((match.start(), {
+                "kind": "entity",
+                "name": name,
+                "type": entity_type,
+                "description": description,
+            }))
+        for match in self.rel_pattern.finditer(line):
+            source, relation, target, description, weight = match.groups()
+            try:
+                weight = float(weight.strip().strip('"'))
+            except ValueError:
+                invalid = True
+                continue
+            found.append((match.start(), {
+                "kind": "relationship",
+                "source": source,
+                "relation": relation,
+                "target": target,
+                "description": description,
+                "weight": weight,
+            }))
+
+        if invalid or (not found and ('("entity"' in line or '("relationship"' in line)):
+            self.malformed_lines.append(line.strip())
+
+        found.sort(key=lambda item: item[0])
+        records = []
+        for _, record in found:
+            if self.done:
+                break
+            self.records.append(record)
+            records.append(record)
+        return records
+
+
+def parse_extraction_output(raw_text: str, tuple_delimiter: str = " : ",
+                            record_delimiter: str = "\n") -> List[Dict]:
+    """
+    一次性解析完整的抽取结果，兼容文本协议和结构化输出（JSON）两种格式
+
+    Args:
+        raw_text: LLM返回的完整文本
+        tuple_delimiter: 元组字段分隔符
+        record_delimiter: 记录分隔符
+
+    Returns:
+        List[Dict]: 实体和关系记录
+    """
+    # 结构化输出模式的结果直接转换，无需正则解析
+    structured = load_extraction(raw_text)
+    if structured is not None:
+        records, invalid = records_from_extraction(structured)
+        for item in invalid:
+            print(f"[解析错误] 跳过字段不完整的条目: {str(item)[:200]}")
+        return records
+
+    parser = ExtractionTupleParser(tuple_delimiter, record_delimiter)
+    parser.feed(raw_text or "")
+    parser.close()
+    for line in parser.malformed_lines:
+        print(f"[解析错误] 跳过无法解析的记录: {line[:200]}")
+    return parser.records
+
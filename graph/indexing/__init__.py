@@ -1,7 +1,10 @@
 from .chunk_indexer import ChunkIndexManager
 from .entity_indexer import EntityIndexManager
+from .name_embedding_cache import NameEmbeddingCache, get_name_embedding_cache
 
 __all__ = [
     'ChunkIndexManager',
-    'EntityIndexManager'
+    'EntityIndexManager',
+    'NameEmbeddingCache',
+    'get_name_embedding_cache'
 ]
\ No newline at end of file
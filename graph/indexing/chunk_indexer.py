@@ -4,7 +4,7 @@ from typing import List, Dict, Any, Optional
 from langchain_community.vectorstores import Neo4jVector
 
 from model.get_models import get_embeddings_model
-from graph.core import BaseIndexer, connection_manager
+from graph.core import BaseIndexer, SchemaManager, connection_manager
 from config.settings import CHUNK_BATCH_SIZE, MAX_WORKERS as DEFAULT_MAX_WORKERS, CHUNK_VECTOR
 
 class ChunkIndexManager(BaseIndexer):
@@ -38,14 +38,8 @@ class ChunkIndexManager(BaseIndexer):
         self.vector_type = CHUNK_VECTOR
     
     def _create_indexes(self) -> None:
-        """创建必要的索引以优化查询性能"""
-        index_queries = [
-            "CREATE INDEX IF NOT EXISTS FOR (c:`__Chunk__`) ON (c.id)",
-            "CREATE INDEX IF NOT EXISTS FOR (c:`__Chunk__`) ON (c.fileName)",
-            "CREATE INDEX IF NOT EXISTS FOR (c:`__Chunk__`) ON (c.position)"
-        ]
-        
-        connection_manager.create_multiple_indexes(index_queries)
+        """Chunk的id约束以及fileName、position索引由 SchemaManager 统一声明"""
+        SchemaManager().ensure()
         
     def clear_existing_index(self) -> None:
         """清除已存在的普通索引（不尝试删除向量索引）"""
@@ -1,10 +1,10 @@
 import time
-import concurrent.futures
 from typing import List, Dict, Any, Optional
 from langchain_community.vectorstores import Neo4jVector
 
 from model.get_models import get_embeddings_model, get_llm_model
-from graph.core import BaseIndexer, connection_manager
+from graph.core import BaseIndexer, SchemaManager, connection_manager
+from graph.indexing.name_embedding_cache import get_name_embedding_cache
 from config.settings import ENTITY_BATCH_SIZE, MAX_WORKERS as DEFAULT_MAX_WORKERS, ENTITY_VECTOR
 
 class EntityIndexManager(BaseIndexer):
@@ -33,18 +33,16 @@ class EntityIndexManager(BaseIndexer):
         # 初始化模型
         self.embeddings = get_embeddings_model()
         self.llm = get_llm_model()
+        # 与构图合并阶段共享的实体名称向量缓存
+        self.name_embeddings = get_name_embedding_cache(self.embeddings)
         
         # 创建必要的索引
         self._create_indexes()
         self.vector_type = ENTITY_VECTOR
     
     def _create_indexes(self) -> None:
-        """创建必要的索引以优化查询性能"""
-        index_queries = [
-            "CREATE INDEX IF NOT EXISTS FOR (e:`__Entity__`) ON (e.id)"
-        ]
-        
-        connection_manager.create_multiple_indexes(index_queries)
+        """实体id唯一约束由 SchemaManager 统一创建"""
+        SchemaManager().ensure()
         
     def clear_existing_index(self) -> None:
         """清除已存在的实体embedding索引，为了防止有的时候embedding模型的切换问题，这里顺便清下vector索引"""
@@ -149,65 +147,20 @@ class EntityIndexManager(BaseIndexer):
             "处理实体embedding"
         )
     
-    def _compute_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+    def _compute_embeddings_batch(self, texts: List[str]) -> List[Optional[List[float]]]:
         """
-        计算一批文本的embedding向量
+        计算一批文本的embedding向量，合并阶段已计算过的名称直接从共享缓存读取
         
         Args:
             texts: 文本列表
             
         Returns:
-            List[List[float]]: embedding向量列表
+            List[Optional[List[float]]]: embedding向量列表，计算失败的位置为None，
+                由后续的 from_existing_graph 补齐
         """
-        embeddings = []
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # 预创建嵌入任务
-            embedding_tasks = []
-            for text in texts:
-                # 添加强健性处理，确保文本不为空
-                safe_text = text if text and text.strip() else "unknown entity"
-                embedding_tasks.append(safe_text)
-            
-            # 分析批处理的最佳大小
-            embed_batch_size = min(32, len(embedding_tasks))
-            
-            # 批量执行嵌入任务
-            for i in range(0, len(embedding_tasks), embed_batch_size):
-                sub_batch = embedding_tasks[i:i+embed_batch_size]
-                try:
-                    # 尝试使用批量嵌入方法（如果可用）
-                    if hasattr(self.embeddings, 'embed_documents'):
-                        sub_batch_embeddings = self.embeddings.embed_documents(sub_batch)
-                        embeddings.extend(sub_batch_embeddings)
-                    else:
-                        # 回退到单个嵌入
-                        futures = [executor.submit(self.embeddings.embed_query, text) for text in sub_batch]
-                        for future in concurrent.futures.as_completed(futures):
-                            try:
-                                embeddings.append(future.result())
-                            except Exception as e:
-                                print(f"嵌入计算失败: {e}")
-                                # 添加零向量作为备用
-                                if hasattr(self.embeddings, 'embedding_size'):
-                                    embeddings.append([0.0] * self.embeddings.embedding_size)
-                                else:
-                                    embeddings.append([0.0] * 1536)
-                except Exception as e:
-                    print(f"批量嵌入处理失败: {e}")
-                    # 尝试单个嵌入作为回退
-                    for text in sub_batch:
-                        try:
-                            embeddings.append(self.embeddings.embed_query(text))
-                        except Exception as e2:
-                            print(f"单个嵌入计算失败: {e2}")
-                            # 添加零向量作为备用
-                            if hasattr(self.embeddings, 'embedding_size'):
-                                embeddings.append([0.0] * self.embeddings.embedding_size)
-                            else:
-                                embeddings.append([0.0] * 1536)
-        
-        return embeddings
+        # 添加强健性处理，确保文本不为空
+        safe_texts = [text if text and text.strip() else "unknown entity" for text in texts]
+        return self.name_embeddings.embed_names(safe_texts)
     
     def _get_entity_texts_batch(self, entities: List[Dict[str, Any]], text_properties: List[str]) -> List[str]:
         """
@@ -0,0 +1,175 @@
+import threading
+import concurrent.futures
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from graph.core import SQLiteCache, generate_hash
+from model.get_models import get_embeddings_model
+from config.settings import (
+    EMBEDDING_BATCH_SIZE,
+    MAX_WORKERS,
+    NAME_EMBEDDING_CACHE_PATH,
+    NAME_EMBEDDING_CACHE_MAX_MB
+)
+
+
+class NameEmbeddingCache:
+    """
+    实体名称向量缓存。
+    以"嵌入模型 + 实体名称"为键把向量保存在SQLite文件中，合并阶段一次性对全语料的实体名称
+    并发批量计算向量，各问题的实体合并和后续的实体向量索引都从这里读取，
+    同一次构建中相同的名称只会计算一次。
+    """
+
+    def __init__(self, embeddings=None, cache_path: str = str(NAME_EMBEDDING_CACHE_PATH),
+                 batch_size: int = EMBEDDING_BATCH_SIZE, max_workers: int = MAX_WORKERS):
+        """
+        初始化名称向量缓存
+
+        Args:
+            embeddings: 嵌入模型，默认使用 get_embeddings_model()
+            cache_path: 缓存数据库文件路径
+            batch_size: 每次调用嵌入模型的名称数量
+            max_workers: 并发请求数
+        """
+        self.embeddings = embeddings or get_embeddings_model()
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max(1, max_workers)
+        self.cache = SQLiteCache(cache_path, max_size_mb=NAME_EMBEDDING_CACHE_MAX_MB)
+        self.model_name = str(getattr(self.embeddings, "model", None) or type(self.embeddings).__name__)
+
+        # 统计信息
+        self._stats_lock = threading.Lock()
+        self.requested = 0
+        self.cache_hits = 0
+        self.embedded = 0
+        self.embed_calls = 0
+        self.failed = 0
+
+    def _key(self, name: str) -> str:
+        return generate_hash(f"{self.model_name}\x00{name}")
+
+    def _embed_batch(self, names: List[str]) -> Dict[str, np.ndarray]:
+        """
+        计算一批名称的向量，批量调用失败时逐个重试，仍失败的名称不返回
+
+        Args:
+            names: 名称列表
+
+        Returns:
+            Dict[str, np.ndarray]: 名称到向量的映射
+        """
+        with self._stats_lock:
+            self.embed_calls += 1
+        try:
+            vectors = self.embeddings.embed_documents(names)
+            return {name: np.asarray(vector, dtype=np.float64) for name, vector in zip(names, vectors)}
+        except Exception as e:
+            print(f"批量嵌入处理失败: {e}")
+
+        results = {}
+        for name in names:
+            try:
+                results[name] = np.asarray(self.embeddings.embed_query(name), dtype=np.float64)
+            except Exception as e:
+                print(f"单个嵌入计算失败: {e}")
+                with self._stats_lock:
+                    self.failed += 1
+        return results
+
+    def _fill(self, names: List[str], keep: bool) -> Dict[str, np.ndarray]:
+        """
+        读取缓存并为未命中的名称并发计算向量
+
+        Args:
+            names: 去重后的名称列表
+            keep: 是否返回向量（预取时只写入缓存）
+
+        Returns:
+            Dict[str, np.ndarray]: keep 为 True 时返回名称到向量的映射
+        """
+        keys = {name: self._key(name) for name in names}
+        found = self.cache.get_many(list(keys.values()))
+        vectors = {name: found[key] for name, key in keys.items() if key in found} if keep else {}
+        missing = [name for name, key in keys.items() if key not in found]
+
+        with self._stats_lock:
+            self.requested += len(names)
+            self.cache_hits += len(names) - len(missing)
+        if not missing:
+            return vectors
+
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+            for computed in executor.map(self._embed_batch, batches):
+                self.cache.put_many({keys[name]: vector for name, vector in computed.items()})
+                with self._stats_lock:
+                    self.embedded += len(computed)
+                if keep:
+                    vectors.update(computed)
+        return vectors
+
+    def prefetch(self, names: Iterable[str]) -> int:
+        """
+        为全部名称预先计算向量并写入缓存，按窗口处理以控制内存占用
+
+        Args:
+            names: 名称，可重复
+
+        Returns:
+            int: 去重后的名称数量
+        """
+        distinct = list(dict.fromkeys(name for name in names if name))
+        window = self.batch_size * self.max_workers
+        for i in range(0, len(distinct), window):
+            self._fill(distinct[i:i + window], keep=False)
+        return len(distinct)
+
+    def embed_names(self, names: List[str]) -> List[Optional[List[float]]]:
+        """
+        获取名称的向量，已缓存的直接读取，其余批量计算后写入缓存
+
+        Args:
+            names: 名称列表，可重复
+
+        Returns:
+            List[Optional[List[float]]]: 与输入一一对应的向量，计算失败的位置为None
+        """
+        vectors = self._fill(list(dict.fromkeys(names)), keep=True)
+        return [vectors[name].tolist() if name in vectors else None for name in names]
+
+    def stats(self) -> Dict[str, int]:
+        """返回统计信息"""
+        with self._stats_lock:
+            return {
+                "requested": self.requested,
+                "cache_hits": self.cache_hits,
+                "embedded": self.embedded,
+                "embed_calls": self.embed_calls,
+                "failed": self.failed,
+            }
+
+    def close(self) -> None:
+        self.cache.close()
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_name_embedding_cache(embeddings=None) -> NameEmbeddingCache:
+    """
+    获取进程内共享的名称向量缓存
+
+    Args:
+        embeddings: 首次创建时使用的嵌入模型
+
+    Returns:
+        NameEmbeddingCache: 共享实例
+    """
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = NameEmbeddingCache(embeddings)
+        return _shared_cache
@@ -1,8 +1,23 @@
 from .entity_merger import EntityMerger
 from .similar_entity import SimilarEntityDetector, GDSConfig
+from .candidate_pairs import find_candidate_pairs
+from .containment_index import ContainmentIndex, find_containment_pairs
+from .merge_confirmer import MergeConfirmer
+from .provenance import ProvenanceIncidence
+from .pruning import PruningEngine, PruningStrategy, PRUNING_STRATEGIES, merge_pruning_reports, new_pruning_report
 
 __all__ = [
     'EntityMerger',
     'SimilarEntityDetector',
-    'GDSConfig'
+    'GDSConfig',
+    'find_candidate_pairs',
+    'ContainmentIndex',
+    'find_containment_pairs',
+    'MergeConfirmer',
+    'PruningEngine',
+    'PruningStrategy',
+    'PRUNING_STRATEGIES',
+    'merge_pruning_reports',
+    'new_pruning_report',
+    'ProvenanceIncidence'
 ]
\ No newline at end of file
@@ -0,0 +1,68 @@
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.settings import CANDIDATE_BLOCK_SIZE
+from graph.processing.containment_index import find_containment_pairs
+
+# float32 矩阵乘法的相似度与逐对 float64 计算可能有微小差异，
+# 落在阈值附近该范围内的实体对按原公式重新计算，保证结果与逐对计算完全一致
+_RECHECK_MARGIN = 1e-4
+
+
+def find_candidate_pairs(entities: List[str], embeddings: Sequence[Sequence[float]],
+                         similarity_threshold: float,
+                         block_size: int = CANDIDATE_BLOCK_SIZE,
+                         names: Optional[List[str]] = None) -> List[Tuple[str, str]]:
+    """
+    生成候选合并实体对：余弦相似度超过阈值，或一个实体名称是另一个的子串
+
+    嵌入向量堆叠为归一化的 float32 矩阵，按行分块做一次矩阵乘法并用阈值掩码筛选；
+    子串关系由 Aho-Corasick 包含索引一次性找出。输出按 itertools.combinations 的顺序排列。
+
+    Args:
+        entities: 实体ID列表
+        embeddings: 与实体一一对应的嵌入向量
+        similarity_threshold: 余弦相似度阈值
+        block_size: 每块的行数，控制相似度矩阵的内存占用
+        names: 用于子串判断的实体名称（如去掉问题ID后缀的名称），默认使用实体ID
+
+    Returns:
+        List[Tuple[str, str]]: 候选实体对 (entities[i], entities[j])，i < j
+    """
+    n = len(entities)
+    if n < 2:
+        return []
+
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        normalized = vectors / norms
+    block_size = max(1, block_size)
+
+    pairs = find_containment_pairs(names if names is not None else entities)
+    for start in range(0, n - 1, block_size):
+        end = min(start + block_size, n - 1)
+        rows = np.arange(start, end)
+        # 只需要 j > i 的部分，列从 start + 1 开始
+        cols = np.arange(start + 1, n)
+
+        with np.errstate(invalid="ignore"):
+            sims = normalized[start:end] @ normalized[start + 1:].T
+        upper = cols[None, :] > rows[:, None]
+
+        mask = sims > similarity_threshold
+        borderline = upper & (np.abs(sims - similarity_threshold) <= _RECHECK_MARGIN)
+        for i, j in zip(*np.nonzero(borderline)):
+            i, j = rows[i], cols[j]
+            mask[i - start, j - start - 1] = _exact_cosine(embeddings[i], embeddings[j]) > similarity_threshold
+
+        for i, j in zip(*np.nonzero(mask & upper)):
+            pairs.add((int(rows[i]), int(cols[j])))
+
+    return [(entities[i], entities[j]) for i, j in sorted(pairs)]
+
+
+def _exact_cosine(emb1, emb2) -> float:
+    """与逐对计算相同的 float64 余弦相似度"""
+    return np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2))
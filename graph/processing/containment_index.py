@@ -0,0 +1,103 @@
+from collections import deque
+from typing import List, Set, Tuple
+
+from config.settings import CONTAINMENT_MIN_LENGTH
+
+
+class ContainmentIndex:
+    """
+    基于 Aho-Corasick 自动机的子串包含索引
+
+    把所有实体名称作为模式串构建自动机，再用每个名称作为文本扫描一遍，
+    即可在 O(名称总长度 + 命中数) 时间内找出所有“一个名称是另一个名称子串”的实体对，
+    前缀、中缀和后缀别名都能覆盖。
+    """
+
+    def __init__(self, patterns: List[str], min_length: int = CONTAINMENT_MIN_LENGTH):
+        """
+        构建自动机
+
+        Args:
+            patterns: 模式串列表
+            min_length: 参与索引的最短模式长度，更短的名称不作为被包含方
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]      # 在该状态结束的模式序号
+        self._out_link = [0]  # 沿失败链最近的有输出的状态，0 表示没有
+
+        for pid, pattern in enumerate(patterns):
+            if pattern and len(pattern) >= min_length:
+                self._insert(pattern, pid)
+        self._build_links()
+
+    def _insert(self, pattern: str, pid: int) -> None:
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._out_link.append(0)
+            state = nxt
+        self._out[state].append(pid)
+
+    def _build_links(self) -> None:
+        """按广度优先顺序计算失败链和输出链"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out_link[nxt] = target if self._out[target] else self._out_link[target]
+
+    def find_in(self, text: str) -> Set[int]:
+        """
+        找出在文本中出现过的所有模式
+
+        Args:
+            text: 文本
+
+        Returns:
+            Set[int]: 模式序号集合
+        """
+        found = set()
+        state = 0
+        for ch in text:
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+
+            match = state if self._out[state] else self._out_link[state]
+            while match:
+                found.update(self._out[match])
+                match = self._out_link[match]
+        return found
+
+
+def find_containment_pairs(names: List[str], min_length: int = CONTAINMENT_MIN_LENGTH) -> Set[Tuple[int, int]]:
+    """
+    找出所有存在子串包含关系的名称对
+
+    Args:
+        names: 名称列表
+        min_length: 被包含名称的最短长度
+
+    Returns:
+        Set[Tuple[int, int]]: 序号对 (i, j)，i < j
+    """
+    index = ContainmentIndex(names, min_length)
+    pairs = set()
+    for j, text in enumerate(names):
+        for i in index.find_in(text):
+            if i != j:
+                pairs.add((i, j) if i < j else (j, i))
+    return pairs
@@ -1,6 +1,7 @@
 import re
 import ast
 import time
+import asyncio
 import concurrent.futures
 from typing import List, Dict, Any, Optional, Tuple
 
@@ -13,8 +14,8 @@ from langchain.prompts import (
 
 from model.get_models import get_llm_model
 from config.prompt import system_template_build_index, user_template_build_index
-from config.settings import ENTITY_BATCH_SIZE, MAX_WORKERS as DEFAULT_MAX_WORKERS
-from graph.core import connection_manager, timer, get_performance_stats, print_performance_stats
+from config.settings import ENTITY_BATCH_SIZE, MAX_WORKERS as DEFAULT_MAX_WORKERS, ASYNC_LLM, ASYNC_MAX_CONCURRENCY
+from graph.core import connection_manager, SchemaManager, llm_governor, timer, get_performance_stats, print_performance_stats
 
 class EntityMerger:
     """
@@ -52,12 +53,8 @@ class EntityMerger:
         self.parse_time = 0
     
     def _create_indexes(self) -> None:
-        """创建必要的索引以优化查询性能"""
-        index_queries = [
-            "CREATE INDEX IF NOT EXISTS FOR (e:`__Entity__`) ON (e.id)"
-        ]
-        
-        connection_manager.create_multiple_indexes(index_queries)
+        """合并时按实体id查找节点，依赖 SchemaManager 创建的唯一约束"""
+        SchemaManager().ensure()
 
     def _setup_llm_chain(self) -> None:
         """
@@ -214,6 +211,57 @@ class EntityMerger:
         
         self.llm_time += time.time() - llm_start_time
         
+        return self._finalize_merge_suggestions(merged_entities)
+
+    async def aget_merge_suggestions(self, duplicate_candidates: List[Any],
+                                     max_concurrency: Optional[int] = None) -> List[List[str]]:
+        """
+        使用LLM分析并提供实体合并建议 - 异步版本，基于 chain.ainvoke
+        
+        Args:
+            duplicate_candidates: 潜在的重复实体候选列表
+            max_concurrency: 最大在途请求数
+            
+        Returns:
+            List[List[str]]: 建议合并的实体分组列表
+        """
+        if not duplicate_candidates:
+            return []
+
+        llm_start_time = time.time()
+        semaphore = asyncio.Semaphore(max_concurrency or ASYNC_MAX_CONCURRENCY)
+
+        async def bounded(candidates):
+            async with semaphore:
+                return await self._aprocess_candidate_group(candidates)
+
+        print(f"异步处理 {len(duplicate_candidates)} 个候选实体组")
+        results = await asyncio.gather(
+            *(bounded(candidates) for candidates in duplicate_candidates),
+            return_exceptions=True
+        )
+
+        merged_entities = []
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"处理候选实体组时出错: {result}")
+            elif result:
+                merged_entities.append(result)
+
+        self.llm_time += time.time() - llm_start_time
+
+        return self._finalize_merge_suggestions(merged_entities)
+
+    def _finalize_merge_suggestions(self, merged_entities: List[str]) -> List[List[str]]:
+        """
+        解析LLM返回的合并建议，并合并有重叠的实体组
+        
+        Args:
+            merged_entities: LLM返回的原始文本列表
+            
+        Returns:
+            List[List[str]]: 建议合并的实体分组列表
+        """
         parse_start_time = time.time()
         # 解析并整理最终的合并建议
         results = []
@@ -292,23 +340,41 @@ class EntityMerger:
         if not candidates or len(candidates) < 2:
             return None
             
-        chat_history = []
-        max_retries = 2
-        for retry in range(max_retries + 1):
-            try:
-                # 调用LLM进行分析
-                answer = self.chain.invoke({
-                    "chat_history": chat_history,
-                    "entities": candidates
-                })
-                return answer.content
-            except Exception as e:
-                if retry < max_retries:
-                    print(f"LLM调用异常，尝试重试 ({retry+1}/{max_retries}): {e}")
-                    time.sleep(1)  # 短暂延迟
-                else:
-                    print(f"LLM调用失败，最大重试次数已用尽: {e}")
-                    return None
+        try:
+            # 调用LLM进行分析，重试由LLM调度器统一处理
+            answer = llm_governor.call(self.chain.invoke, {
+                "chat_history": [],
+                "entities": candidates
+            })
+            return answer.content
+        except Exception as e:
+            print(f"LLM调用失败: {e}")
+            return None
+
+    async def _aprocess_candidate_group(self, candidates: List[str]) -> Optional[str]:
+        """
+        处理单个候选实体组 - 异步版本
+        
+        Args:
+            candidates: 候选实体列表
+            
+        Returns:
+            str: LLM的分析结果
+        """
+        if not candidates or len(candidates) < 2:
+            return None
+
+        try:
+            answer = await llm_governor.acall(self.chain.ainvoke, {
+                "chat_history": [],
+                "entities": candidates
+            })
+            return answer.content
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"LLM调用失败: {e}")
+            return None
 
     def execute_merges(self, merge_groups: List[List[str]]) -> int:
         """
@@ -484,7 +550,10 @@ class EntityMerger:
         print(f"开始处理 {len(filtered_candidates)} 组有效重复实体候选...")
         
         # 获取合并建议
-        merge_groups = self.get_merge_suggestions(filtered_candidates)
+        if ASYNC_LLM:
+            merge_groups = asyncio.run(self.aget_merge_suggestions(filtered_candidates))
+        else:
+            merge_groups = self.get_merge_suggestions(filtered_candidates)
         
         suggestion_time = time.time()
         suggestion_elapsed = suggestion_time - start_time
@@ -0,0 +1,209 @@
+import ast
+import json
+import re
+import threading
+import concurrent.futures
+from typing import Dict, List, Optional, Tuple
+
+from config.prompt import merge_confirmation_template
+from config.settings import (
+    MAX_WORKERS,
+    MERGE_CONFIRM_PROMPT_TOKENS,
+    MERGE_CONFIRM_MAX_PAIRS,
+    MERGE_DECISION_CACHE_PATH,
+    MERGE_DECISION_CACHE_MAX_MB
+)
+from graph.core import SQLiteCache, generate_hash, llm_governor
+from model.get_models import count_tokens
+
+# 一个待确认的实体对：(名称1, 类型1, 描述1, 名称2, 类型2, 描述2)
+MergePair = Tuple[str, str, str, str, str, str]
+
+
+class MergeConfirmer:
+    """
+    实体合并的LLM确认器。
+    所有问题的候选实体对一次性提交，按 (名称1, 名称2, 类型1, 类型2) 去重并查询持久化的决策缓存，
+    未命中的实体对按token预算装箱后并发调用LLM，确认结果写回缓存，重复构建时不再重复询问。
+    """
+
+    def __init__(self, llm, cache_path: str = str(MERGE_DECISION_CACHE_PATH),
+                 max_workers: int = MAX_WORKERS,
+                 prompt_tokens: int = MERGE_CONFIRM_PROMPT_TOKENS,
+                 max_pairs: int = MERGE_CONFIRM_MAX_PAIRS):
+        """
+        初始化合并确认器
+
+        Args:
+            llm: 语言模型
+            cache_path: 决策缓存数据库文件路径
+            max_workers: 并发请求数
+            prompt_tokens: 单次请求中实体对的输入token预算
+            max_pairs: 单次请求的最大实体对数
+        """
+        self.llm = llm
+        self.max_workers = max(1, max_workers)
+        self.prompt_tokens = prompt_tokens
+        self.max_pairs = max(1, max_pairs)
+        self.cache = SQLiteCache(cache_path, max_size_mb=MERGE_DECISION_CACHE_MAX_MB)
+
+        # 提示词或模型变化时旧的决策失效
+        self.fingerprint = generate_hash(json.dumps({
+            "template": merge_confirmation_template,
+            "model": self._get_model_name(),
+        }, ensure_ascii=False))
+
+        # 统计信息
+        self._stats_lock = threading.Lock()
+        self.requested = 0
+        self.cache_hits = 0
+        self.llm_calls = 0
+        self.failed = 0
+
+    def _get_model_name(self) -> str:
+        """获取LLM的模型名称，用于区分不同模型的缓存"""
+        for attr in ("model_name", "model", "model_id"):
+            value = getattr(self.llm, attr, None)
+            if isinstance(value, str) and value:
+                return value
+        return type(self.llm).__name__
+
+    def _decision_key(self, pair: MergePair) -> str:
+        """以 (名称, 类型) 排序后的二元组生成缓存键，实体对的先后顺序不影响结果"""
+        name1, type1, _, name2, type2, _ = pair
+        first, second = sorted([(name1, type1), (name2, type2)])
+        return generate_hash(json.dumps([self.fingerprint, first[0], second[0], first[1], second[1]],
+                                        ensure_ascii=False))
+
+    @staticmethod
+    def _format_pair(idx: int, pair: MergePair) -> str:
+        name1, type1, desc1, name2, type2, desc2 = pair
+        return (f'{idx}. 实体1: "{name1}" (详细信息: {type1}\n{desc1}) | '
+                f'实体2: "{name2}" (详细信息: {type2}\n{desc2})')
+
+    def _pack_batches(self, keys: List[str], pairs: Dict[str, MergePair]) -> List[List[str]]:
+        """
+        按输入token预算和最大实体对数顺序装箱
+
+        Args:
+            keys: 待确认的决策键
+            pairs: 决策键到实体对的映射
+
+        Returns:
+            List[List[str]]: 批次列表
+        """
+        batches = []
+        current, current_tokens = [], 0
+        for key in keys:
+            tokens = count_tokens(self._format_pair(len(current) + 1, pairs[key]))
+            if current and (len(current) >= self.max_pairs or current_tokens + tokens > self.prompt_tokens):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(key)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    @staticmethod
+    def _parse_decisions(response: str, expected: int) -> List[bool]:
+        """
+        从LLM响应中取出布尔值列表
+
+        Args:
+            response: LLM响应文本
+            expected: 实体对数量
+
+        Returns:
+            List[bool]: 决策列表，格式错误时抛出 ValueError
+        """
+        list_str = None
+        search_result = re.search(r"\[.*?\]", response, re.S)
+        if search_result:
+            list_str = search_result.group(0)
+        if not list_str:
+            raise ValueError("LLM 响应中未找到任何有效的 Python 列表 `[...]`。")
+
+        results_list = ast.literal_eval(list_str)
+        if not isinstance(results_list, list) or len(results_list) != expected:
+            raise ValueError("Parsed list is not valid or its length does not match the batch size.")
+        return [bool(value) for value in results_list]
+
+    def _confirm_batch(self, keys: List[str], pairs: Dict[str, MergePair]) -> Dict[str, bool]:
+        """
+        用一次LLM调用确认一批实体对，解析失败时二分重试
+
+        Args:
+            keys: 本批次的决策键
+            pairs: 决策键到实体对的映射
+
+        Returns:
+            Dict[str, bool]: 决策键到是否合并的映射，最终失败的实体对不在结果中
+        """
+        formatted_pairs = "\n".join(self._format_pair(idx + 1, pairs[key]) for idx, key in enumerate(keys))
+        prompt = merge_confirmation_template.format(formatted_pairs=formatted_pairs)
+        with self._stats_lock:
+            self.llm_calls += 1
+
+        response = ""
+        try:
+            response = llm_governor.call(self.llm.invoke, prompt, est_tokens=count_tokens(prompt)).content
+            return dict(zip(keys, self._parse_decisions(response, len(keys))))
+        except Exception as e:
+            if len(keys) == 1:
+                print(f"警告: 无法解析LLM对于实体对的响应。错误: {e}")
+                print(f"LLM响应原文: {response}")
+                with self._stats_lock:
+                    self.failed += 1
+                return {}
+
+        mid = len(keys) // 2
+        decisions = self._confirm_batch(keys[:mid], pairs)
+        decisions.update(self._confirm_batch(keys[mid:], pairs))
+        return decisions
+
+    def confirm(self, pairs: List[MergePair]) -> List[Optional[bool]]:
+        """
+        确认一组实体对是否指向同一实体
+
+        Args:
+            pairs: 实体对列表，可以来自多个问题
+
+        Returns:
+            List[Optional[bool]]: 与输入一一对应的决策，LLM最终未给出有效结果的位置为None
+        """
+        keys = [self._decision_key(pair) for pair in pairs]
+        unique_pairs = {}
+        for key, pair in zip(keys, pairs):
+            unique_pairs.setdefault(key, pair)
+
+        decisions = self.cache.get_many(list(unique_pairs))
+        pending = [key for key in unique_pairs if key not in decisions]
+        with self._stats_lock:
+            self.requested += len(unique_pairs)
+            self.cache_hits += len(unique_pairs) - len(pending)
+
+        if pending:
+            batches = self._pack_batches(pending, unique_pairs)
+            workers = min(self.max_workers, len(batches))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(self._confirm_batch, batch, unique_pairs) for batch in batches]
+                for future in concurrent.futures.as_completed(futures):
+                    batch_decisions = future.result()
+                    self.cache.put_many(batch_decisions)
+                    decisions.update(batch_decisions)
+
+        return [decisions.get(key) for key in keys]
+
+    def stats(self) -> Dict[str, int]:
+        """返回统计信息"""
+        with self._stats_lock:
+            return {
+                "requested": self.requested,
+                "cache_hits": self.cache_hits,
+                "llm_calls": self.llm_calls,
+                "failed": self.failed,
+            }
+
+    def close(self) -> None:
+        self.cache.close()
@@ -0,0 +1,242 @@
+import os
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+
+
+class ProvenanceIncidence:
+    """
+    实体×chunk 的稀疏关联矩阵（CSR）。
+    实体和chunk的ID都被映射为连续的整数序号，第 i 行的非零列即实体 i 出现过的chunk，
+    这正是实体-chunk超图的关联矩阵。桥梁实体、共现次数、局部/远程关系判断都是对行的向量化运算。
+    """
+
+    def __init__(self, matrix: sparse.csr_matrix, entity_ids: List[str], chunk_ids: List[str]):
+        """
+        Args:
+            matrix: 形状为 (实体数, chunk数) 的0/1稀疏矩阵
+            entity_ids: 行序号对应的实体ID
+            chunk_ids: 列序号对应的chunk_id
+        """
+        self.matrix = matrix
+        self.entity_ids = entity_ids
+        self.chunk_ids = chunk_ids
+        self.entity_index = {entity: i for i, entity in enumerate(entity_ids)}
+        self.chunk_index = {chunk: i for i, chunk in enumerate(chunk_ids)}
+        # 每个实体出现的chunk数
+        self.chunk_counts = np.diff(matrix.indptr)
+        self._csc = None
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Tuple[Sequence[str], List[Dict]]]) -> "ProvenanceIncidence":
+        """
+        由文档的chunk_id和结构化数据构建关联矩阵
+
+        Args:
+            documents: (chunk_id列表, 与之一一对应的 ChunkGraph 列表) 的可迭代对象，
+                长度不一致的文档会被跳过
+
+        Returns:
+            ProvenanceIncidence: 关联矩阵
+        """
+        entity_index = {}
+        chunk_index = {}
+        rows = []
+        cols = []
+        for chunk_ids, structured_data_per_chunk in documents:
+            if len(chunk_ids) != len(structured_data_per_chunk):
+                continue
+            for chunk_id, chunk_graph in zip(chunk_ids, structured_data_per_chunk):
+                if not chunk_id:
+                    continue
+                col = chunk_index.setdefault(chunk_id, len(chunk_index))
+                # 以实体ID为键：超出内存模式下驻留表在窗口之间清空，序号不能跨窗口使用
+                for entity_id in chunk_graph.entity_ids():
+                    rows.append(entity_index.setdefault(entity_id, len(entity_index)))
+                    cols.append(col)
+
+        shape = (len(entity_index), len(chunk_index))
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int8), (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))),
+            shape=shape
+        )
+        # 同一实体在同一chunk中重复出现只记一次
+        matrix.sum_duplicates()
+        matrix.data[:] = 1
+        return cls(matrix, list(entity_index), list(chunk_index))
+
+    @classmethod
+    def concatenate(cls, parts: Sequence["ProvenanceIncidence"]) -> "ProvenanceIncidence":
+        """
+        按行拼接多个关联矩阵，chunk取并集。
+        实体ID带有问题ID后缀，不同问题集合构建的矩阵之间实体互不重叠，可以直接拼接。
+
+        Args:
+            parts: 实体互不重叠的关联矩阵列表
+
+        Returns:
+            ProvenanceIncidence: 拼接后的关联矩阵
+        """
+        chunk_index = {}
+        for part in parts:
+            for chunk_id in part.chunk_ids:
+                chunk_index.setdefault(chunk_id, len(chunk_index))
+
+        blocks = []
+        entity_ids = []
+        for part in parts:
+            # 各部分的列号映射到合并后的chunk序号
+            columns = np.fromiter((chunk_index[chunk_id] for chunk_id in part.chunk_ids),
+                                  dtype=np.int64, count=len(part.chunk_ids))
+            coo = part.matrix.tocoo()
+            blocks.append(sparse.csr_matrix(
+                (coo.data, (coo.row, columns[coo.col])), shape=(part.entity_count, len(chunk_index))
+            ))
+            entity_ids.extend(part.entity_ids)
+
+        if blocks:
+            matrix = sparse.vstack(blocks, format="csr")
+        else:
+            matrix = sparse.csr_matrix((0, 0), dtype=np.int8)
+        return cls(matrix, entity_ids, list(chunk_index))
+
+    @property
+    def entity_count(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def chunk_count(self) -> int:
+        return self.matrix.shape[1]
+
+    def bridge_mask(self) -> np.ndarray:
+        """出现在多个chunk中的实体（桥梁实体）的布尔掩码"""
+        return self.chunk_counts > 1
+
+    def bridge_entities(self) -> List[str]:
+        """桥梁实体ID列表"""
+        return [self.entity_ids[i] for i in np.flatnonzero(self.bridge_mask())]
+
+    def _padded(self, entities: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """序号超出矩阵行数的实体（只出现在关系中）视为没有出处"""
+        entities = np.asarray(entities, dtype=np.int64)
+        known = entities < self.entity_count
+        return np.where(known, entities, 0), known
+
+    def counts(self, entities: np.ndarray) -> np.ndarray:
+        """实体出现的chunk数，未知实体为0"""
+        rows, known = self._padded(entities)
+        return np.where(known, self.chunk_counts[rows], 0)
+
+    def cooccurrence(self, heads: np.ndarray, tails: np.ndarray) -> np.ndarray:
+        """
+        逐对计算两个实体共同出现的chunk数
+
+        Args:
+            heads: 实体序号数组
+            tails: 与 heads 等长的实体序号数组
+
+        Returns:
+            np.ndarray: 共现chunk数
+        """
+        head_rows, head_known = self._padded(heads)
+        tail_rows, tail_known = self._padded(tails)
+        if len(head_rows) == 0:
+            return np.zeros(0, dtype=np.int64)
+        shared = np.asarray(
+            self.matrix[head_rows].multiply(self.matrix[tail_rows]).sum(axis=1)
+        ).ravel().astype(np.int64)
+        return np.where(head_known & tail_known, shared, 0)
+
+    def same_provenance(self, heads: np.ndarray, tails: np.ndarray) -> np.ndarray:
+        """
+        逐对判断两个实体的出处集合是否完全相同（两个未知实体视为相同）
+
+        Returns:
+            np.ndarray: 布尔数组
+        """
+        head_counts = self.counts(heads)
+        tail_counts = self.counts(tails)
+        shared = self.cooccurrence(heads, tails)
+        return (head_counts == tail_counts) & (shared == head_counts)
+
+    def chunks_of(self, entity_id: str) -> List[str]:
+        """实体出现过的chunk_id列表"""
+        row = self.entity_index.get(entity_id)
+        if row is None:
+            return []
+        start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+        return [self.chunk_ids[col] for col in self.matrix.indices[start:end]]
+
+    def entities_of(self, chunk_id: str) -> List[str]:
+        """chunk中出现的实体ID列表"""
+        col = self.chunk_index.get(chunk_id)
+        if col is None:
+            return []
+        if self._csc is None:
+            self._csc = self.matrix.tocsc()
+        start, end = self._csc.indptr[col], self._csc.indptr[col + 1]
+        return [self.entity_ids[row] for row in self._csc.indices[start:end]]
+
+    def cooccurring_entities(self, entity_id: str) -> Dict[str, int]:
+        """
+        与给定实体共同出现过的实体及共现chunk数
+
+        Args:
+            entity_id: 实体ID
+
+        Returns:
+            Dict[str, int]: 实体ID到共现chunk数的映射，不含自身
+        """
+        row = self.entity_index.get(entity_id)
+        if row is None:
+            return {}
+        counts = (self.matrix @ self.matrix[row].T).tocoo()
+        return {
+            self.entity_ids[i]: int(count)
+            for i, count in zip(counts.row, counts.data)
+            if i != row and count
+        }
+
+    def to_dict(self) -> Dict[str, set]:
+        """转换为实体到chunk_id集合的映射"""
+        return {entity: set(self.chunks_of(entity)) for entity in self.entity_ids}
+
+    def save(self, path: str) -> None:
+        """
+        保存为单个 .npz 文件，供查询端加载复用
+
+        Args:
+            path: 文件路径
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        np.savez_compressed(
+            path,
+            indptr=self.matrix.indptr,
+            indices=self.matrix.indices,
+            shape=np.asarray(self.matrix.shape),
+            entity_ids=np.asarray(self.entity_ids, dtype=str),
+            chunk_ids=np.asarray(self.chunk_ids, dtype=str),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ProvenanceIncidence":
+        """
+        从 save() 保存的文件加载
+
+        Args:
+            path: 文件路径
+
+        Returns:
+            ProvenanceIncidence: 关联矩阵
+        """
+        with np.load(path) as data:
+            indices = data["indices"]
+            matrix = sparse.csr_matrix(
+                (np.ones(len(indices), dtype=np.int8), indices, data["indptr"]),
+                shape=tuple(data["shape"])
+            )
+            return cls(matrix, data["entity_ids"].tolist(), data["chunk_ids"].tolist())
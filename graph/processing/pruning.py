@@ -0,0 +1,284 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+import numpy as np
+
+from config.settings import PRUNING_STRATEGY
+from graph.processing.provenance import ProvenanceIncidence
+from graph.structure.columnar_store import ChunkGraph, string_table
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    """按从低到高的顺序遍历位掩码中被置位的序号"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def mask_from_flags(flags: np.ndarray) -> int:
+    """将布尔数组转换为位掩码，第 i 位对应 flags[i]"""
+    mask = 0
+    for i in np.flatnonzero(flags):
+        mask |= 1 << int(i)
+    return mask
+
+
+class ChunkIncidence:
+    """
+    单个chunk的关系关联结构。
+    实体映射为引擎内的整数序号，关系用其在chunk中的下标表示，关系集合用整数位掩码表示，
+    集合的并、交、差都是一次位运算。
+    """
+
+    __slots__ = ("heads", "tails", "nodes", "size", "all", "_incident")
+
+    def __init__(self, heads: List[int], tails: List[int], nodes: List[int]):
+        """
+        Args:
+            heads: 每条关系头实体的序号
+            tails: 每条关系尾实体的序号
+            nodes: chunk中节点的实体序号，与节点字典的顺序一致
+        """
+        self.heads = heads
+        self.tails = tails
+        self.nodes = nodes
+        self.size = len(heads)
+        self.all = (1 << self.size) - 1
+        self._incident = None
+
+    @property
+    def incident(self) -> Dict[int, int]:
+        """实体序号到与其相连的关系位掩码的映射"""
+        if self._incident is None:
+            incident = {}
+            for i, (head, tail) in enumerate(zip(self.heads, self.tails)):
+                bit = 1 << i
+                incident[head] = incident.get(head, 0) | bit
+                incident[tail] = incident.get(tail, 0) | bit
+            self._incident = incident
+        return self._incident
+
+    def endpoints(self, mask: int) -> Set[int]:
+        """位掩码中所有关系的头尾实体"""
+        entities = set()
+        for i in iter_bits(mask):
+            entities.add(self.heads[i])
+            entities.add(self.tails[i])
+        return entities
+
+
+class PruningStrategy(ABC):
+    """
+    剪枝策略接口。
+    relation_flags 对引擎中所有关系一次性给出向量化的保留标记，
+    select_relations 可在chunk内进一步扩展（默认直接使用标记），keep_node 决定节点去留，
+    默认只保留仍被保留关系引用的节点。
+    """
+
+    name = ""
+    description = ""
+
+    @abstractmethod
+    def relation_flags(self, heads: np.ndarray, tails: np.ndarray, engine: "PruningEngine") -> np.ndarray:
+        """给出每条关系是否保留的布尔数组"""
+        pass
+
+    def select_relations(self, chunk: ChunkIncidence, flags: np.ndarray, engine: "PruningEngine") -> int:
+        return mask_from_flags(flags)
+
+    def keep_node(self, entity: int, referenced: Set[int], engine: "PruningEngine") -> bool:
+        return entity in referenced
+
+
+class LocalRelationStrategy(PruningStrategy):
+    """移除纯局部关系：保留出处不同的实体间关系，以及出处相同但跨多个chunk共现的关系"""
+
+    name = "local"
+    description = "剪除纯局部关系"
+
+    def relation_flags(self, heads: np.ndarray, tails: np.ndarray, engine: "PruningEngine") -> np.ndarray:
+        provenance = engine.provenance
+        return ~provenance.same_provenance(heads, tails) | (provenance.counts(heads) > 1)
+
+
+class TwoHopBridgeStrategy(PruningStrategy):
+    """保留与桥梁实体直接相连的一跳关系，以及连接一跳实体的二跳关系"""
+
+    name = "two_hop"
+    description = "桥梁实体一跳与二跳关系"
+
+    def relation_flags(self, heads: np.ndarray, tails: np.ndarray, engine: "PruningEngine") -> np.ndarray:
+        return engine.bridge[heads] | engine.bridge[tails]
+
+    def select_relations(self, chunk: ChunkIncidence, flags: np.ndarray, engine: "PruningEngine") -> int:
+        one_hop = mask_from_flags(flags)
+        two_hop = 0
+        incident = chunk.incident
+        for entity in chunk.endpoints(one_hop):
+            two_hop |= incident[entity]
+        return one_hop | two_hop
+
+
+class BridgeEntityStrategy(PruningStrategy):
+    """保留所有桥梁实体节点，且只保留桥梁实体之间的关系"""
+
+    name = "bridge"
+    description = "仅桥梁实体"
+
+    def relation_flags(self, heads: np.ndarray, tails: np.ndarray, engine: "PruningEngine") -> np.ndarray:
+        return engine.bridge[heads] & engine.bridge[tails]
+
+    def keep_node(self, entity: int, referenced: Set[int], engine: "PruningEngine") -> bool:
+        return bool(engine.bridge[entity])
+
+
+PRUNING_STRATEGIES = {
+    strategy.name: strategy
+    for strategy in (LocalRelationStrategy, TwoHopBridgeStrategy, BridgeEntityStrategy)
+}
+
+
+def new_pruning_report(strategies: Iterable[PruningStrategy]) -> Dict[str, Dict[str, int]]:
+    """创建空的剪枝统计"""
+    return {
+        strategy.name: {"relations_before": 0, "relations_after": 0, "nodes_before": 0, "nodes_after": 0}
+        for strategy in strategies
+    }
+
+
+def merge_pruning_reports(total: Dict[str, Dict[str, int]], report: Dict[str, Dict[str, int]]) -> None:
+    """将 report 累加到 total 上"""
+    for name, counts in report.items():
+        target = total.setdefault(name, dict.fromkeys(counts, 0))
+        for key, value in counts.items():
+            target[key] = target.get(key, 0) + value
+
+
+class PruningEngine:
+    """
+    基于整数序号和位掩码的剪枝引擎。
+    实体序号直接沿用出处关联矩阵的行号，桥梁标记和局部/远程判断对所有关系一次性向量化计算，
+    一次遍历所有chunk即可得到全部策略的结果并生成各自的稀疏率统计，只有被选中的策略会修改数据。
+    """
+
+    def __init__(self, provenance: ProvenanceIncidence,
+                 strategies: Optional[List[PruningStrategy]] = None):
+        """
+        初始化剪枝引擎
+
+        Args:
+            provenance: 实体×chunk 出处关联矩阵
+            strategies: 参与计算的策略，默认全部策略
+        """
+        self.strategies = strategies if strategies is not None else [cls() for cls in PRUNING_STRATEGIES.values()]
+        self.provenance = provenance
+        # 只出现在关系中、不在出处矩阵中的实体，行号接在矩阵行号之后
+        self.extra_rows: Dict[str, int] = {}
+        # 驻留序号 -> 行号的缓存，chunk中的实体序号可以直接查表；驻留表清空后重建
+        self.entity_index: Dict[int, int] = {}
+        self._generation = string_table.generation
+        self._bridge = provenance.bridge_mask()
+
+    @property
+    def bridge(self) -> np.ndarray:
+        """桥梁标记，只出现在关系中的实体（序号超出矩阵行数）不是桥梁实体"""
+        total = self.provenance.entity_count + len(self.extra_rows)
+        if len(self._bridge) < total:
+            self._bridge = np.concatenate([self._bridge, np.zeros(total - len(self._bridge), dtype=bool)])
+        return self._bridge
+
+    def _entity_id(self, ref: int) -> int:
+        idx = self.entity_index.get(ref)
+        if idx is None:
+            entity = string_table.lookup(ref)
+            idx = self.provenance.entity_index.get(entity)
+            if idx is None:
+                # 只出现在关系中、不在出处矩阵中的实体
+                idx = self.extra_rows.setdefault(entity, self.provenance.entity_count + len(self.extra_rows))
+            self.entity_index[ref] = idx
+        return idx
+
+    @property
+    def bridge_count(self) -> int:
+        return int(self.provenance.bridge_mask().sum())
+
+    def get_strategy(self, name: str) -> PruningStrategy:
+        for strategy in self.strategies:
+            if strategy.name == name:
+                return strategy
+        raise ValueError(f"未知的剪枝策略: {name}，可选: {[s.name for s in self.strategies]}")
+
+    def index_chunk(self, chunk_graph: ChunkGraph) -> ChunkIncidence:
+        """将chunk的列式结构化数据转换为整数关联结构"""
+        if self._generation != string_table.generation:
+            self.entity_index = {}
+            self._generation = string_table.generation
+        return ChunkIncidence(
+            [self._entity_id(ref) for ref in chunk_graph.rel_heads()],
+            [self._entity_id(ref) for ref in chunk_graph.rel_tails()],
+            [self._entity_id(ref) for ref in chunk_graph.node_refs()]
+        )
+
+    def prune_document(self, doc: Dict, apply: Optional[str] = PRUNING_STRATEGY) -> Dict[str, Dict[str, int]]:
+        """
+        对单个文档计算全部策略，并按 apply 指定的策略原地剪枝
+
+        Args:
+            doc: 文档字典
+            apply: 实际应用的策略名称，为None时只统计不修改
+
+        Returns:
+            Dict[str, Dict[str, int]]: 各策略剪枝前后的关系数和节点数
+        """
+        return self.run([doc], apply)
+
+    def run(self, documents: Iterable[Dict], apply: Optional[str] = PRUNING_STRATEGY) -> Dict[str, Dict[str, int]]:
+        """
+        对所有文档执行一次遍历：先把全部chunk转换为整数结构，再对所有关系向量化计算各策略的标记
+
+        Args:
+            documents: 文档列表
+            apply: 实际应用的策略名称，为None时只统计不修改
+
+        Returns:
+            Dict[str, Dict[str, int]]: 各策略剪枝前后的关系数和节点数
+        """
+        report = new_pruning_report(self.strategies)
+        if apply is not None:
+            self.get_strategy(apply)
+
+        chunk_datas = [
+            chunk_data
+            for doc in documents if "structured_data" in doc
+            for chunk_data in doc["structured_data"]
+        ]
+        chunks = [self.index_chunk(chunk_data) for chunk_data in chunk_datas]
+        if not chunks:
+            return report
+
+        heads = np.fromiter((h for chunk in chunks for h in chunk.heads), dtype=np.int64)
+        tails = np.fromiter((t for chunk in chunks for t in chunk.tails), dtype=np.int64)
+        flags = {strategy.name: strategy.relation_flags(heads, tails, self) for strategy in self.strategies}
+
+        offset = 0
+        for chunk_data, chunk in zip(chunk_datas, chunks):
+            end = offset + chunk.size
+            for strategy in self.strategies:
+                kept = strategy.select_relations(chunk, flags[strategy.name][offset:end], self)
+                referenced = chunk.endpoints(kept)
+                kept_nodes = [
+                    position for position, entity in enumerate(chunk.nodes)
+                    if strategy.keep_node(entity, referenced, self)
+                ]
+
+                counts = report[strategy.name]
+                counts["relations_before"] += chunk.size
+                counts["relations_after"] += bin(kept).count("1")
+                counts["nodes_before"] += len(chunk.nodes)
+                counts["nodes_after"] += len(kept_nodes)
+
+                if strategy.name == apply:
+                    chunk_data.retain(iter_bits(kept), kept_nodes)
+            offset = end
+        return report
@@ -5,7 +5,7 @@ from typing import Tuple, List, Any, Dict
 from dataclasses import dataclass
 
 from config.settings import similarity_threshold, BATCH_SIZE, GDS_MEMORY_LIMIT
-from graph.core import connection_manager, timer, get_performance_stats, print_performance_stats
+from graph.core import connection_manager, SchemaManager, timer, get_performance_stats, print_performance_stats
 
 @dataclass
 class GDSConfig:
@@ -63,13 +63,8 @@ class SimilarEntityDetector:
         self._create_indexes()
     
     def _create_indexes(self):
-        """创建必要的索引以优化查询性能"""
-        index_queries = [
-            "CREATE INDEX IF NOT EXISTS FOR (e:`__Entity__`) ON (e.id)",
-            "CREATE INDEX IF NOT EXISTS FOR (e:`__Entity__`) ON (e.wcc)"
-        ]
-        
-        connection_manager.create_multiple_indexes(index_queries)
+        """重复实体检测按id和wcc查询，对应的约束和索引由 SchemaManager 统一创建"""
+        SchemaManager().ensure()
     
     @timer
     def create_entity_projection(self) -> Tuple[Any, Dict[str, Any]]:
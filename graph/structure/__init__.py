@@ -1,5 +1,9 @@
 from .struct_builder import GraphStructureBuilder
+from .columnar_store import ChunkGraph, StringTable, string_table
 
 __all__ = [
-    'GraphStructureBuilder'
+    'GraphStructureBuilder',
+    'ChunkGraph',
+    'StringTable',
+    'string_table'
 ]
\ No newline at end of file
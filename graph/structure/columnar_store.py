@@ -0,0 +1,312 @@
+import threading
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# 节点数组每条记录的字段数：(实体ID, 类型, 描述)
+_NODE_STRIDE = 3
+# 关系数组每条记录的字段数：(头实体ID, 尾实体ID, 关系类型, 描述)，权重单独存放
+_REL_STRIDE = 4
+
+
+class StringTable:
+    """
+    字符串驻留表：相同的字符串只保存一份，其余地方只存整数序号。
+    实体ID、实体类型、关系类型、标题和问题ID在构建中大量重复，全部通过它驻留。
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._strings: List[str] = []
+        self._lock = threading.Lock()
+        # 每次 clear 后加一，以驻留序号为键的缓存据此判断是否失效
+        self.generation = 0
+
+    def intern(self, value: str) -> int:
+        """返回字符串的序号，首次出现时加入表中"""
+        idx = self._ids.get(value)
+        if idx is None:
+            with self._lock:
+                idx = self._ids.get(value)
+                if idx is None:
+                    idx = len(self._strings)
+                    self._strings.append(value)
+                    self._ids[value] = idx
+        return idx
+
+    def find(self, value: str) -> Optional[int]:
+        """返回已驻留字符串的序号，不存在时返回None"""
+        return self._ids.get(value)
+
+    def lookup(self, idx: int) -> str:
+        return self._strings[idx]
+
+    def clear(self) -> None:
+        """
+        清空驻留表，之前的序号全部失效。只能在引用这些序号的 ChunkGraph 都不再使用时调用，
+        超出内存模式在每个窗口处理完后调用，驻留表只保存当前窗口的字符串
+        """
+        with self._lock:
+            self._ids = {}
+            self._strings = []
+            self.generation += 1
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+
+# 进程内共享的字符串表
+string_table = StringTable()
+
+
+class ChunkGraph:
+    """
+    单个chunk结构化数据的列式表示，替代 {"nodes": {...}, "relationships": [...]} 字典。
+    节点和关系分别保存在定长步长的整数数组中，字符串字段只保存驻留表序号；
+    描述文本几乎不重复，按chunk保存在局部列表中，剪枝时随记录一起释放。
+    标题和问题ID对chunk内所有节点相同，只保存一次。
+    """
+
+    __slots__ = ("title", "question_id", "nodes", "rels", "weights", "texts", "_positions")
+
+    def __init__(self, title: str = "", question_id: str = ""):
+        """
+        Args:
+            title: chunk所属段落的标题
+            question_id: 问题ID
+        """
+        self.title = string_table.intern(title)
+        self.question_id = string_table.intern(question_id)
+        self.nodes = array("i")
+        self.rels = array("i")
+        self.weights = array("d")
+        self.texts: List[str] = []
+        # 实体序号 -> 节点位置，构建时按需生成，retain / merge_entities 后失效，剪枝后随之释放
+        self._positions: Optional[Dict[int, int]] = None
+
+    # ---------- 构建 ----------
+
+    def _text_ref(self, text: str) -> int:
+        self.texts.append(text)
+        return len(self.texts) - 1
+
+    def node_position(self, entity_id: str) -> int:
+        """返回实体在节点数组中的位置，不存在时返回-1"""
+        ref = string_table.find(entity_id)
+        if ref is None:
+            return -1
+        if self._positions is None:
+            self._positions = {node_ref: position for position, node_ref in enumerate(self.nodes[0::_NODE_STRIDE])}
+        return self._positions.get(ref, -1)
+
+    def has_node(self, entity_id: str) -> bool:
+        return self.node_position(entity_id) >= 0
+
+    def set_node(self, entity_id: str, node_type: str, description: str) -> None:
+        """添加节点，实体已存在时覆盖其类型和描述"""
+        position = self.node_position(entity_id)
+        if position >= 0:
+            base = position * _NODE_STRIDE
+            self.nodes[base + 1] = string_table.intern(node_type)
+            self.nodes[base + 2] = self._text_ref(description)
+            return
+        ref = string_table.intern(entity_id)
+        if self._positions is not None:
+            self._positions[ref] = self.node_count
+        self.nodes.extend((ref, string_table.intern(node_type), self._text_ref(description)))
+
+    def add_relationship(self, head: str, relation: str, tail: str, description: str, weight: float) -> None:
+        """添加一条关系"""
+        self.rels.extend((string_table.intern(head), string_table.intern(tail),
+                          string_table.intern(relation), self._text_ref(description)))
+        self.weights.append(float(weight))
+
+    # ---------- 读取 ----------
+
+    @property
+    def node_count(self) -> int:
+        return len(self.nodes) // _NODE_STRIDE
+
+    @property
+    def rel_count(self) -> int:
+        return len(self.weights)
+
+    def node_refs(self) -> array:
+        """节点实体ID的驻留序号"""
+        return self.nodes[0::_NODE_STRIDE]
+
+    def rel_heads(self) -> array:
+        return self.rels[0::_REL_STRIDE]
+
+    def rel_tails(self) -> array:
+        return self.rels[1::_REL_STRIDE]
+
+    def entity_ids(self) -> List[str]:
+        """节点实体ID列表"""
+        return [string_table.lookup(ref) for ref in self.node_refs()]
+
+    def node_properties(self, position: int) -> Dict[str, str]:
+        """节点属性字典，与原结构化数据中节点的字段一致"""
+        base = position * _NODE_STRIDE
+        return {
+            "type": string_table.lookup(self.nodes[base + 1]),
+            "description": self.texts[self.nodes[base + 2]],
+            "title": string_table.lookup(self.title),
+            "question_id": string_table.lookup(self.question_id),
+        }
+
+    def node_items(self) -> Iterator[Tuple[str, Dict[str, str]]]:
+        """遍历 (实体ID, 属性字典)"""
+        for position in range(self.node_count):
+            yield string_table.lookup(self.nodes[position * _NODE_STRIDE]), self.node_properties(position)
+
+    def relationship(self, position: int) -> Dict:
+        """关系字典，与原结构化数据中关系的字段一致"""
+        base = position * _REL_STRIDE
+        return {
+            "head": string_table.lookup(self.rels[base]),
+            "relation": string_table.lookup(self.rels[base + 2]),
+            "tail": string_table.lookup(self.rels[base + 1]),
+            "description": self.texts[self.rels[base + 3]],
+            "weight": self.weights[position],
+        }
+
+    def relationships(self) -> Iterator[Dict]:
+        for position in range(self.rel_count):
+            yield self.relationship(position)
+
+    # ---------- 修改 ----------
+
+    def _compact_texts(self) -> None:
+        """丢弃不再被引用的描述文本"""
+        used = sorted(set(self.nodes[2::_NODE_STRIDE]) | set(self.rels[3::_REL_STRIDE]))
+        if len(used) == len(self.texts):
+            return
+        remap = {old: new for new, old in enumerate(used)}
+        self.texts = [self.texts[old] for old in used]
+        for base in range(2, len(self.nodes), _NODE_STRIDE):
+            self.nodes[base] = remap[self.nodes[base]]
+        for base in range(3, len(self.rels), _REL_STRIDE):
+            self.rels[base] = remap[self.rels[base]]
+
+    def retain(self, rel_positions: Iterable[int], node_positions: Iterable[int]) -> None:
+        """
+        只保留给定位置的关系和节点
+
+        Args:
+            rel_positions: 要保留的关系位置（升序）
+            node_positions: 要保留的节点位置（升序）
+        """
+        rels = array("i")
+        weights = array("d")
+        for position in rel_positions:
+            base = position * _REL_STRIDE
+            rels.extend(self.rels[base:base + _REL_STRIDE])
+            weights.append(self.weights[position])
+        nodes = array("i")
+        for position in node_positions:
+            base = position * _NODE_STRIDE
+            nodes.extend(self.nodes[base:base + _NODE_STRIDE])
+        self.rels, self.weights, self.nodes = rels, weights, nodes
+        self._positions = None
+        self._compact_texts()
+
+    def merge_entities(self, confirmed_merges: Dict[str, str]) -> None:
+        """
+        按合并映射把源实体并入目标实体：目标不存在时源节点改名为目标，
+        已存在时拼接描述；关系端点同步替换并去除自环
+
+        Args:
+            confirmed_merges: 源实体ID到目标实体ID的映射
+        """
+        merges = {string_table.intern(source): string_table.intern(target)
+                  for source, target in confirmed_merges.items()}
+
+        # 节点：实体序号 -> [类型序号, 描述]，保持原有顺序
+        nodes = {}
+        for base in range(0, len(self.nodes), _NODE_STRIDE):
+            nodes[self.nodes[base]] = [self.nodes[base + 1], self.texts[self.nodes[base + 2]]]
+        nodes_to_delete = set()
+        for source, target in merges.items():
+            if source in nodes:
+                if target not in nodes:
+                    nodes[target] = nodes[source]
+                else:
+                    nodes[target] = [nodes[target][0], nodes[target][1] + nodes[source][1]]
+                nodes_to_delete.add(source)
+        for ref in nodes_to_delete:
+            nodes.pop(ref, None)
+
+        texts = []
+        new_nodes = array("i")
+        for ref, (type_ref, description) in nodes.items():
+            texts.append(description)
+            new_nodes.extend((ref, type_ref, len(texts) - 1))
+
+        new_rels = array("i")
+        new_weights = array("d")
+        for position in range(self.rel_count):
+            base = position * _REL_STRIDE
+            head = merges.get(self.rels[base], self.rels[base])
+            tail = merges.get(self.rels[base + 1], self.rels[base + 1])
+            if head != tail:
+                texts.append(self.texts[self.rels[base + 3]])
+                new_rels.extend((head, tail, self.rels[base + 2], len(texts) - 1))
+                new_weights.append(self.weights[position])
+
+        self.nodes, self.rels, self.weights, self.texts = new_nodes, new_rels, new_weights, texts
+        self._positions = None
+
+    # ---------- 转换 ----------
+
+    def to_dict(self) -> Dict:
+        """转换为原来的 {"nodes": ..., "relationships": ...} 字典"""
+        return {
+            "nodes": dict(self.node_items()),
+            "relationships": list(self.relationships()),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, title: str = "", question_id: str = "") -> "ChunkGraph":
+        """
+        由原结构化字典构建
+
+        Args:
+            data: 包含 nodes 和 relationships 的字典
+            title: 节点中没有标题时使用的默认值
+            question_id: 节点中没有问题ID时使用的默认值
+        """
+        nodes = data.get("nodes", {})
+        first = next(iter(nodes.values()), {})
+        chunk = cls(first.get("title", title), first.get("question_id", question_id))
+        for entity_id, properties in nodes.items():
+            chunk.set_node(entity_id, properties.get("type", "未知"), properties.get("description", ""))
+        for rel in data.get("relationships", []):
+            chunk.add_relationship(rel["head"], rel["relation"], rel["tail"],
+                                   rel.get("description", ""), rel.get("weight", 1.0))
+        return chunk
+
+    def __reduce__(self):
+        # 驻留序号只在当前进程内有效，序列化时保存字符串
+        return _chunk_from_state, ((
+            string_table.lookup(self.title),
+            string_table.lookup(self.question_id),
+            [string_table.lookup(ref) for ref in self.nodes[0::_NODE_STRIDE]],
+            [string_table.lookup(ref) for ref in self.nodes[1::_NODE_STRIDE]],
+            [self.texts[ref] for ref in self.nodes[2::_NODE_STRIDE]],
+            [string_table.lookup(ref) for ref in self.rels[0::_REL_STRIDE]],
+            [string_table.lookup(ref) for ref in self.rels[1::_REL_STRIDE]],
+            [string_table.lookup(ref) for ref in self.rels[2::_REL_STRIDE]],
+            [self.texts[ref] for ref in self.rels[3::_REL_STRIDE]],
+            self.weights.tolist(),
+        ),)
+
+
+def _chunk_from_state(state: Sequence) -> ChunkGraph:
+    title, question_id, node_ids, node_types, node_descs, heads, tails, relations, rel_descs, weights = state
+    chunk = ChunkGraph(title, question_id)
+    for entity_id, node_type, description in zip(node_ids, node_types, node_descs):
+        chunk.nodes.extend((string_table.intern(entity_id), string_table.intern(node_type),
+                            chunk._text_ref(description)))
+    for head, tail, relation, description, weight in zip(heads, tails, relations, rel_descs, weights):
+        chunk.add_relationship(head, relation, tail, description, weight)
+    return chunk
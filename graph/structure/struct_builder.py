@@ -1,12 +1,89 @@
 import time
+import threading
 import concurrent.futures
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from langchain_core.documents import Document
 
 from graph.core import connection_manager, generate_hash
 from config.settings import BATCH_SIZE as DEFAULT_BATCH_SIZE
 from config.settings import MAX_WORKERS as DEFAULT_MAX_WORKERS
 
+def build_chunk_rows(file_name: str, chunks: List, title: List) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+    """
+    计算一个文件的Chunk节点属性和链式关系，不访问数据库
+
+    Args:
+        file_name: 文件名
+        chunks: 文本块列表
+        title: 标题列表
+
+    Returns:
+        Tuple[List[Dict], List[Dict], List[Dict]]: (Chunk节点数据, FIRST_CHUNK/NEXT_CHUNK关系数据, 带有ID和文档的块列表)
+    """
+    lst_chunks_including_hash = []
+    batch_data = []
+    relationships = []
+    offset = 0
+
+    # MODIFICATION: Iterate over chunks and titles together using zip
+    for i, (chunk, chunk_title) in enumerate(zip(chunks, title)):
+        page_content = ''.join(chunk)
+        current_chunk_id = generate_hash(page_content)
+        position = i + 1
+
+        # This logic for previous_chunk_id was slightly incorrect.
+        # It should get the ID from the previously processed chunk in the list.
+        previous_chunk_id = ""
+        if i > 0:
+            previous_chunk_id = lst_chunks_including_hash[-1]['chunk_id']
+
+        if i > 0:
+            last_page_content = ''.join(chunks[i - 1])
+            offset += len(last_page_content)
+
+        firstChunk = (i == 0)
+
+        # 创建metadata和Document对象
+        metadata = {
+            "position": position,
+            "length": len(page_content),
+            "content_offset": offset,
+            "tokens": len(chunk)
+        }
+        chunk_document = Document(page_content=page_content, metadata=metadata)
+
+        # 准备batch数据
+        chunk_data = {
+            "id": current_chunk_id,
+            "title": chunk_title,  # MODIFICATION: Add the title field
+            "pg_content": chunk_document.page_content,
+            "position": position,
+            "length": chunk_document.metadata["length"],
+            "f_name": file_name,
+            "previous_id": previous_chunk_id,
+            "content_offset": offset,
+            "tokens": len(chunk)
+        }
+        batch_data.append(chunk_data)
+
+        lst_chunks_including_hash.append({
+            'chunk_id': current_chunk_id,
+            'chunk_doc': chunk_document
+        })
+
+        # 创建关系数据
+        if firstChunk:
+            relationships.append({"type": "FIRST_CHUNK", "chunk_id": current_chunk_id})
+        else:
+            relationships.append({
+                "type": "NEXT_CHUNK",
+                "previous_chunk_id": previous_chunk_id,
+                "current_chunk_id": current_chunk_id
+            })
+
+    return batch_data, relationships, lst_chunks_including_hash
+
+
 class GraphStructureBuilder:
     """
     图结构构建器，负责创建和管理Neo4j中的文档和块节点结构。
@@ -24,6 +101,14 @@ class GraphStructureBuilder:
         self.graph.refresh_schema()
         
         self.batch_size = batch_size or DEFAULT_BATCH_SIZE
+
+        # 本次构建中已写入的Chunk节点，跨问题共享的段落只写入一次文本和属性。
+        # 设置 chunk_registry（如构建日志）后改为查询外部存储，内存中不再保存随语料增长的ID集合
+        self.written_chunk_ids = set()
+        self.chunk_registry = None
+        self._written_lock = threading.Lock()
+        self.chunks_written = 0
+        self.chunks_linked = 0
             
     def clear_database(self):
         """清空数据库"""
@@ -32,6 +117,81 @@ class GraphStructureBuilder:
             DETACH DELETE n
             """
         self.graph.query(clear_query)
+        with self._written_lock:
+            self.written_chunk_ids.clear()
+
+    def _split_written_chunks(self, batch_data: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """
+        将批数据拆分为需要完整写入的Chunk和本次构建中已写入过的Chunk。
+        这里只读取已写入集合，写入Chunk的事务提交后再由 mark_chunks_written 登记；
+        批内重复出现的Chunk只完整写入第一次，其余在同一事务中关联
+
+        Args:
+            batch_data: 批处理数据
+
+        Returns:
+            Tuple[List[Dict], List[Dict]]: (需要完整写入的数据, 只需关联到文档的数据)
+        """
+        new_data = []
+        linked_data = []
+        batch_ids = set()
+        with self._written_lock:
+            written = self._written_among([data["id"] for data in batch_data])
+            for data in batch_data:
+                if data["id"] in written or data["id"] in batch_ids:
+                    linked_data.append({"id": data["id"], "f_name": data["f_name"]})
+                else:
+                    batch_ids.add(data["id"])
+                    new_data.append(data)
+            self.chunks_linked += len(linked_data)
+        return new_data, linked_data
+
+    def mark_chunks_written(self, chunk_ids: List[str]) -> None:
+        """
+        登记已提交的Chunk节点，之后共享这些段落的问题只建立关联。
+        只能在写入这些Chunk的事务成功提交后调用，否则后续问题会关联到不存在的Chunk
+
+        Args:
+            chunk_ids: 已提交的Chunk ID
+        """
+        with self._written_lock:
+            if self.chunk_registry is not None:
+                self.chunks_written += self.chunk_registry.register_written_chunks(chunk_ids)
+                return
+            before = len(self.written_chunk_ids)
+            self.written_chunk_ids.update(chunk_ids)
+            self.chunks_written += len(self.written_chunk_ids) - before
+
+    def _written_among(self, chunk_ids: List[str]) -> set:
+        """
+        查询给定Chunk中已写入的部分（调用方需持有 _written_lock）
+
+        Args:
+            chunk_ids: Chunk ID列表
+
+        Returns:
+            set: 已写入的Chunk ID
+        """
+        if self.chunk_registry is not None:
+            return self.chunk_registry.written_chunks_among(chunk_ids)
+        return {chunk_id for chunk_id in chunk_ids if chunk_id in self.written_chunk_ids}
+
+    def _link_written_chunks(self, linked_data: List[Dict]):
+        """
+        已写入的Chunk只建立与当前文档的关系，不再重复写入文本和属性
+
+        Args:
+            linked_data: 只包含id和f_name的数据
+        """
+        if not linked_data:
+            return
+        query = """
+        UNWIND $batch_data AS data
+        MATCH (c:`__Chunk__` {id: data.id})
+        MATCH (d:`__Document__` {fileName: data.f_name})
+        MERGE (c)-[:一部分]->(d)
+        """
+        connection_manager.execute_write(query, params={"batch_data": linked_data})
         
     def create_document(self, type: str, uri: str, file_name: str, domain: str) -> Dict:
         """
@@ -51,7 +211,7 @@ class GraphStructureBuilder:
         SET d.type=$type, d.uri=$uri, d.domain=$domain
         RETURN d;
         """
-        doc = self.graph.query(
+        doc = connection_manager.execute_write(
             query,
             {"file_name": file_name, "type": type, "uri": uri, "domain": domain}
         )
@@ -71,83 +231,109 @@ class GraphStructureBuilder:
         """
         t0 = time.time()
 
-        current_chunk_id = ""
-        lst_chunks_including_hash = []
-        batch_data = []
-        relationships = []
-        offset = 0
-
-        # MODIFICATION: Iterate over chunks and titles together using zip
-        for i, (chunk, chunk_title) in enumerate(zip(chunks, title)):
-            page_content = ''.join(chunk)
-            current_chunk_id = generate_hash(page_content)
-            position = i + 1
-
-            # This logic for previous_chunk_id was slightly incorrect.
-            # It should get the ID from the previously processed chunk in the list.
-            previous_chunk_id = ""
-            if i > 0:
-                previous_chunk_id = lst_chunks_including_hash[-1]['chunk_id']
-
-            if i > 0:
-                last_page_content = ''.join(chunks[i - 1])
-                offset += len(last_page_content)
-
-            firstChunk = (i == 0)
-
-            # 创建metadata和Document对象
-            metadata = {
-                "position": position,
-                "length": len(page_content),
-                "content_offset": offset,
-                "tokens": len(chunk)
-            }
-            chunk_document = Document(page_content=page_content, metadata=metadata)
-            
-            # 准备batch数据
-            chunk_data = {
-                "id": current_chunk_id,
-                "title": chunk_title,  # MODIFICATION: Add the title field
-                "pg_content": chunk_document.page_content,
-                "position": position,
-                "length": chunk_document.metadata["length"],
-                "f_name": file_name,
-                "previous_id": previous_chunk_id,
-                "content_offset": offset,
-                "tokens": len(chunk)
-            }
-            batch_data.append(chunk_data)
-            
-            lst_chunks_including_hash.append({
-                'chunk_id': current_chunk_id,
-                'chunk_doc': chunk_document
-            })
-            
-            # 创建关系数据
-            if firstChunk:
-                relationships.append({"type": "FIRST_CHUNK", "chunk_id": current_chunk_id})
-            else:
-                relationships.append({
-                    "type": "NEXT_CHUNK",
-                    "previous_chunk_id": previous_chunk_id,
-                    "current_chunk_id": current_chunk_id
-                })
-            
-            # 当累积了一定量的数据时，进行批处理
-            if len(batch_data) >= self.batch_size:
-                self._process_batch(file_name, batch_data, relationships)
-                batch_data = []
-                relationships = []
-        
-        # 处理剩余的数据
-        if batch_data:
-            self._process_batch(file_name, batch_data, relationships)
+        batch_data, relationships, lst_chunks_including_hash = build_chunk_rows(file_name, chunks, title)
+
+        # 每个chunk对应一条FIRST_CHUNK或NEXT_CHUNK关系，按相同的下标分批处理
+        for i in range(0, len(batch_data), self.batch_size):
+            self._process_batch(file_name, batch_data[i:i + self.batch_size], relationships[i:i + self.batch_size])
         
         t1 = time.time()
         # print(f"创建关系耗时: {t1-t0:.2f}秒")
 
         return lst_chunks_including_hash
     
+    def build_structure_statements(self, files: List[Tuple[str, List, List]], type: str, uri: str,
+                                   domain: str) -> Tuple[List[Tuple[str, Dict]], List[str]]:
+        """
+        为一组文件生成写入Document、Chunk节点及其关系的UNWIND语句，不访问数据库。
+        所有文件的同类数据合并为一条语句，可以和实体写入放在同一个事务中执行；
+        事务提交后调用方需要用返回的Chunk ID调用 mark_chunks_written。
+
+        Args:
+            files: (文件名, 文本块列表, 标题列表) 列表
+            type: 文档类型
+            uri: 文档URI
+            domain: 文档域
+
+        Returns:
+            Tuple[List[Tuple[str, Dict]], List[str]]: ((Cypher语句, 参数) 列表按执行顺序排列, 本组新写入的Chunk ID)
+        """
+        documents = []
+        chunk_rows = []
+        first_relationships = []
+        next_relationships = []
+        for file_name, chunks, title in files:
+            documents.append({"file_name": file_name})
+            batch_data, relationships, _ = build_chunk_rows(file_name, chunks, title)
+            chunk_rows.extend(batch_data)
+            for relationship in relationships:
+                if relationship["type"] == "FIRST_CHUNK":
+                    first_relationships.append({"f_name": file_name, "chunk_id": relationship["chunk_id"]})
+                else:
+                    next_relationships.append(relationship)
+        if not documents:
+            return [], []
+
+        new_data, linked_data = self._split_written_chunks(chunk_rows)
+
+        statements = [("""
+        UNWIND $documents AS document
+        MERGE (d:`__Document__` {fileName: document.file_name})
+        SET d.type = $type, d.uri = $uri, d.domain = $domain
+        """, {"documents": documents, "type": type, "uri": uri, "domain": domain})]
+        if new_data:
+            statements.append(("""
+            UNWIND $batch_data AS data
+            MERGE (c:`__Chunk__` {id: data.id})
+            SET c.text = data.pg_content,
+                c.position = data.position,
+                c.length = data.length,
+                c.fileName = data.f_name,
+                c.content_offset = data.content_offset,
+                c.tokens = data.tokens,
+                c.title = data.title
+            WITH c, data
+            MATCH (d:`__Document__` {fileName: data.f_name})
+            MERGE (c)-[:一部分]->(d)
+            """, {"batch_data": new_data}))
+        if linked_data:
+            statements.append(("""
+            UNWIND $batch_data AS data
+            MATCH (c:`__Chunk__` {id: data.id})
+            MATCH (d:`__Document__` {fileName: data.f_name})
+            MERGE (c)-[:一部分]->(d)
+            """, {"batch_data": linked_data}))
+        if first_relationships:
+            statements.append(("""
+            UNWIND $relationships AS relationship
+            MATCH (d:`__Document__` {fileName: relationship.f_name})
+            MATCH (c:`__Chunk__` {id: relationship.chunk_id})
+            MERGE (d)-[:FIRST_CHUNK]->(c)
+            """, {"relationships": first_relationships}))
+        if next_relationships:
+            statements.append(("""
+            UNWIND $relationships AS relationship
+            MATCH (c:`__Chunk__` {id: relationship.current_chunk_id})
+            MATCH (pc:`__Chunk__` {id: relationship.previous_chunk_id})
+            MERGE (pc)-[:NEXT_CHUNK]->(c)
+            """, {"relationships": next_relationships}))
+        return statements, [data["id"] for data in new_data]
+
+    def write_structure(self, files: List[Tuple[str, List, List]], type: str, uri: str, domain: str) -> None:
+        """
+        在一个事务中写入一组文件的文档结构
+
+        Args:
+            files: (文件名, 文本块列表, 标题列表) 列表
+            type: 文档类型
+            uri: 文档URI
+            domain: 文档域
+        """
+        statements, new_chunk_ids = self.build_structure_statements(files, type, uri, domain)
+        if statements:
+            connection_manager.execute_write_batch(statements)
+            self.mark_chunks_written(new_chunk_ids)
+
     def _process_batch(self, file_name: str, batch_data: List[Dict], relationships: List[Dict]):
         """
         批量处理一组chunks和关系
@@ -178,6 +364,8 @@ class GraphStructureBuilder:
             first_relationships: FIRST_CHUNK关系列表
             next_relationships: NEXT_CHUNK关系列表
         """
+        batch_data, linked_data = self._split_written_chunks(batch_data)
+
         # 合并查询：创建Chunk节点和PART_OF关系
         query_chunks_and_part_of = """
         UNWIND $batch_data AS data
@@ -193,7 +381,11 @@ class GraphStructureBuilder:
         MATCH (d:`__Document__` {fileName: data.f_name})
         MERGE (c)-[:一部分]->(d)
         """
-        self.graph.query(query_chunks_and_part_of, params={"batch_data": batch_data})
+        if batch_data:
+            connection_manager.execute_write(query_chunks_and_part_of, params={"batch_data": batch_data})
+            self.mark_chunks_written([data["id"] for data in batch_data])
+        # 批内重复的Chunk在上面刚刚创建，关联放在创建之后
+        self._link_written_chunks(linked_data)
         
         # 处理FIRST_CHUNK关系
         if first_relationships:
@@ -203,7 +395,7 @@ class GraphStructureBuilder:
             MATCH (c:`__Chunk__` {id: relationship.chunk_id})
             MERGE (d)-[:FIRST_CHUNK]->(c)
             """
-            self.graph.query(query_first_chunk, params={
+            connection_manager.execute_write(query_first_chunk, params={
                 "f_name": file_name,
                 "relationships": first_relationships
             })
@@ -216,7 +408,7 @@ class GraphStructureBuilder:
             MATCH (pc:`__Chunk__` {id: relationship.previous_chunk_id})
             MERGE (pc)-[:NEXT_CHUNK]->(c)
             """
-            self.graph.query(query_next_chunk, params={"relationships": next_relationships})
+            connection_manager.execute_write(query_next_chunk, params={"relationships": next_relationships})
     
     def parallel_process_chunks(self, file_name: str, chunks: List, title: List, max_workers=None) -> List[Dict]:
         """
@@ -372,6 +564,8 @@ class GraphStructureBuilder:
             batch_data: 批处理数据
             relationships: 关系数据
         """
+        batch_data, linked_data = self._split_written_chunks(batch_data)
+
         # 创建Chunk节点和PART_OF关系
         query_chunk_part_of = """
             UNWIND $batch_data AS data
@@ -387,7 +581,11 @@ class GraphStructureBuilder:
             MATCH (d:`__Document__` {fileName: data.f_name})
             MERGE (c)-[:一部分]->(d)
         """
-        self.graph.query(query_chunk_part_of, params={"batch_data": batch_data})
+        if batch_data:
+            connection_manager.execute_write(query_chunk_part_of, params={"batch_data": batch_data})
+            self.mark_chunks_written([data["id"] for data in batch_data])
+        # 批内重复的Chunk在上面刚刚创建，关联放在创建之后
+        self._link_written_chunks(linked_data)
         
         # 创建FIRST_CHUNK关系
         query_first_chunk = """
@@ -397,7 +595,7 @@ class GraphStructureBuilder:
             FOREACH(r IN CASE WHEN relationship.type = 'FIRST_CHUNK' THEN [1] ELSE [] END |
                     MERGE (d)-[:FIRST_CHUNK]->(c))
         """
-        self.graph.query(query_first_chunk, params={
+        connection_manager.execute_write(query_first_chunk, params={
             "f_name": file_name,
             "relationships": relationships
         })
@@ -411,4 +609,4 @@ class GraphStructureBuilder:
             FOREACH(r IN CASE WHEN relationship.type = 'NEXT_CHUNK' THEN [1] ELSE [] END |
                     MERGE (c)<-[:NEXT_CHUNK]-(pc))
         """
-        self.graph.query(query_next_chunk, params={"relationships": relationships})
\ No newline at end of file
+        connection_manager.execute_write(query_next_chunk, params={"relationships": relationships})
\ No newline at end of file
@@ -2,7 +2,7 @@ import os
 
 from datasets import load_dataset
 
-from config.settings import CHUNK_SIZE, OVERLAP
+from config.settings import CHUNK_SIZE, OVERLAP, DATASET_MAX_QUESTIONS
 from processor.text_chunker import ChineseTextChunker
 
 
@@ -11,16 +11,20 @@ class DatasetProcessor:
         数据集处理器，用于段落的分块和向量操作等功能
     """
 
-    def __init__(self, dataset_path: str, chunk_size: int = CHUNK_SIZE, overlap: int = OVERLAP):
+    def __init__(self, dataset_path: str, chunk_size: int = CHUNK_SIZE, overlap: int = OVERLAP,
+                 max_questions: int = DATASET_MAX_QUESTIONS):
         """
         初始化文档处理器
 
         Args:
             directory_path: 文件目录路径
+            max_questions: 读取的最大问题数，<=0 表示读取全部
         """
         self.dataset_path = dataset_path
         self.chunker = ChineseTextChunker(chunk_size, overlap)
-        self.dataset = load_dataset("parquet", data_files=str(self.dataset_path))["train"].select(range(500))
+        self.dataset = load_dataset("parquet", data_files=str(self.dataset_path))["train"]
+        if max_questions and max_questions > 0:
+            self.dataset = self.dataset.select(range(min(max_questions, len(self.dataset))))
 
     def process_data(self, data):
         file_ext = os.path.splitext(self.dataset_path)[1]
@@ -77,6 +81,17 @@ class DatasetProcessor:
         #
         return results.to_pandas().to_dict(orient="records")
 
+    def iter_documents(self):
+        """
+        逐条生成处理结果，不在内存中物化整个数据集
+
+        Returns:
+            Iterator[Dict]: 与 process_dataset 相同格式的文件处理结果
+        """
+        # datasets 的数据基于内存映射的Arrow文件，按行迭代时只解码当前行
+        for data in self.dataset:
+            yield self.process_data(data)
+
     def get_extension_type(self, extension: str) -> str:
         """
         获取文件扩展名对应的文档类型
@@ -0,0 +1,173 @@
+import hashlib
+import os
+import re
+import sqlite3
+from typing import Dict, List, Optional, Set, Tuple
+
+from config.settings import PARAGRAPH_NEAR_DUP_THRESHOLD, PARAGRAPH_SHINGLE_SIZE
+
+
+class ParagraphDeduplicator:
+    """
+    跨问题段落去重器
+
+    MuSiQue 中同一段落会出现在多个问题的上下文里，DatasetProcessor 会为每个问题重复生成它。
+    去重器在抽取前遍历整个语料，把完全重复（空白归一化后相同）和近似重复
+    （同标题且字符n-gram的Jaccard相似度达到阈值）的段落替换为同一个代表文本，
+    使其在抽取阶段只调用一次LLM，在Neo4j中只对应一个Chunk节点。
+    实体ID仍按问题隔离（name__question_id），抽取结果在解析时分别归入各个问题。
+
+    去重表保存在SQLite中，以归一化文本和标题的哈希为键，代表文本只保存一份，
+    n-gram集合在比较时由代表文本重新计算。超出内存模式把它放在磁盘文件中，内存占用不随语料增长。
+    """
+
+    def __init__(self, threshold: float = PARAGRAPH_NEAR_DUP_THRESHOLD,
+                 shingle_size: int = PARAGRAPH_SHINGLE_SIZE, db_path: str = ":memory:"):
+        """
+        初始化段落去重器
+
+        Args:
+            threshold: 近似重复的Jaccard相似度阈值，>=1 时只做完全去重
+            shingle_size: 字符n-gram长度
+            db_path: 去重表的SQLite文件路径，默认保存在内存中
+        """
+        self.threshold = threshold
+        self.shingle_size = max(1, shingle_size)
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path)
+        # 去重表每次运行都会重建，不需要日志和同步落盘
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS paragraphs ("
+            "id INTEGER PRIMARY KEY, title_hash BLOB NOT NULL, text TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS paragraphs_title ON paragraphs (title_hash)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS canonical ("
+            "norm_hash BLOB PRIMARY KEY, paragraph_id INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        self.reset()
+
+    def reset(self) -> None:
+        """清空已见过的段落和统计"""
+        self._conn.execute("DELETE FROM canonical")  # 归一化文本哈希 -> 代表段落
+        self._conn.execute("DELETE FROM paragraphs")  # 代表段落：(标题哈希, 代表文本)
+        self._conn.commit()
+        self.stats = {"total": 0, "exact": 0, "near": 0, "unique": 0}
+
+    def close(self) -> None:
+        """关闭去重表"""
+        self._conn.close()
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        """空白归一化"""
+        return re.sub(r"\s+", " ", text).strip()
+
+    @staticmethod
+    def _hash(text: str) -> bytes:
+        """去重表的键"""
+        return hashlib.sha1(text.encode("utf-8")).digest()
+
+    def _shingles(self, text: str) -> Set[str]:
+        """生成字符n-gram集合"""
+        n = self.shingle_size
+        if len(text) <= n:
+            return {text}
+        return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+    def _find_near_duplicate(self, title_hash: bytes, shingles: Set[str]) -> Optional[Tuple[int, str]]:
+        """
+        在同标题的代表段落中查找近似重复
+
+        Args:
+            title_hash: 标题的哈希
+            shingles: 当前段落的n-gram集合
+
+        Returns:
+            Optional[Tuple[int, str]]: 找到时返回 (代表段落ID, 代表文本)
+        """
+        if self.threshold >= 1:
+            return None
+
+        size = len(shingles)
+        candidates = self._conn.execute("SELECT id, text FROM paragraphs WHERE title_hash = ? ORDER BY id",
+                                        (title_hash,))
+        for paragraph_id, text in candidates:
+            candidate_shingles = self._shingles(self._normalize(text))
+            candidate_size = len(candidate_shingles)
+            # 集合大小相差过大时Jaccard不可能达到阈值
+            if min(size, candidate_size) < self.threshold * max(size, candidate_size):
+                continue
+            intersection = len(shingles & candidate_shingles)
+            if intersection / (size + candidate_size - intersection) >= self.threshold:
+                return paragraph_id, text
+        return None
+
+    def deduplicate(self, documents: List[Dict]) -> Dict[str, int]:
+        """
+        对所有文档的段落去重，原地把 doc['chunks'] 中的重复段落替换为代表文本
+
+        Args:
+            documents: DatasetProcessor 生成的文档列表
+
+        Returns:
+            Dict[str, int]: 段落引用总数、完全重复数、近似重复数和唯一段落数
+        """
+        self.reset()
+        for doc in documents:
+            self.deduplicate_document(doc)
+        return dict(self.stats)
+
+    def deduplicate_document(self, doc: Dict) -> None:
+        """
+        对单个文档的段落去重，与之前处理过的所有文档比较；
+        可逐个文档调用，不需要一次性加载整个语料
+
+        Args:
+            doc: DatasetProcessor 生成的文档
+        """
+        if doc.get("chunks") is None:
+            return
+
+        stats = self.stats
+        chunks = []
+        for chunk in doc["chunks"]:
+            text = ''.join(chunk)
+            stats["total"] += 1
+            normalized = self._normalize(text)
+            norm_hash = self._hash(normalized)
+
+            row = self._conn.execute(
+                "SELECT p.text FROM canonical c JOIN paragraphs p ON p.id = c.paragraph_id WHERE c.norm_hash = ?",
+                (norm_hash,)
+            ).fetchone()
+            if row is not None:
+                canonical = row[0]
+                stats["exact"] += 1
+            else:
+                # 段落首行为标题，只在同标题的段落之间比较近似重复
+                title_hash = self._hash(self._normalize(text.split("\n", 1)[0]))
+                # 只做完全去重时不需要计算n-gram集合
+                shingles = self._shingles(normalized) if self.threshold < 1 else set()
+                match = self._find_near_duplicate(title_hash, shingles)
+                if match is not None:
+                    paragraph_id, canonical = match
+                    stats["near"] += 1
+                else:
+                    canonical = text
+                    paragraph_id = self._conn.execute(
+                        "INSERT INTO paragraphs (title_hash, text) VALUES (?, ?)", (title_hash, text)
+                    ).lastrowid
+                    stats["unique"] += 1
+                self._conn.execute("INSERT INTO canonical (norm_hash, paragraph_id) VALUES (?, ?)",
+                                   (norm_hash, paragraph_id))
+            chunks.append(canonical)
+        self._conn.commit()
+
+        doc["chunks"] = chunks
+        chunk_lengths = [len(chunk) for chunk in chunks]
+        doc["chunk_lengths"] = chunk_lengths
+        doc["average_chunk_length"] = sum(chunk_lengths) / len(chunk_lengths) if chunk_lengths else 0